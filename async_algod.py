@@ -0,0 +1,539 @@
+# -----------------           Description          -----------------
+# Asyncio client of an algod node and the asynchronous counterparts of the state reads, box fetching, preflight,
+# sending and confirmation of groups used by the interaction layer (see demo/async_interact_w_CompoundContract.py).
+# The client is built on a non-blocking HTTP transport (aiohttp), thus a single event loop can drive the interactions
+# with many contracts and many users at once:
+#   - the number of requests in flight to the node is bounded by the client's concurrency limit (shared by all tasks
+#     using the client), and idempotent requests are retried on transient errors with exponential backoff,
+#   - waiting for rounds is shared - a single task follows the rounds of the node (status after block) and wakes all
+#     tasks waiting for a round, instead of each of them polling the node,
+#   - suggested params are reused for PARAMS_TTL seconds or PARAMS_MAX_ROUNDS rounds, as in state_snapshot.py,
+#   - all operations are coroutines, thus they can be cancelled (e.g. with asyncio.wait_for or task.cancel()). A group
+#     which has already been sent may nevertheless be confirmed after its waiting has been cancelled.
+# Building and signing of transactions stays synchronous (it is local and CPU bound), the groups of an operation are
+# signed in one batch (signing_service.sign_groups) in a thread, so the event loop is not blocked.
+#
+# Example:
+#   async with AsyncAlgodClient(token, address, concurrency=32) as client:
+#       stakes = await run_limited([getUsersCompoundStake(client, addr, cc_id) for addr in addresses], limit=100)
+
+# -----------------           Imports          -----------------
+import asyncio
+import base64
+import copy
+import heapq
+import inspect
+import json
+from time import time
+
+import aiohttp
+from algosdk import encoding, error, transaction
+from algosdk.atomic_transaction_composer import AtomicTransactionComposerStatus, AtomicTransactionResponse
+
+from box_cache import default_box_cache
+from box_fetcher import TRANSIENT_CODES, is_transient
+from box_listing import PAGE_SIZE, page_params, page_boxes
+from confirmation_tracker import abi_results, group_failure
+from group_pipeline import MAX_IN_FLIGHT, Pipeline
+from increment_history import BATCH_SIZE, BatchPlanner, increment_record
+from preflight import trial_transactions, apply_simulation, apply_simulations
+from race_retry import MAX_ATTEMPTS, Replanning
+from resubmission import BACKOFF, MAX_BACKOFF, pending_status, send_error_action, probe_reached
+import resubmission
+from state_snapshot import PARAMS_TTL, PARAMS_MAX_ROUNDS
+from util import format_state, simulate_request, log_gtx
+
+# ---------------------------------------------------------------
+
+# Default number of concurrent requests to a node
+DEFAULT_CONCURRENCY = 16
+# Timeout of a request [s] - longer than the node waits for the next block (a minute)
+TIMEOUT = 65.0
+# Number of retries of an idempotent request and initial backoff [s]
+RETRIES = 4
+REQUEST_BACKOFF = 0.2
+# Paths which are not prefixed by the API version
+UNVERSIONED_PATHS = ("/health", "/versions", "/metrics", "/genesis")
+API_VERSION_PREFIX = "/v2"
+
+
+class AsyncAlgodClient:
+
+    def __init__(self, algod_token: str, algod_address: str, headers: dict = None,
+                 concurrency: int = DEFAULT_CONCURRENCY, timeout: float = TIMEOUT, session=None):
+        self.algod_token = algod_token
+        self.algod_address = algod_address.rstrip("/")
+        self.headers = headers or {}
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Session is created on the first request (within the event loop), unless one is given
+        self.session = session
+        self.own_session = session is None
+        # Latest round observed and the tasks waiting for rounds (heap of (round, sequence, future))
+        self.round = 0
+        self.round_waiters = []
+        self.round_sequence = 0
+        self.round_task = None
+        # Latest suggested params, the time and round they were requested at
+        self.params_task = None
+        self.params_time = 0.0
+        self.params_round = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.round_task is not None:
+            self.round_task.cancel()
+            self.round_task = None
+        if self.session is not None and self.own_session:
+            await self.session.close()
+            self.session = None
+
+    # ----- -----    Transport     ----- -----
+
+    # Function makes a request to the node, with at most concurrency requests in flight. Transient errors are retried
+    #  (unless retries is 0, for requests which are not idempotent). Raises AlgodHTTPError.
+    async def algod_request(self, method: str, path: str, params=None, data=None, headers=None,
+                            retries: int = RETRIES):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        url = self.algod_address + (path if path in UNVERSIONED_PATHS else API_VERSION_PREFIX + path)
+        request_headers = {"X-Algo-API-Token": self.algod_token} if self.algod_token else {}
+        request_headers.update(self.headers)
+        request_headers.update(headers or {})
+
+        for attempt in range(retries + 1):
+            try:
+                async with self.semaphore:
+                    async with self.session.request(method, url, params=params, data=data,
+                                                    headers=request_headers) as response:
+                        body = await response.read()
+                        status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                failure = error.AlgodHTTPError("{}: {}".format(type(e).__name__, e))
+            else:
+                if status < 400:
+                    return json.loads(body) if body else {}
+                try:
+                    message = json.loads(body)["message"]
+                except Exception:
+                    message = body.decode(errors="replace")
+                failure = error.AlgodHTTPError(message, status)
+                if status not in TRANSIENT_CODES:
+                    raise failure
+            if attempt == retries:
+                raise failure
+            await asyncio.sleep(REQUEST_BACKOFF * 2 ** attempt)
+
+    # ----- -----    Endpoints     ----- -----
+
+    async def status(self):
+        status = await self.algod_request("GET", "/status")
+        self.observe_round(status.get("last-round"))
+        return status
+
+    # Function returns the status of the node after a block after a round is accepted (or after the node's timeout)
+    async def status_after_block(self, round: int):
+        status = await self.algod_request("GET", "/status/wait-for-block-after/{}".format(round))
+        self.observe_round(status.get("last-round"))
+        return status
+
+    async def versions(self):
+        return await self.algod_request("GET", "/versions")
+
+    async def application_info(self, app_id: int):
+        return await self.algod_request("GET", "/applications/{}".format(app_id))
+
+    async def account_info(self, address: str):
+        info = await self.algod_request("GET", "/accounts/{}".format(address))
+        self.observe_round(info.get("round"))
+        return info
+
+    async def account_application_info(self, address: str, app_id: int):
+        return await self.algod_request("GET", "/accounts/{}/applications/{}".format(address, app_id))
+
+    async def application_box_by_name(self, app_id: int, name: bytes):
+        params = {"name": "b64:" + base64.b64encode(name).decode()}
+        return await self.algod_request("GET", "/applications/{}/box".format(app_id), params=params)
+
+    async def application_boxes(self, app_id: int, limit: int = PAGE_SIZE, next_token: str = None, start: int = None):
+        params = {k: str(v) for k, v in page_params(limit, next_token, start).items()}
+        return await self.algod_request("GET", "/applications/{}/boxes".format(app_id), params=params)
+
+    async def pending_transaction_info(self, txid: str):
+        return await self.algod_request("GET", "/transactions/pending/{}".format(txid), params={"format": "json"})
+
+    # Function sends signed transactions (of a group). The request is not retried - see send_idempotent.
+    async def send_transactions(self, signed_txns):
+        data = b"".join(base64.b64decode(encoding.msgpack_encode(stxn)) for stxn in signed_txns)
+        response = await self.algod_request("POST", "/transactions", data=data,
+                                            headers={"Content-Type": "application/x-binary"}, retries=0)
+        return response["txId"]
+
+    # Function simulates a group of signed transactions and returns the result of the group, as util.simulate_group
+    async def simulate_group(self, signed_txns):
+        return (await self.simulate_groups(signed_txns))[0]
+
+    # Function simulates groups of signed transactions one after another in a single request, as util.simulate_groups
+    async def simulate_groups(self, *groups):
+        response = await self.algod_request("POST", "/transactions/simulate", data=simulate_request(*groups),
+                                            headers={"Content-Type": "application/msgpack"})
+        return response["txn-groups"]
+
+    # Function returns a copy of suggested params, refreshed after PARAMS_TTL seconds or PARAMS_MAX_ROUNDS rounds.
+    #  Concurrent callers share a single request.
+    async def suggested_params(self):
+        if self.params_task is not None and (
+                time() - self.params_time >= PARAMS_TTL or self.round - self.params_round >= PARAMS_MAX_ROUNDS or
+                (self.params_task.done() and (self.params_task.cancelled() or self.params_task.exception()))):
+            self.params_task = None
+        if self.params_task is None:
+            self.params_task = asyncio.ensure_future(self.fetch_params())
+            self.params_time, self.params_round = time(), self.round
+        # Shielded, so that a cancelled caller does not cancel the request shared with the others
+        return copy.copy(await asyncio.shield(self.params_task))
+
+    async def fetch_params(self):
+        params = await self.algod_request("GET", "/transactions/params")
+        self.observe_round(params.get("last-round"))
+        return transaction.SuggestedParams(
+            fee=params["fee"], first=params["last-round"], last=params["last-round"] + 1000,
+            gh=params["genesis-hash"], gen=params["genesis-id"], flat_fee=False,
+            consensus_version=params["consensus-version"], min_fee=params["min-fee"]
+        )
+
+    # ----- -----    Rounds     ----- -----
+
+    # Function records a round reported by the node and wakes the tasks waiting for it
+    def observe_round(self, rnd):
+        if rnd is None or rnd <= self.round:
+            return
+        self.round = rnd
+        while self.round_waiters and self.round_waiters[0][0] <= rnd:
+            _, _, future = heapq.heappop(self.round_waiters)
+            if not future.done():
+                future.set_result(rnd)
+
+    async def current_round(self):
+        return (await self.status()).get("last-round")
+
+    # Function waits until a block with a specific round has been accepted and returns the latest round.
+    #  All waiting tasks share a single task following the rounds of the node.
+    async def wait_for_round(self, round: int):
+        if self.round >= round:
+            return self.round
+        future = asyncio.get_running_loop().create_future()
+        self.round_sequence += 1
+        heapq.heappush(self.round_waiters, (round, self.round_sequence, future))
+        if self.round_task is None or self.round_task.done():
+            self.round_task = asyncio.ensure_future(self.follow_rounds())
+        return await future
+
+    async def follow_rounds(self):
+        delay = REQUEST_BACKOFF
+        while any(not future.done() for _, _, future in self.round_waiters):
+            try:
+                if self.round == 0:
+                    await self.status()
+                else:
+                    await self.status_after_block(self.round)
+                delay = REQUEST_BACKOFF
+            except Exception as e:
+                print("\tFollowing rounds failed ({}), retrying in {:.1f} s ...".format(e, delay))
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, MAX_BACKOFF)
+        # Drop the cancelled waiters
+        self.round_waiters = []
+
+
+# ----- -----    State     ----- -----
+
+# helper function to read app global state
+async def read_global_state(client, app_id):
+    app = await client.application_info(app_id)
+    return format_state(app["params"].get("global-state", []))
+
+
+# helper function to read app local state for account
+async def read_local_state(client, address, app_id):
+    app = await client.account_application_info(address, app_id)
+    return format_state(app["app-local-state"].get("key-value", []))
+
+
+# Function waits until a block with specific round has been accepted
+async def waitUntilRound(client, round: int):
+    print("Waiting for round {} ...".format(round))
+    await client.wait_for_round(round)
+
+
+# ----- -----    Boxes     ----- -----
+
+# Function yields the box numbers of an app page by page (in increasing order), as box_listing.iter_box_pages
+async def iter_box_pages(client, app_id, page_size: int = PAGE_SIZE, start: int = None):
+    next_token = None
+    while True:
+        boxes, next_token = page_boxes(await client.application_boxes(app_id, page_size, next_token, start))
+        yield boxes
+        if not next_token:
+            break
+
+
+# Function lists numbers of all boxes of an app (in increasing order), as box_listing.list_boxes
+async def list_boxes(client, app_id, page_size: int = PAGE_SIZE):
+    return sorted([box async for page in iter_box_pages(client, app_id, page_size) for box in page])
+
+
+async def fetch_box(client, app_id, box: int):
+    response = await client.application_box_by_name(app_id, box.to_bytes(8, 'big'))
+    return base64.b64decode(response.get("value"))
+
+
+# Function returns values of boxes first..last of a compound contract, as box_cache.fetch_boxes - only the boxes
+#  which are not cached yet are fetched (concurrently, within the client's concurrency limit)
+async def fetch_boxes(client, app_id, first, last, cache=None, listed=None):
+    cache = cache if cache is not None else default_box_cache()
+    if client.algod_address not in cache.networks:
+        cache.networks[client.algod_address] = (await client.versions()).get("genesis_hash_b64", "")
+    network = cache.networks[client.algod_address]
+    try:
+        app_info = await client.application_info(app_id)
+    except error.AlgodHTTPError as e:
+        if getattr(e, "code", None) == 404:
+            await asyncio.to_thread(cache.drop_app, network, app_id)
+        raise
+    # The cache is local (SQLite), its queries run in a thread so that the event loop is not blocked
+    app = await asyncio.to_thread(cache.app_key, network, app_id, app_info)
+    boxes = range(first, last + 1)
+
+    values = await asyncio.to_thread(cache.get, app, boxes)
+    missing = [box for box in boxes if box not in values]
+    if missing:
+        listed = set(listed if listed is not None else await list_boxes(client, app_id))
+        missing = [box for box in missing if box in listed]
+    fetched = dict(zip(missing, await asyncio.gather(*(fetch_box(client, app_id, box) for box in missing))))
+    await asyncio.to_thread(cache.put, app, fetched)
+    values.update(fetched)
+
+    return [values.get(box) for box in boxes]
+
+
+# Function yields increment records of boxes from start (or the box after cursor) to end (default: NB), as
+#  increment_history.iter_increments
+async def iter_increments(client, cc_id, start: int = 1, end: int = None, cursor: int = None,
+                          batch_size: int = BATCH_SIZE):
+    if cursor is not None:
+        start = max(start, cursor + 1)
+    if end is None:
+        end = (await read_global_state(client, cc_id))["NB"]
+
+    planner = BatchPlanner(start, end, batch_size)
+    pages = iter_box_pages(client, cc_id, start=start)
+    while True:
+        while planner.needs_page():
+            planner.add_page(await anext(pages, None))
+        batch = planner.next_batch()
+        if batch is None:
+            break
+        first, last, batch_listed = batch
+        values = await fetch_boxes(client, cc_id, first, last, listed=batch_listed)
+        for box, value in zip(range(first, last + 1), values):
+            yield increment_record(box, value)
+
+
+# ----- -----    Groups     ----- -----
+
+# Function simulates a group before it is built and sets its fees to the minimum, as preflight.preflight
+async def preflight(client, atc):
+    min_fee = (await client.suggested_params()).min_fee
+    result = await client.simulate_group(trial_transactions(atc, min_fee))
+    return apply_simulation(atc, result, min_fee)
+
+
+# Function simulates chained groups one after another before any is built and sets their fees to the minimum, as
+#  preflight.preflight_groups
+async def preflight_groups(client, atcs):
+    min_fee = (await client.suggested_params()).min_fee
+    results = await client.simulate_groups(*(trial_transactions(atc, min_fee) for atc in atcs))
+    return apply_simulations(atcs, results, min_fee)
+
+
+# Function returns the status of a transaction on the node, as resubmission.transaction_status
+async def transaction_status(client, txid: str):
+    try:
+        info = await client.pending_transaction_info(txid)
+    except error.AlgodHTTPError as e:
+        if getattr(e, "code", None) == 404:
+            return None
+        raise
+    return pending_status(info)
+
+
+# Function sends signed transactions of a group unless they are already known to the node, as
+#  resubmission.send_idempotent. Returns the txids of the group.
+async def send_idempotent(client, signed_txns, backoff: float = BACKOFF, max_backoff: float = MAX_BACKOFF):
+    txids = [stxn.get_txid() for stxn in signed_txns]
+    last_valid = min(stxn.transaction.last_valid_round for stxn in signed_txns)
+    delay = backoff
+
+    for attempt in range(1, resubmission.MAX_ATTEMPTS + 1):
+        try:
+            await client.send_transactions(signed_txns)
+            return txids
+        except Exception as e:
+            action = send_error_action(e)
+            if action == "landed":
+                return txids
+            if action == "raise":
+                raise
+            failure = e
+
+        # The group may have reached the node despite the error - groups are atomic, thus checking one txid suffices
+        try:
+            status = await transaction_status(client, txids[0])
+            await client.status()
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            status = None
+        if probe_reached(status, client.round, last_valid, attempt, failure):
+            return txids
+
+        print("\tSending failed ({}), retrying in {:.1f} s ...".format(failure, delay))
+        await asyncio.sleep(delay)
+        delay = min(2 * delay, max_backoff)
+
+
+# Function signs and sends the group of a composer idempotently, leaving the composer submitted (as atc.submit does)
+async def submit(client, atc):
+    if atc.status > AtomicTransactionComposerStatus.SIGNED:
+        raise error.AtomicTransactionComposerError("Group has already been submitted.")
+    signed_txns = atc.gather_signatures()
+    atc.tx_ids = await send_idempotent(client, signed_txns)
+    atc.status = AtomicTransactionComposerStatus.SUBMITTED
+    return atc.tx_ids
+
+
+# Function waits for the confirmation of a submitted group and returns its response (as atc.execute does). The group
+#  is checked once per round. Fails if it is rejected, or not confirmed within wait_rounds or its validity.
+async def wait_for_group(client, atc, wait_rounds: int):
+    tx_ids = list(atc.tx_ids)
+    last_valid = min(tws.txn.last_valid_round for tws in atc.txn_list)
+    start_round = client.round or await client.current_round()
+    rnd = start_round
+
+    while True:
+        try:
+            info = await client.pending_transaction_info(tx_ids[0])
+        except error.AlgodHTTPError:
+            # Transient errors are retried in the next round, until the group expires or the wait times out
+            info = {}
+        failure = group_failure(tx_ids[0], info, rnd, last_valid, start_round + wait_rounds)
+        if failure is not None:
+            raise failure
+        if info.get("confirmed-round", 0) > 0:
+            # Pending info of the other method calls of the group (for their ABI results)
+            others = [i for i in atc.method_dict if i != 0]
+            infos = dict(zip(others, await asyncio.gather(*(client.pending_transaction_info(tx_ids[i])
+                                                            for i in others))))
+            infos[0] = info
+            atc.status = AtomicTransactionComposerStatus.COMMITTED
+            return AtomicTransactionResponse(info["confirmed-round"], tx_ids, abi_results(atc, tx_ids, infos))
+        rnd = await client.wait_for_round(rnd + 1)
+
+
+# Function submits a group and waits for its response - the asynchronous atc.execute
+async def execute(client, atc, wait_rounds: int):
+    log_gtx(atc.build_group())
+    await submit(client, atc)
+    return await wait_for_group(client, atc, wait_rounds)
+
+
+# Function submits groups in order without waiting for the confirmation of the previous ones, with at most
+#  max_in_flight groups waiting for confirmation, as group_pipeline.execute_pipelined. Returns the results of the
+#  groups which were confirmed before the first failure and the error of the first failed group (None if all groups
+#  were confirmed).
+async def execute_pipelined(client, atcs, wait_rounds: int, max_in_flight: int = MAX_IN_FLIGHT):
+    pipeline = Pipeline(atcs, max_in_flight)
+
+    try:
+        while True:
+            # Send groups until the pipeline is full
+            atc = pipeline.next_group()
+            while atc is not None:
+                log_gtx(atc.build_group())
+                try:
+                    await submit(client, atc)
+                    pipeline.sent(asyncio.ensure_future(wait_for_group(client, atc, wait_rounds)))
+                except Exception as e:
+                    pipeline.send_failed(e)
+                atc = pipeline.next_group()
+
+            # Wait for the oldest group - groups are confirmed in order of submission
+            task = pipeline.oldest()
+            if task is None:
+                break
+            try:
+                pipeline.confirmed(await task)
+            except Exception as e:
+                pipeline.confirmation_failed(e)
+    finally:
+        # Waiting for the groups in flight is cancelled with the pipeline
+        for task in pipeline.in_flight:
+            task.cancel()
+
+    return pipeline.results, pipeline.failure
+
+
+# Function runs attempt() - a coroutine function which plans, builds and executes an operation - until it succeeds,
+#  re-planning it if the number of boxes of the contract has changed meanwhile, as race_retry.execute_with_replan
+async def execute_with_replan(client, cc_id: int, operation: str, attempt, max_attempts: int = MAX_ATTEMPTS,
+                              stats=None):
+    replanning = Replanning(operation, max_attempts, stats)
+
+    for i in replanning.attempts():
+        nb = (await read_global_state(client, cc_id))["NB"]
+        try:
+            result = await attempt()
+        except Exception:
+            new_nb = (await read_global_state(client, cc_id))["NB"]
+            if not replanning.failed(i, nb, new_nb):
+                raise
+            continue
+
+        replanning.succeeded(i)
+        return result
+
+
+# ----- -----    Concurrency     ----- -----
+
+# Function runs awaitables (e.g. interactions with many contracts or for many users) with at most limit of them at
+#  once and returns their results in order. If one fails, the others are cancelled and its error is raised, unless
+#  return_exceptions is set, in which case errors are returned as results.
+async def run_limited(aws, limit: int, return_exceptions: bool = False):
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw):
+        try:
+            async with semaphore:
+                return await aw
+        except Exception as e:
+            if return_exceptions:
+                return e
+            raise
+        finally:
+            # Coroutines cancelled before they were started are closed
+            if inspect.iscoroutine(aw):
+                aw.close()
+
+    tasks = [asyncio.ensure_future(run(aw)) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
@@ -0,0 +1,142 @@
+# -----------------           Description          -----------------
+# GENERATED by build_abi.py from contract.py - do not edit by hand.
+# ABI (ARC-4) specification, method selectors and constants of the Autocompounder contract. Importing this module
+# requires only algosdk.
+
+# -----------------           Imports          -----------------
+from algosdk.abi import Contract
+
+# ---------------------------------------------------------------
+
+ARC4_CONTRACT = {
+    "name": "Autocompounder",
+    "methods": [
+        {
+            "name": "compound_now",
+            "args": [],
+            "returns": {
+                "type": "void"
+            }
+        },
+        {
+            "name": "create",
+            "args": [
+                {
+                    "type": "uint64",
+                    "name": "SC_ID"
+                },
+                {
+                    "type": "uint64",
+                    "name": "AC_ID"
+                },
+                {
+                    "type": "uint64",
+                    "name": "claimPeriod"
+                }
+            ],
+            "returns": {
+                "type": "void"
+            }
+        },
+        {
+            "name": "delete_boxes",
+            "args": [
+                {
+                    "type": "uint64",
+                    "name": "down_to_box"
+                }
+            ],
+            "returns": {
+                "type": "void"
+            }
+        },
+        {
+            "name": "local_claim",
+            "args": [
+                {
+                    "type": "uint64",
+                    "name": "up_to_box"
+                }
+            ],
+            "returns": {
+                "type": "void"
+            }
+        },
+        {
+            "name": "on_setup",
+            "args": [],
+            "returns": {
+                "type": "void"
+            }
+        },
+        {
+            "name": "stake",
+            "args": [],
+            "returns": {
+                "type": "void"
+            }
+        },
+        {
+            "name": "trigger_compound",
+            "args": [],
+            "returns": {
+                "type": "void"
+            }
+        },
+        {
+            "name": "withdraw",
+            "args": [
+                {
+                    "type": "uint64",
+                    "name": "amt"
+                }
+            ],
+            "returns": {
+                "type": "uint64"
+            }
+        }
+    ],
+    "networks": {}
+}
+CONTRACT = Contract.undictify(ARC4_CONTRACT)
+
+# Method selectors by method name
+SELECTORS = {
+    "compound_now": bytes.fromhex("6d8b38b4"),
+    "create": bytes.fromhex("7efda4d2"),
+    "delete_boxes": bytes.fromhex("fd4618fd"),
+    "local_claim": bytes.fromhex("ab62b1e9"),
+    "on_setup": bytes.fromhex("20d5306b"),
+    "stake": bytes.fromhex("0890bd58"),
+    "trigger_compound": bytes.fromhex("78b82ea8"),
+    "withdraw": bytes.fromhex("31214176"),
+}
+
+
+# Constants of the contract and its ABI methods (as algosdk.abi.Method)
+class Autocompounder:
+    LAST_COMPOUND_NOT_DONE = 0
+    LAST_COMPOUND_DONE = 1
+    LOCAL_STAKE_M = 8
+    LOCAL_STAKE_N = 8
+    LOCAL_STAKE_SIZE = 16
+    BOX_NAME_SIZE = 8
+    BOX_MAX_SIZE = 16
+    MIN_TX_FEE = 1000
+    STAKE_TO_SC_FEE = 3000
+    UNSTAKE_FROM_SC_FEE = 3000
+    CLAIM_FROM_SC_FEE = 4000
+    BOX_FEE = 12100
+    ZAP_FEE = 4000
+    PAY_FEE = 1
+    DO_NOT_PAY_FEE = 0
+    CC_FEE_FOR_COMPOUND = 19100
+
+    compound_now = CONTRACT.get_method_by_name("compound_now")
+    create = CONTRACT.get_method_by_name("create")
+    delete_boxes = CONTRACT.get_method_by_name("delete_boxes")
+    local_claim = CONTRACT.get_method_by_name("local_claim")
+    on_setup = CONTRACT.get_method_by_name("on_setup")
+    stake = CONTRACT.get_method_by_name("stake")
+    trigger_compound = CONTRACT.get_method_by_name("trigger_compound")
+    withdraw = CONTRACT.get_method_by_name("withdraw")
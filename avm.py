@@ -0,0 +1,1119 @@
+# -----------------           Description          -----------------
+# Minimal local stand-in for the Algorand Virtual Machine (AVM), executing TEAL assembly of approval programs.
+# It implements the subset of opcodes used by the compiled Autocompounder (as generated by PyTEAL/Beaker, incl. the ABI
+# router), together with:
+#   - global and local state, boxes (with box references pooled across the group and box MBR),
+#   - inner transactions (payments, asset transfers and application calls, with fee pooling),
+#   - applications implemented in Python (e.g. a scripted mock of the Cometa staking contract),
+#   - opcode cost accounting as done by the AVM (per opcode cost, budget of 700 per app call pooled across the group and
+#     increased by each inner application call).
+# Accounts are represented by their 32-byte public keys and transactions by dictionaries of their TEAL fields.
+# The module depends only on the standard library, thus it can be used in CI without a node.
+
+# -----------------           Imports          -----------------
+import base64
+import copy
+import hashlib
+
+# ---------------------------------------------------------------
+
+MAX_UINT64 = 2 ** 64 - 1
+MAX_BYTE_MATH_SIZE = 64
+MAX_STRING_SIZE = 4096
+MAX_BOX_SIZE = 32768
+MAX_INNER_TXNS = 256
+MAX_GROUP_SIZE = 16
+# Opcode budget of each application call
+APP_CALL_BUDGET = 700
+# Bytes of box IO budget given by each box reference
+BOX_REF_QUOTA = 1024
+
+MIN_TX_FEE = 1_000
+MIN_BALANCE = 100_000
+ASSET_MIN_BALANCE = 100_000
+APP_MIN_BALANCE = 100_000
+SCHEMA_UINT_MIN_BALANCE = 28_500
+SCHEMA_BYTES_MIN_BALANCE = 50_000
+BOX_FLAT_MIN_BALANCE = 2_500
+BOX_BYTE_MIN_BALANCE = 400
+
+# Transaction types (TypeEnum)
+PAY = 1
+KEYREG = 2
+ACFG = 3
+AXFER = 4
+AFRZ = 5
+APPL = 6
+TYPE_NAMES = {PAY: b"pay", KEYREG: b"keyreg", ACFG: b"acfg", AXFER: b"axfer", AFRZ: b"afrz", APPL: b"appl"}
+
+# On completion types
+NOOP = 0
+OPTIN = 1
+CLOSEOUT = 2
+CLEARSTATE = 3
+UPDATE = 4
+DELETE = 5
+
+# Named integer constants of the assembler
+NAMED_INTS = {
+    "NoOp": NOOP, "OptIn": OPTIN, "CloseOut": CLOSEOUT, "ClearState": CLEARSTATE, "UpdateApplication": UPDATE,
+    "DeleteApplication": DELETE,
+    "unknown": 0, "pay": PAY, "keyreg": KEYREG, "acfg": ACFG, "axfer": AXFER, "afrz": AFRZ, "appl": APPL,
+}
+
+# Opcode costs (for AVM version 8) of opcodes that do not cost 1
+OPCODE_COSTS = {
+    "sha256": 35,
+    "keccak256": 130,
+    "sha512_256": 45,
+    "sha3_256": 130,
+    "ed25519verify": 1900,
+    "ed25519verify_bare": 1900,
+    "b+": 10,
+    "b-": 10,
+    "b*": 20,
+    "b/": 20,
+    "b%": 20,
+    "b|": 6,
+    "b&": 6,
+    "b^": 6,
+    "b~": 4,
+    "bsqrt": 40,
+    "sqrt": 4,
+    "expw": 10,
+    "divmodw": 20,
+}
+
+# Transaction fields which are arrays
+ARRAY_FIELDS = ("ApplicationArgs", "Accounts", "Applications", "Assets", "Logs")
+
+
+class AVMError(Exception):
+    # Error raised when a program fails (i.e. the transaction is rejected)
+    pass
+
+
+# Helper function computing sha512/256
+def sha512_256(data):
+    return hashlib.new("sha512_256", data).digest()
+
+
+# Helper function that returns the address (32-byte public key) of an application account
+def app_address(app_id):
+    return sha512_256(b"appID" + app_id.to_bytes(8, "big"))
+
+
+# Helper function that decodes a checksummed base32 Algorand address into its public key
+def decode_address(addr):
+    raw = base64.b32decode(addr + "=" * (-len(addr) % 8))
+    return raw[:32]
+
+
+# Helper function that encodes a public key as a checksummed base32 Algorand address
+def encode_address(pk):
+    return base64.b32encode(pk + sha512_256(pk)[-4:]).decode().strip("=")
+
+
+# Helper function converting an integer to minimal big-endian bytes (as returned by byte math opcodes)
+def big_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+
+# Function creates a transaction - a dictionary of TEAL transaction fields
+def make_txn(type_enum, sender, **fields):
+    txn = {"TypeEnum": type_enum, "Sender": sender, "Fee": MIN_TX_FEE}
+    for name in ARRAY_FIELDS:
+        txn[name] = []
+    txn["Boxes"] = []
+    txn.update(fields)
+    return txn
+
+
+# ----- -----    Program parsing     ----- -----
+
+# Function splits a line of TEAL into tokens, respecting quoted strings and comments
+def tokenize(line):
+    tokens = []
+    i = 0
+    n = len(line)
+    while i < n:
+        c = line[i]
+        if c.isspace():
+            i += 1
+        elif line.startswith("//", i):
+            break
+        elif c == '"':
+            j = i + 1
+            while j < n and line[j] != '"':
+                j += 2 if line[j] == "\\" else 1
+            tokens.append(line[i:j + 1])
+            i = j + 1
+        else:
+            j = i
+            while j < n and not line[j].isspace():
+                j += 1
+            tokens.append(line[i:j])
+            i = j
+    return tokens
+
+
+# Function parses a byte constant, returning the bytes and the number of consumed tokens
+def parse_bytes(tokens):
+    t = tokens[0]
+    if t.startswith("0x"):
+        return bytes.fromhex(t[2:]), 1
+    if t.startswith('"'):
+        return t[1:-1].encode().decode("unicode_escape").encode("latin-1"), 1
+    if t in ("base64", "b64"):
+        return base64.b64decode(tokens[1]), 2
+    if t in ("base32", "b32"):
+        return base64.b32decode(tokens[1] + "=" * (-len(tokens[1]) % 8)), 2
+    for prefix, decode in (("base64(", base64.b64decode), ("b64(", base64.b64decode)):
+        if t.startswith(prefix):
+            return decode(t[len(prefix):-1]), 1
+    raise AVMError("invalid byte constant: " + " ".join(tokens))
+
+
+# Function parses an integer constant
+def parse_int(token):
+    if token in NAMED_INTS:
+        return NAMED_INTS[token]
+    return int(token, 0)
+
+
+class Program:
+    # Parsed TEAL program: a list of (opcode, immediate arguments, source line number) and a map of labels
+
+    def __init__(self, source):
+        self.ops = []
+        self.labels = {}
+        self.version = 1
+        for line_no, line in enumerate(source.splitlines(), 1):
+            tokens = tokenize(line)
+            if not tokens:
+                continue
+            if tokens[0] == "#pragma":
+                if tokens[1] == "version":
+                    self.version = int(tokens[2])
+                continue
+            if tokens[0].endswith(":"):
+                self.labels[tokens[0][:-1]] = len(self.ops)
+                tokens = tokens[1:]
+                if not tokens:
+                    continue
+            self.ops.append((tokens[0], self.parse_args(tokens[0], tokens[1:]), line_no))
+
+    @staticmethod
+    def parse_args(op, tokens):
+        if op in ("int", "pushint"):
+            return [parse_int(tokens[0])]
+        if op in ("intcblock", "pushints"):
+            return [parse_int(t) for t in tokens]
+        if op in ("byte", "pushbytes"):
+            return [parse_bytes(tokens)[0]]
+        if op in ("bytecblock", "pushbytess"):
+            values = []
+            while tokens:
+                value, used = parse_bytes(tokens)
+                values.append(value)
+                tokens = tokens[used:]
+            return values
+        if op == "addr":
+            return [decode_address(tokens[0])]
+        if op == "method":
+            return [sha512_256(parse_bytes(tokens)[0])[:4]]
+        return tokens
+
+
+# ----- -----    Ledger     ----- -----
+
+class Ledger:
+    # Accounts, applications and assets seen by the AVM
+
+    def __init__(self, round=1, timestamp=0):
+        self.round = round
+        self.timestamp = timestamp
+        # Accounts: {address: {"balance", "assets": {asset_id: amount}, "local": {app_id: {key: value}}}}
+        self.accounts = {}
+        # Applications: {app_id: {"creator", "global", "boxes", "program", "clear", "handler", "local_schema",
+        #  "global_schema"}}
+        self.apps = {}
+        self.next_id = 1_000
+
+    def account(self, address):
+        return self.accounts.setdefault(address, {"balance": 0, "assets": {}, "local": {}})
+
+    def fund(self, address, amount):
+        self.account(address)["balance"] += amount
+
+    def create_app(self, creator, program=None, clear=None, handler=None, global_state=None, app_id=None,
+                   global_schema=(0, 0), local_schema=(0, 0)):
+        if app_id is None:
+            app_id = self.next_id
+        self.next_id = max(self.next_id, app_id) + 1
+        self.apps[app_id] = {
+            "creator": creator,
+            "global": dict(global_state or {}),
+            "boxes": {},
+            "program": Program(program) if isinstance(program, str) else program,
+            "clear": Program(clear) if isinstance(clear, str) else clear,
+            "handler": handler,
+            "global_schema": global_schema,
+            "local_schema": local_schema,
+        }
+        self.account(app_address(app_id))
+        return app_id
+
+    def min_balance(self, address):
+        acc = self.account(address)
+        mbr = MIN_BALANCE + ASSET_MIN_BALANCE * len(acc["assets"])
+        for app_id in acc["local"]:
+            nui, nbs = self.apps[app_id]["local_schema"] if app_id in self.apps else (0, 0)
+            mbr += APP_MIN_BALANCE + nui * SCHEMA_UINT_MIN_BALANCE + nbs * SCHEMA_BYTES_MIN_BALANCE
+        for app_id, app in self.apps.items():
+            if app["creator"] == address:
+                nui, nbs = app["global_schema"]
+                mbr += APP_MIN_BALANCE + nui * SCHEMA_UINT_MIN_BALANCE + nbs * SCHEMA_BYTES_MIN_BALANCE
+            if app_address(app_id) == address:
+                for name, value in app["boxes"].items():
+                    mbr += BOX_FLAT_MIN_BALANCE + BOX_BYTE_MIN_BALANCE * (len(name) + len(value))
+        return mbr
+
+    def snapshot(self):
+        return copy.deepcopy((self.accounts, {k: {f: v for f, v in a.items() if f not in ("program", "clear",
+                                                                                          "handler")}
+                                              for k, a in self.apps.items()}, self.next_id))
+
+    def restore(self, snap):
+        accounts, apps, next_id = copy.deepcopy(snap)
+        for app_id, app in apps.items():
+            old = self.apps.get(app_id, {})
+            app.update({f: old.get(f) for f in ("program", "clear", "handler")})
+        self.accounts, self.apps, self.next_id = accounts, apps, next_id
+
+
+# ----- -----    Execution     ----- -----
+
+class GroupContext:
+    # State shared by all transactions of a top-level group: opcode budget and fee credit
+
+    def __init__(self, ledger, group, enforce_budget=True):
+        self.ledger = ledger
+        self.group = group
+        self.enforce_budget = enforce_budget
+        self.budget = APP_CALL_BUDGET * sum(1 for t in group if t["TypeEnum"] == APPL)
+        self.used = 0
+        # Fees paid in excess of the minimum can pay for inner transactions
+        self.fee_credit = sum(t.get("Fee", 0) for t in group) - MIN_TX_FEE * len(group)
+        if self.fee_credit < 0:
+            raise AVMError("txgroup had {} in fees, which is less than the minimum {}".format(
+                sum(t.get("Fee", 0) for t in group), MIN_TX_FEE * len(group)))
+        # Box references are pooled across the group
+        self.boxes = set()
+        for t in group:
+            for app_index, name in t.get("Boxes", []):
+                app_id = t.get("ApplicationID", 0) if app_index == 0 else t["Applications"][app_index - 1]
+                self.boxes.add((app_id, name))
+        self.inner_count = 0
+
+    def charge(self, cost):
+        self.used += cost
+        if self.enforce_budget and self.used > self.budget:
+            raise AVMError("dynamic cost budget exceeded, executing pushint: local program cost was {}".format(
+                self.used))
+
+
+class EvalContext:
+    # Execution of a program for a single application call
+
+    def __init__(self, group_ctx, group, index, app_id):
+        self.gctx = group_ctx
+        self.ledger = group_ctx.ledger
+        self.group = group
+        self.index = index
+        self.txn = group[index]
+        self.app_id = app_id
+        self.stack = []
+        self.scratch = [0] * 256
+        self.intc = []
+        self.bytec = []
+        self.logs = []
+        self.cost = 0
+        # Inner transactions being built and the ones which were submitted
+        self.itxn_group = None
+        self.last_itxn_group = []
+        self.inner = []
+
+    # ----- -----    Stack helpers     ----- -----
+
+    def push(self, value):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int) and not 0 <= value <= MAX_UINT64:
+            raise AVMError("uint64 overflow")
+        if isinstance(value, bytes) and len(value) > MAX_STRING_SIZE:
+            raise AVMError("byte slice too long")
+        self.stack.append(value)
+
+    def pop(self):
+        if not self.stack:
+            raise AVMError("stack underflow")
+        return self.stack.pop()
+
+    def pop_int(self):
+        v = self.pop()
+        if not isinstance(v, int):
+            raise AVMError("expected uint64, got bytes")
+        return v
+
+    def pop_bytes(self):
+        v = self.pop()
+        if not isinstance(v, bytes):
+            raise AVMError("expected bytes, got uint64")
+        return v
+
+    def pop_math(self):
+        v = self.pop_bytes()
+        if len(v) > MAX_BYTE_MATH_SIZE:
+            raise AVMError("byte math input too long")
+        return int.from_bytes(v, "big")
+
+    # ----- -----    References     ----- -----
+
+    def resolve_app(self, ref):
+        if ref == 0:
+            return self.app_id
+        apps = self.txn.get("Applications", [])
+        if ref <= len(apps):
+            return apps[ref - 1]
+        return ref
+
+    def resolve_account(self, ref):
+        if isinstance(ref, bytes):
+            return ref
+        if ref == 0:
+            return self.txn["Sender"]
+        accounts = self.txn.get("Accounts", [])
+        if ref > len(accounts):
+            raise AVMError("invalid Account reference {}".format(ref))
+        return accounts[ref - 1]
+
+    def resolve_asset(self, ref):
+        assets = self.txn.get("Assets", [])
+        if ref < len(assets):
+            return assets[ref]
+        return ref
+
+    def box(self, name):
+        if (self.app_id, name) not in self.gctx.boxes:
+            raise AVMError("invalid Box reference {!r}".format(name))
+        return self.ledger.apps[self.app_id]["boxes"]
+
+    # ----- -----    Fields     ----- -----
+
+    def txn_field(self, txn, field, index=None, group_index=None):
+        if field in ARRAY_FIELDS and index is None:
+            raise AVMError("array field {} needs an index".format(field))
+        if field == "GroupIndex":
+            return group_index
+        if field == "TxID":
+            return sha512_256(repr(sorted(txn.items())).encode())
+        if field == "Type":
+            return TYPE_NAMES[txn["TypeEnum"]]
+        if field.startswith("Num") and field[3:] in ARRAY_FIELDS:
+            return len(txn.get(field[3:], []))
+        if field == "NumAppArgs":
+            return len(txn.get("ApplicationArgs", []))
+        if field == "LastLog":
+            logs = txn.get("Logs", [])
+            return logs[-1] if logs else b""
+        if field == "Accounts" and index == 0:
+            return txn["Sender"]
+        if field == "Applications" and index == 0:
+            return txn.get("ApplicationID", 0)
+        if index is not None:
+            array = txn.get(field, [])
+            if field in ("Accounts", "Applications"):
+                index -= 1
+            if index >= len(array):
+                raise AVMError("invalid {} index {}".format(field, index))
+            return array[index]
+        if field in ("Sender", "Receiver", "CloseRemainderTo", "AssetReceiver", "AssetSender", "AssetCloseTo",
+                     "RekeyTo"):
+            return txn.get(field, bytes(32))
+        if field in ("Note", "Lease", "ApprovalProgram", "ClearStateProgram"):
+            return txn.get(field, b"")
+        return txn.get(field, 0)
+
+    def global_field(self, field):
+        if field == "Round":
+            return self.ledger.round
+        if field == "LatestTimestamp":
+            return self.ledger.timestamp
+        if field == "MinTxnFee":
+            return MIN_TX_FEE
+        if field == "MinBalance":
+            return MIN_BALANCE
+        if field == "MaxTxnLife":
+            return 1000
+        if field == "ZeroAddress":
+            return bytes(32)
+        if field == "GroupSize":
+            return len(self.group)
+        if field == "LogicSigVersion":
+            return 8
+        if field == "CurrentApplicationID":
+            return self.app_id
+        if field == "CurrentApplicationAddress":
+            return app_address(self.app_id)
+        if field == "CreatorAddress":
+            return self.ledger.apps[self.app_id]["creator"]
+        if field == "OpcodeBudget":
+            return max(0, self.gctx.budget - self.gctx.used)
+        if field == "CallerApplicationID":
+            return self.txn.get("CallerApplicationID", 0)
+        if field == "CallerApplicationAddress":
+            caller = self.txn.get("CallerApplicationID", 0)
+            return app_address(caller) if caller else bytes(32)
+        raise AVMError("unsupported global field " + field)
+
+    # ----- -----    Execution     ----- -----
+
+    def run(self, program):
+        ops = program.ops
+        pc = 0
+        frames = []
+        while pc < len(ops):
+            op, args, line = ops[pc]
+            cost = OPCODE_COSTS.get(op, 1)
+            self.cost += cost
+            self.gctx.charge(cost)
+            try:
+                jump = self.step(op, args, program, frames, pc)
+            except AVMError as e:
+                raise AVMError("{} (line {}: {})".format(e, line, op)) from None
+            if jump is None:
+                pc += 1
+            elif jump == "return":
+                break
+            else:
+                pc = jump
+        if len(self.stack) != 1:
+            raise AVMError("stack must contain exactly one item at the end of the program, found {}".format(
+                len(self.stack)))
+        result = self.stack[-1]
+        if not isinstance(result, int):
+            raise AVMError("program must end with a uint64 on the stack")
+        return result != 0
+
+    def step(self, op, args, program, frames, pc):
+        # Returns None to continue with the next opcode, the index of the next opcode, or "return"
+        s = self.stack
+        ledger = self.ledger
+
+        # Constants
+        if op in ("int", "pushint"):
+            self.push(args[0])
+        elif op in ("byte", "pushbytes", "addr", "method"):
+            self.push(args[0])
+        elif op == "pushints" or op == "pushbytess":
+            for v in args:
+                self.push(v)
+        elif op == "intcblock":
+            self.intc = list(args)
+        elif op == "bytecblock":
+            self.bytec = list(args)
+        elif op == "intc":
+            self.push(self.intc[int(args[0])])
+        elif op.startswith("intc_"):
+            self.push(self.intc[int(op[5:])])
+        elif op == "bytec":
+            self.push(self.bytec[int(args[0])])
+        elif op.startswith("bytec_"):
+            self.push(self.bytec[int(op[6:])])
+
+        # Flow control
+        elif op == "err":
+            raise AVMError("err opcode executed")
+        elif op == "assert":
+            if self.pop_int() == 0:
+                raise AVMError("assert failed")
+        elif op == "return":
+            v = self.pop()
+            self.stack = [v]
+            return "return"
+        elif op == "b":
+            return program.labels[args[0]]
+        elif op == "bz":
+            if self.pop_int() == 0:
+                return program.labels[args[0]]
+        elif op == "bnz":
+            if self.pop_int() != 0:
+                return program.labels[args[0]]
+        elif op == "switch":
+            i = self.pop_int()
+            if i < len(args):
+                return program.labels[args[i]]
+        elif op == "match":
+            b = self.pop()
+            values = [self.pop() for _ in args][::-1]
+            for i, v in enumerate(values):
+                if v == b:
+                    return program.labels[args[i]]
+        elif op == "callsub":
+            frames.append({"return": pc + 1, "height": len(s), "args": 0, "returns": 0, "proto": False})
+            return program.labels[args[0]]
+        elif op == "proto":
+            frame = frames[-1]
+            frame.update(args=int(args[0]), returns=int(args[1]), proto=True)
+            frame["height"] = len(s) - frame["args"]
+            if frame["height"] < 0:
+                raise AVMError("callsub to proto that requires {} args with stack height {}".format(args[0], len(s)))
+        elif op == "retsub":
+            if not frames:
+                raise AVMError("retsub with empty callstack")
+            frame = frames.pop()
+            if frame["proto"]:
+                rets = s[len(s) - frame["returns"]:] if frame["returns"] else []
+                del s[frame["height"]:]
+                s.extend(rets)
+            return frame["return"]
+        elif op in ("frame_dig", "frame_bury"):
+            frame = frames[-1]
+            i = frame["height"] + frame["args"] + int(args[0]) if frame["proto"] else None
+            if i is None or not 0 <= i < len(s):
+                raise AVMError("frame access out of range")
+            if op == "frame_dig":
+                self.push(s[i])
+            else:
+                s[i] = self.pop()
+
+        # Stack manipulation
+        elif op == "pop":
+            self.pop()
+        elif op == "popn":
+            for _ in range(int(args[0])):
+                self.pop()
+        elif op == "dup":
+            self.push(s[-1])
+        elif op == "dup2":
+            a, b = s[-2], s[-1]
+            self.push(a)
+            self.push(b)
+        elif op == "dupn":
+            for _ in range(int(args[0])):
+                self.push(s[-1])
+        elif op == "dig":
+            self.push(s[-1 - int(args[0])])
+        elif op == "bury":
+            v = self.pop()
+            s[-int(args[0])] = v
+        elif op == "swap":
+            s[-1], s[-2] = s[-2], s[-1]
+        elif op == "select":
+            c = self.pop_int()
+            b = self.pop()
+            a = self.pop()
+            self.push(b if c != 0 else a)
+        elif op == "cover":
+            n = int(args[0])
+            s.insert(len(s) - 1 - n, s.pop())
+        elif op == "uncover":
+            n = int(args[0])
+            s.append(s.pop(len(s) - 1 - n))
+
+        # Scratch space
+        elif op == "load":
+            self.push(self.scratch[int(args[0])])
+        elif op == "store":
+            self.scratch[int(args[0])] = self.pop()
+        elif op == "loads":
+            self.push(self.scratch[self.pop_int()])
+        elif op == "stores":
+            v = self.pop()
+            self.scratch[self.pop_int()] = v
+
+        # Arithmetic and logic
+        elif op in ("+", "-", "*", "/", "%", "<", ">", "<=", ">=", "&&", "||", "&", "|", "^", "exp", "shl", "shr"):
+            b = self.pop_int()
+            a = self.pop_int()
+            self.push(self.arith(op, a, b))
+        elif op in ("==", "!="):
+            b = self.pop()
+            a = self.pop()
+            if type(a) != type(b):
+                raise AVMError("cannot compare uint64 to bytes")
+            self.push((a == b) if op == "==" else (a != b))
+        elif op == "!":
+            self.push(self.pop_int() == 0)
+        elif op == "~":
+            self.push(MAX_UINT64 ^ self.pop_int())
+        elif op == "sqrt":
+            import math
+            self.push(math.isqrt(self.pop_int()))
+        elif op == "bitlen":
+            v = self.pop()
+            self.push(v.bit_length() if isinstance(v, int) else int.from_bytes(v, "big").bit_length())
+        elif op == "mulw":
+            b = self.pop_int()
+            a = self.pop_int()
+            r = a * b
+            self.push(r >> 64)
+            self.push(r & MAX_UINT64)
+        elif op == "addw":
+            b = self.pop_int()
+            a = self.pop_int()
+            r = a + b
+            self.push(r >> 64)
+            self.push(r & MAX_UINT64)
+
+        # Byte math
+        elif op in ("b+", "b-", "b*", "b/", "b%", "b<", "b>", "b<=", "b>=", "b==", "b!=", "b|", "b&", "b^"):
+            b = self.pop_math()
+            a = self.pop_math()
+            self.push(self.byte_math(op, a, b))
+        elif op == "bzero":
+            n = self.pop_int()
+            if n > MAX_STRING_SIZE:
+                raise AVMError("bzero attempted to create a too large string")
+            self.push(bytes(n))
+
+        # Byte manipulation
+        elif op == "itob":
+            self.push(self.pop_int().to_bytes(8, "big"))
+        elif op == "btoi":
+            v = self.pop_bytes()
+            if len(v) > 8:
+                raise AVMError("btoi arg too long, got [{}]bytes".format(len(v)))
+            self.push(int.from_bytes(v, "big"))
+        elif op == "concat":
+            b = self.pop_bytes()
+            a = self.pop_bytes()
+            self.push(a + b)
+        elif op == "len":
+            self.push(len(self.pop_bytes()))
+        elif op == "extract":
+            start, length = int(args[0]), int(args[1])
+            v = self.pop_bytes()
+            end = len(v) if length == 0 else start + length
+            if start > len(v) or end > len(v):
+                raise AVMError("extraction end {} is beyond length: {}".format(end, len(v)))
+            self.push(v[start:end])
+        elif op == "extract3":
+            length = self.pop_int()
+            start = self.pop_int()
+            v = self.pop_bytes()
+            if start + length > len(v):
+                raise AVMError("extraction end {} is beyond length: {}".format(start + length, len(v)))
+            self.push(v[start:start + length])
+        elif op in ("extract_uint16", "extract_uint32", "extract_uint64"):
+            size = int(op[len("extract_uint"):]) // 8
+            start = self.pop_int()
+            v = self.pop_bytes()
+            if start + size > len(v):
+                raise AVMError("extraction end {} is beyond length: {}".format(start + size, len(v)))
+            self.push(int.from_bytes(v[start:start + size], "big"))
+        elif op == "substring":
+            start, end = int(args[0]), int(args[1])
+            v = self.pop_bytes()
+            if start > end or end > len(v):
+                raise AVMError("substring range beyond length of string")
+            self.push(v[start:end])
+        elif op == "substring3":
+            end = self.pop_int()
+            start = self.pop_int()
+            v = self.pop_bytes()
+            if start > end or end > len(v):
+                raise AVMError("substring range beyond length of string")
+            self.push(v[start:end])
+        elif op == "getbyte":
+            i = self.pop_int()
+            v = self.pop_bytes()
+            self.push(v[i])
+        elif op == "sha256":
+            self.push(hashlib.sha256(self.pop_bytes()).digest())
+        elif op == "sha512_256":
+            self.push(sha512_256(self.pop_bytes()))
+        elif op == "log":
+            if len(self.logs) >= 32:
+                raise AVMError("too many log calls in program")
+            self.logs.append(self.pop_bytes())
+
+        # Transaction and global fields
+        elif op == "txn":
+            self.push(self.txn_field(self.txn, args[0], int(args[1]) if len(args) > 1 else None, self.index))
+        elif op == "txna":
+            self.push(self.txn_field(self.txn, args[0], int(args[1]), self.index))
+        elif op == "txnas":
+            self.push(self.txn_field(self.txn, args[0], self.pop_int(), self.index))
+        elif op == "gtxn":
+            gi = int(args[0])
+            self.push(self.txn_field(self.group[gi], args[1], int(args[2]) if len(args) > 2 else None, gi))
+        elif op == "gtxna":
+            gi = int(args[0])
+            self.push(self.txn_field(self.group[gi], args[1], int(args[2]), gi))
+        elif op == "gtxns":
+            gi = self.pop_int()
+            if gi >= len(self.group):
+                raise AVMError("gtxns lookup TxnGroup[{}] but it only has {}".format(gi, len(self.group)))
+            self.push(self.txn_field(self.group[gi], args[0], int(args[1]) if len(args) > 1 else None, gi))
+        elif op == "gtxnsa":
+            gi = self.pop_int()
+            self.push(self.txn_field(self.group[gi], args[0], int(args[1]), gi))
+        elif op == "global":
+            self.push(self.global_field(args[0]))
+
+        # State access
+        elif op == "app_global_get":
+            key = self.pop_bytes()
+            self.push(ledger.apps[self.app_id]["global"].get(key, 0))
+        elif op == "app_global_get_ex":
+            key = self.pop_bytes()
+            app_id = self.resolve_app(self.pop_int())
+            state = ledger.apps[app_id]["global"] if app_id in ledger.apps else {}
+            self.push(state.get(key, 0))
+            self.push(key in state)
+        elif op == "app_global_put":
+            value = self.pop()
+            key = self.pop_bytes()
+            ledger.apps[self.app_id]["global"][key] = value
+        elif op == "app_global_del":
+            ledger.apps[self.app_id]["global"].pop(self.pop_bytes(), None)
+        elif op == "app_local_get":
+            key = self.pop_bytes()
+            local = self.local_state(self.resolve_account(self.pop()), self.app_id)
+            self.push(local.get(key, 0))
+        elif op == "app_local_get_ex":
+            key = self.pop_bytes()
+            app_id = self.resolve_app(self.pop_int())
+            acc = ledger.account(self.resolve_account(self.pop()))
+            local = acc["local"].get(app_id, {})
+            self.push(local.get(key, 0))
+            self.push(key in local)
+        elif op == "app_local_put":
+            value = self.pop()
+            key = self.pop_bytes()
+            self.local_state(self.resolve_account(self.pop()), self.app_id)[key] = value
+        elif op == "app_local_del":
+            key = self.pop_bytes()
+            self.local_state(self.resolve_account(self.pop()), self.app_id).pop(key, None)
+        elif op == "app_opted_in":
+            app_id = self.resolve_app(self.pop_int())
+            self.push(app_id in ledger.account(self.resolve_account(self.pop()))["local"])
+        elif op == "app_params_get":
+            app_id = self.resolve_app(self.pop_int())
+            if app_id not in ledger.apps:
+                self.push(0)
+                self.push(0)
+            elif args[0] == "AppAddress":
+                self.push(app_address(app_id))
+                self.push(1)
+            elif args[0] == "AppCreator":
+                self.push(ledger.apps[app_id]["creator"])
+                self.push(1)
+            else:
+                raise AVMError("unsupported app_params_get field " + args[0])
+        elif op == "balance":
+            self.push(ledger.account(self.resolve_account(self.pop()))["balance"])
+        elif op == "min_balance":
+            self.push(ledger.min_balance(self.resolve_account(self.pop())))
+        elif op == "asset_holding_get":
+            asset_id = self.resolve_asset(self.pop_int())
+            assets = ledger.account(self.resolve_account(self.pop()))["assets"]
+            if args[0] != "AssetBalance":
+                self.push(0)
+            else:
+                self.push(assets.get(asset_id, 0))
+            self.push(asset_id in assets)
+
+        # Boxes
+        elif op == "box_put":
+            value = self.pop_bytes()
+            name = self.pop_bytes()
+            boxes = self.box(name)
+            if name in boxes and len(boxes[name]) != len(value):
+                raise AVMError("box_put wrong size {} != {}".format(len(boxes[name]), len(value)))
+            boxes[name] = value
+        elif op == "box_create":
+            size = self.pop_int()
+            name = self.pop_bytes()
+            if size > MAX_BOX_SIZE:
+                raise AVMError("box size too large")
+            boxes = self.box(name)
+            if name in boxes:
+                if len(boxes[name]) != size:
+                    raise AVMError("box size mismatch {} {}".format(len(boxes[name]), size))
+                self.push(0)
+            else:
+                boxes[name] = bytes(size)
+                self.push(1)
+        elif op == "box_get":
+            name = self.pop_bytes()
+            boxes = self.box(name)
+            self.push(boxes.get(name, b""))
+            self.push(name in boxes)
+        elif op == "box_len":
+            name = self.pop_bytes()
+            boxes = self.box(name)
+            self.push(len(boxes.get(name, b"")))
+            self.push(name in boxes)
+        elif op == "box_del":
+            name = self.pop_bytes()
+            boxes = self.box(name)
+            self.push(boxes.pop(name, None) is not None)
+        elif op == "box_extract":
+            length = self.pop_int()
+            start = self.pop_int()
+            name = self.pop_bytes()
+            boxes = self.box(name)
+            if name not in boxes or start + length > len(boxes[name]):
+                raise AVMError("box_extract out of range")
+            self.push(boxes[name][start:start + length])
+        elif op == "box_replace":
+            value = self.pop_bytes()
+            start = self.pop_int()
+            name = self.pop_bytes()
+            boxes = self.box(name)
+            if name not in boxes or start + len(value) > len(boxes[name]):
+                raise AVMError("box_replace out of range")
+            boxes[name] = boxes[name][:start] + value + boxes[name][start + len(value):]
+
+        # Inner transactions
+        elif op == "itxn_begin":
+            if self.itxn_group is not None:
+                raise AVMError("itxn_begin without itxn_submit")
+            self.itxn_group = [self.new_inner()]
+        elif op == "itxn_next":
+            if self.itxn_group is None:
+                raise AVMError("itxn_next without itxn_begin")
+            self.itxn_group.append(self.new_inner())
+        elif op == "itxn_field":
+            if self.itxn_group is None:
+                raise AVMError("itxn_field without itxn_begin")
+            value = self.pop()
+            field = args[0]
+            if field in ARRAY_FIELDS:
+                self.itxn_group[-1][field].append(value)
+            elif field == "Type":
+                self.itxn_group[-1]["TypeEnum"] = {v: k for k, v in TYPE_NAMES.items()}[value]
+            else:
+                self.itxn_group[-1][field] = value
+        elif op == "itxn_submit":
+            if self.itxn_group is None:
+                raise AVMError("itxn_submit without itxn_begin")
+            group, self.itxn_group = self.itxn_group, None
+            self.submit_inner(group)
+        elif op in ("itxn", "itxna"):
+            if not self.last_itxn_group:
+                raise AVMError("no inner transaction available")
+            t = self.last_itxn_group[-1]
+            index = int(args[1]) if len(args) > 1 else None
+            self.push(self.txn_field(t, args[0], index, len(self.last_itxn_group) - 1))
+        elif op in ("gitxn", "gitxna"):
+            t = self.last_itxn_group[int(args[0])]
+            index = int(args[2]) if len(args) > 2 else None
+            self.push(self.txn_field(t, args[1], index, int(args[0])))
+        else:
+            raise AVMError("unsupported opcode " + op)
+        return None
+
+    @staticmethod
+    def arith(op, a, b):
+        if op == "+":
+            return a + b
+        if op == "-":
+            if b > a:
+                raise AVMError("- would result negative")
+            return a - b
+        if op == "*":
+            return a * b
+        if op in ("/", "%"):
+            if b == 0:
+                raise AVMError("{} by zero".format(op))
+            return a // b if op == "/" else a % b
+        if op == "exp":
+            if a == 0 and b == 0:
+                raise AVMError("0^0 is undefined")
+            return a ** b if b < 64 or a <= 1 else MAX_UINT64 + 1
+        if op == "shl":
+            return (a << b) & MAX_UINT64
+        if op == "shr":
+            return a >> b
+        return {"<": a < b, ">": a > b, "<=": a <= b, ">=": a >= b, "&&": bool(a and b), "||": bool(a or b),
+                "&": a & b, "|": a | b, "^": a ^ b}[op]
+
+    @staticmethod
+    def byte_math(op, a, b):
+        if op == "b+":
+            return big_bytes(a + b)
+        if op == "b-":
+            if b > a:
+                raise AVMError("byte math would have negative result")
+            return big_bytes(a - b)
+        if op == "b*":
+            return big_bytes(a * b)
+        if op in ("b/", "b%"):
+            if b == 0:
+                raise AVMError("division by zero")
+            return big_bytes(a // b if op == "b/" else a % b)
+        if op in ("b|", "b&", "b^"):
+            raise AVMError("bitwise byte math is not supported")
+        return {"b<": a < b, "b>": a > b, "b<=": a <= b, "b>=": a >= b, "b==": a == b, "b!=": a != b}[op]
+
+    def local_state(self, address, app_id):
+        local = self.ledger.account(address)["local"]
+        if app_id not in local:
+            raise AVMError("account {} is not opted into app {}".format(encode_address(address), app_id))
+        return local[app_id]
+
+    def new_inner(self):
+        sender = app_address(self.app_id)
+        txn = make_txn(PAY, sender, Fee=None)
+        return txn
+
+    def submit_inner(self, group):
+        gctx = self.gctx
+        gctx.inner_count += len(group)
+        if gctx.inner_count > MAX_INNER_TXNS:
+            raise AVMError("too many inner transactions")
+        # Fees are pooled over the inner group - fees paid in excess by some of its transactions (e.g. an app call
+        # paying for the others) and the credit of the top-level group pay for the transactions with a lower fee
+        set_fees = sum(t["Fee"] for t in group if t["Fee"] is not None)
+        credit = gctx.fee_credit + set_fees - MIN_TX_FEE * sum(1 for t in group if t["Fee"] is not None)
+        for t in group:
+            # Inner transactions with an unset fee pay the minimum from the credit of the group if available
+            if t["Fee"] is None:
+                t["Fee"] = 0 if credit >= MIN_TX_FEE else MIN_TX_FEE
+                credit -= MIN_TX_FEE - t["Fee"]
+        gctx.fee_credit += sum(t["Fee"] for t in group) - MIN_TX_FEE * len(group)
+        if gctx.fee_credit < 0:
+            raise AVMError("fee too small")
+        for i, t in enumerate(group):
+            if t["TypeEnum"] == APPL:
+                t["CallerApplicationID"] = self.app_id
+                gctx.budget += APP_CALL_BUDGET
+            result = apply_txn(gctx, group, i)
+            result["fee"] = t["Fee"]
+            t["Logs"] = result.get("logs", [])
+            self.inner.append(result)
+        self.last_itxn_group = group
+
+
+# Function applies a single transaction of a group, returning a result with its opcode cost, logs and inner
+# transactions
+def apply_txn(gctx, group, index):
+    ledger = gctx.ledger
+    txn = group[index]
+    sender = txn["Sender"]
+    result = {"cost": 0, "logs": [], "inner": []}
+
+    acc = ledger.account(sender)
+    if acc["balance"] < txn["Fee"]:
+        raise AVMError("overspend: fee {}".format(txn["Fee"]))
+    acc["balance"] -= txn["Fee"]
+
+    t = txn["TypeEnum"]
+    if t == PAY:
+        amount = txn.get("Amount", 0)
+        if acc["balance"] < amount:
+            raise AVMError("overspend: account {} balance {}, amount {}".format(
+                encode_address(sender), acc["balance"], amount))
+        acc["balance"] -= amount
+        ledger.fund(txn.get("Receiver", bytes(32)), amount)
+        close_to = txn.get("CloseRemainderTo", bytes(32))
+        if close_to != bytes(32):
+            ledger.fund(close_to, acc["balance"])
+            acc["balance"] = 0
+
+    elif t == AXFER:
+        asset_id = txn["XferAsset"]
+        receiver = txn.get("AssetReceiver", bytes(32))
+        amount = txn.get("AssetAmount", 0)
+        close_to = txn.get("AssetCloseTo", bytes(32))
+        if receiver == sender and amount == 0 and asset_id not in acc["assets"]:
+            # Opt-in
+            acc["assets"][asset_id] = 0
+        else:
+            if asset_id not in acc["assets"] or acc["assets"][asset_id] < amount:
+                raise AVMError("underflow on subtracting {} from sender amount".format(amount))
+            if amount > 0 or receiver != bytes(32):
+                recv = ledger.account(receiver)["assets"]
+                if asset_id not in recv:
+                    raise AVMError("receiver error: must optin, assetid={}".format(asset_id))
+                acc["assets"][asset_id] -= amount
+                recv[asset_id] += amount
+            if close_to != bytes(32):
+                ledger.account(close_to)["assets"][asset_id] += acc["assets"].pop(asset_id)
+
+    elif t == APPL:
+        app_id = txn.get("ApplicationID", 0)
+        oc = txn.get("OnCompletion", NOOP)
+        if app_id == 0:
+            # Approval program can also be an application implemented in Python
+            program = txn.get("ApprovalProgram")
+            app_id = ledger.create_app(sender, program=None if callable(program) else program,
+                                       handler=program if callable(program) else None,
+                                       clear=txn.get("ClearStateProgram"),
+                                       global_schema=txn.get("GlobalSchema", (0, 0)),
+                                       local_schema=txn.get("LocalSchema", (0, 0)))
+            result["application-index"] = app_id
+        if app_id not in ledger.apps:
+            raise AVMError("application {} does not exist".format(app_id))
+        app = ledger.apps[app_id]
+        if oc == OPTIN:
+            if app_id in acc["local"]:
+                raise AVMError("account has already opted in to app {}".format(app_id))
+            acc["local"][app_id] = {}
+
+        if oc == CLEARSTATE:
+            # Clear state program can't reject the removal of local state
+            if app["clear"] is not None:
+                ctx = EvalContext(gctx, group, index, app_id)
+                try:
+                    ctx.run(app["clear"])
+                except AVMError:
+                    pass
+            acc["local"].pop(app_id, None)
+        elif app["handler"] is not None:
+            # Handlers get the same view as programs - the group, the index of the call and the app ID - and return
+            # the logs of the call or raise AVMError to reject it
+            result["logs"] = app["handler"](gctx, group, index, app_id) or []
+        else:
+            ctx = EvalContext(gctx, group, index, app_id)
+            if not ctx.run(app["program"]):
+                raise AVMError("transaction rejected by ApprovalProgram")
+            result["cost"] = ctx.cost
+            result["logs"] = ctx.logs
+            result["inner"] = ctx.inner
+
+        if oc == CLOSEOUT:
+            acc["local"].pop(app_id, None)
+        elif oc == DELETE:
+            ledger.apps.pop(app_id, None)
+    return result
+
+
+# Function executes a top-level group of transactions atomically. Returns a list of results of the transactions, or
+# raises AVMError (in which case the ledger is left unchanged).
+#  If enforce_budget is False, the opcode budget is not limited (used for measuring costs of programs).
+def execute_group(ledger, group, enforce_budget=True):
+    if not 0 < len(group) <= MAX_GROUP_SIZE:
+        raise AVMError("group size must be between 1 and {}".format(MAX_GROUP_SIZE))
+    snap = ledger.snapshot()
+    try:
+        gctx = GroupContext(ledger, group, enforce_budget)
+        results = [apply_txn(gctx, group, i) for i in range(len(group))]
+        # Minimum balances must hold at the end of the group
+        for address, acc in ledger.accounts.items():
+            mbr = ledger.min_balance(address)
+            # Empty (closed) accounts have no minimum balance
+            if acc["balance"] < mbr and not (acc["balance"] == 0 and mbr == MIN_BALANCE):
+                raise AVMError("account {} balance {} below min {}".format(
+                    encode_address(address), acc["balance"], mbr))
+    except AVMError:
+        ledger.restore(snap)
+        raise
+    for r in results:
+        r["budget-consumed"] = gctx.used
+        r["budget-added"] = gctx.budget
+    return results
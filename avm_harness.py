@@ -0,0 +1,705 @@
+# -----------------           Description          -----------------
+# Offline harness for the Autocompounder built on the local AVM stand-in (avm.py). It provides:
+#   - a scripted mock of the Cometa staking contract (SC) with linear reward accrual,
+#   - builders of transaction groups for each contract interaction (same as in demo/interact_w_CompoundContract.py),
+#   - a Python reference model of the contract, which is run as an application implemented in Python,
+#   - differential execution of a scenario against the compiled TEAL and the reference model,
+#   - per-method opcode cost curves by box count and the cost models of box_packer fitted to them.
+#
+# Example: python avm_harness.py --teal approval.teal --max-boxes 128
+# (without --teal, the TEAL is generated from contract.py through the compile cache, which needs PyTEAL and Beaker)
+
+# -----------------           Imports          -----------------
+import argparse
+import copy
+import hashlib
+
+from avm import AVMError, Ledger, Program, execute_group, make_txn, app_address, big_bytes, PAY, AXFER, APPL, \
+    OPTIN, CLOSEOUT, MIN_TX_FEE
+from autocompounder_abi import Autocompounder, SELECTORS
+from box_packer import LOCAL_CLAIM_COST, DELETE_BOXES_COST, fit_cost_model
+from preflight import MAX_INNER_TXNS
+
+# ---------------------------------------------------------------
+
+# Fixed point one in the QM.N format of the local stake
+FIXED_ONE = 1 << (8 * Autocompounder.LOCAL_STAKE_N)
+LOCAL_STAKE_ZERO = bytes(Autocompounder.LOCAL_STAKE_SIZE)
+# Prefix of ABI return values in logs
+ABI_RETURN_PREFIX = bytes.fromhex("151f7c75")
+
+# State schemas of the contract (global: 11 uints, local: LNB and LS)
+GLOBAL_SCHEMA = (11, 0)
+LOCAL_SCHEMA = (1, 1)
+
+# Arguments of calls to the SC
+SC_ARGS_PREFIX = [bytes([0]), bytes([3]), bytes(8)]
+SC_CLAIM_ARG = bytes(9)
+SC_STAKE = 0x02
+SC_UNSTAKE = 0x03
+
+METHOD_NAMES = {selector: name for name, selector in SELECTORS.items()}
+
+
+# Helper function that creates a deterministic test account
+def test_account(name):
+    return hashlib.sha256(name.encode()).digest()
+
+
+# Helper function to create the name of a box
+def box_name(n):
+    return n.to_bytes(Autocompounder.BOX_NAME_SIZE, "big")
+
+
+# Helper function to transfer an asset between accounts of a ledger
+def move_asset(ledger, asset_id, sender, receiver, amount):
+    src = ledger.account(sender)["assets"]
+    dst = ledger.account(receiver)["assets"]
+    if src.get(asset_id, 0) < amount or asset_id not in dst:
+        raise AVMError("asset transfer of {} failed".format(amount))
+    src[asset_id] -= amount
+    dst[asset_id] += amount
+
+
+class MockStakingContract:
+    # Scripted mock of the Cometa staking contract. Stake accrues rewards (in the staking asset) linearly with
+    # reward_rate per round between pool start and end rounds.
+
+    def __init__(self, ledger, creator, asset_id, start_round, end_round, reward_rate=1e-4, supply=10 ** 15):
+        self.ledger = ledger
+        self.asset_id = asset_id
+        self.start_round = start_round
+        self.end_round = end_round
+        self.reward_rate = reward_rate
+        self.staked = {}
+        self.unclaimed = {}
+        self.last_round = {}
+        # Global state at key 0x00 holds asset ID (at byte 48), pool start round (56) and pool end round (64)
+        state = bytes(48) + asset_id.to_bytes(8, "big") + start_round.to_bytes(8, "big") + end_round.to_bytes(8, "big")
+        self.app_id = ledger.create_app(creator, handler=self.handle, global_state={bytes([0]): state})
+        self.address = app_address(self.app_id)
+        ledger.fund(self.address, 10 ** 9)
+        ledger.account(self.address)["assets"][asset_id] = supply
+
+    def accrue(self, address):
+        # Accrue rewards of an address up to the current round
+        rnd = min(max(self.ledger.round, self.start_round), self.end_round)
+        last = self.last_round.get(address, rnd)
+        reward = int(self.staked.get(address, 0) * self.reward_rate * max(0, rnd - last))
+        self.unclaimed[address] = self.unclaimed.get(address, 0) + reward
+        self.last_round[address] = rnd
+
+    def claim(self, address):
+        self.accrue(address)
+        amount = self.unclaimed.pop(address, 0)
+        move_asset(self.ledger, self.asset_id, self.address, address, amount)
+        return amount
+
+    def stake(self, address, amount):
+        # The staked amount has already been transferred to the SC
+        self.accrue(address)
+        self.staked[address] = self.staked.get(address, 0) + amount
+
+    def unstake(self, address, amount):
+        self.accrue(address)
+        if self.staked.get(address, 0) < amount:
+            raise AVMError("SC: unstaking more than staked")
+        self.staked[address] -= amount
+        move_asset(self.ledger, self.asset_id, self.address, address, amount)
+
+    def handle(self, gctx, group, index, app_id):
+        txn = group[index]
+        if txn.get("OnCompletion", 0) != 0:
+            return []
+        args = txn["ApplicationArgs"]
+        if args[:3] != SC_ARGS_PREFIX or len(args) != 4:
+            raise AVMError("SC: unexpected call")
+        sender = txn["Sender"]
+        if args[3] == SC_CLAIM_ARG:
+            amount = self.claim(sender)
+            return [bytes(16) + amount.to_bytes(8, "big")]
+        op, amount = args[3][0], int.from_bytes(args[3][1:9], "big")
+        if op == SC_STAKE:
+            self.stake(sender, amount)
+        elif op == SC_UNSTAKE:
+            self.unstake(sender, amount)
+        else:
+            raise AVMError("SC: unknown operation")
+        return []
+
+
+class ReferenceModel:
+    # Python reference model of the Autocompounder contract, run as an application implemented in Python.
+    # It mirrors the contract's state transitions (global and local state, boxes, assets staked to the SC and fee
+    # assertions) and the fees its inner transactions pay from the ALGO balance of the app.
+
+    def __init__(self, sc):
+        self.sc = sc
+        self.ledger = sc.ledger
+
+    # ----- -----    State helpers     ----- -----
+
+    def g(self, key):
+        return self.app["global"].get(key.encode(), 0)
+
+    def set_g(self, key, value):
+        self.app["global"][key.encode()] = value
+
+    def local(self, address):
+        local = self.ledger.account(address)["local"]
+        if self.app_id not in local:
+            raise AVMError("not opted in")
+        return local[self.app_id]
+
+    @staticmethod
+    def check(condition, message="assert failed"):
+        if not condition:
+            raise AVMError(message)
+
+    def ls(self, address):
+        return int.from_bytes(self.local(address)[b"LS"], "big")
+
+    def floor_local_stake(self, address):
+        ls = self.local(address)[b"LS"]
+        if len(ls) > Autocompounder.LOCAL_STAKE_N:
+            return int.from_bytes(ls[:len(ls) - Autocompounder.LOCAL_STAKE_N], "big")
+        return 0
+
+    def pay_fee(self, fee):
+        # Inner transactions of the contract that pay fees pay them from the balance of the app
+        account = self.ledger.account(app_address(self.app_id))
+        self.check(account["balance"] - fee >= self.ledger.min_balance(app_address(self.app_id)), "overspend")
+        account["balance"] -= fee
+
+    def next_compound_round(self):
+        address = app_address(self.app_id)
+        num_triggers = (self.ledger.account(address)["balance"] - self.ledger.min_balance(address)) \
+            // Autocompounder.CC_FEE_FOR_COMPOUND
+        self.check(num_triggers > 0, "/ by zero")
+        return (self.g("PER") - self.g("LCR")) // num_triggers + self.g("LCR")
+
+    # ----- -----    Internal methods     ----- -----
+
+    def claim_stake_record(self, amt):
+        ts = self.g("TS")
+        self.check(ts > 0)
+        claim = self.sc.claim(app_address(self.app_id))
+        self.pay_fee(Autocompounder.CLAIM_FROM_SC_FEE)
+        self.set_g("NB", self.g("NB") + 1)
+        increase = FIXED_ONE + (claim << (8 * Autocompounder.LOCAL_STAKE_N)) // ts
+        name = box_name(self.g("NB"))
+        self.check((self.app_id, name) in self.gctx.boxes, "invalid Box reference")
+        self.app["boxes"][name] = big_bytes(increase)
+        stake_amt = claim + amt
+        if stake_amt > 0:
+            self.stake_to_sc(stake_amt)
+            self.set_g("TS", ts + stake_amt)
+        self.set_g("LCR", self.ledger.round)
+
+    def stake_to_sc(self, amt):
+        move_asset(self.ledger, self.g("S_ASA_ID"), app_address(self.app_id), self.sc.address, amt)
+        self.sc.stake(app_address(self.app_id), amt)
+        self.pay_fee(Autocompounder.STAKE_TO_SC_FEE)
+
+    def unstake_from_sc(self, amt):
+        self.sc.unstake(app_address(self.app_id), amt)
+        self.pay_fee(Autocompounder.UNSTAKE_FROM_SC_FEE)
+
+    def local_claim_box(self, address, box_int):
+        name = box_name(box_int)
+        self.check((self.app_id, name) in self.gctx.boxes, "invalid Box reference")
+        self.check(name in self.app["boxes"], "box does not exist")
+        local = self.local(address)
+        self.check(box_int == local[b"LNB"] + 1)
+        increase = int.from_bytes(self.app["boxes"][name], "big")
+        local[b"LS"] = big_bytes(self.ls(address) * increase // FIXED_ONE)
+        local[b"LNB"] = box_int
+
+    # ----- -----    Dispatch     ----- -----
+
+    def handle(self, gctx, group, index, app_id):
+        self.gctx = gctx
+        self.group = group
+        self.index = index
+        self.app_id = app_id
+        self.app = self.ledger.apps[app_id]
+        txn = group[index]
+        self.sender = txn["Sender"]
+        oc = txn.get("OnCompletion", 0)
+        if oc == OPTIN:
+            return self.opt_in()
+        if oc == CLOSEOUT:
+            return self.close_out()
+        args = txn["ApplicationArgs"]
+        self.check(oc == 0 and args and args[0] in METHOD_NAMES, "unknown method")
+        name = METHOD_NAMES[args[0]]
+        if name == "create":
+            self.check(txn.get("ApplicationID", 0) == 0)
+        else:
+            self.check(txn.get("ApplicationID", 0) != 0)
+        uint_args = [int.from_bytes(a, "big") for a in args[1:]]
+        return getattr(self, name)(*uint_args)
+
+    # ----- -----    External methods     ----- -----
+
+    def create(self, sc_id, ac_id, claim_period):
+        self.set_g("SC_ID", sc_id)
+        self.set_g("AC_ID", ac_id)
+        self.set_g("CP", claim_period)
+        state = self.ledger.apps[sc_id]["global"][bytes([0])]
+        self.set_g("PSR", int.from_bytes(state[56:64], "big"))
+        self.set_g("PER", int.from_bytes(state[64:72], "big"))
+        self.set_g("S_ASA_ID", int.from_bytes(state[48:56], "big"))
+        for key in ("TS", "LCD", "LCR", "NS", "NB"):
+            self.set_g(key, 0)
+
+    def on_setup(self):
+        self.check(self.sender == self.app["creator"])
+        self.check(self.g("LCR") == 0)
+        self.set_g("LCR", self.g("PSR"))
+        self.ledger.account(app_address(self.app_id))["assets"].setdefault(self.g("S_ASA_ID"), 0)
+        self.ledger.account(app_address(self.app_id))["local"].setdefault(self.g("SC_ID"), {})
+
+    def opt_in(self):
+        self.check(self.g("PER") > self.ledger.round)
+        self.check(self.g("LCR") > 0)
+        local = self.local(self.sender)
+        local[b"LNB"] = self.g("NB")
+        local[b"LS"] = LOCAL_STAKE_ZERO
+        self.set_g("NS", self.g("NS") + 1)
+
+    def close_out(self):
+        self.check(self.floor_local_stake(self.sender) == 0)
+        self.set_g("NS", self.g("NS") - 1)
+
+    def trigger_compound(self):
+        self.check(self.next_compound_round() <= self.ledger.round)
+        self.check(self.ledger.round > self.g("PSR"))
+        self.claim_stake_record(0)
+
+    def stake(self):
+        pay = self.group[self.index - 2]
+        xfer = self.group[self.index - 1]
+        address = app_address(self.app_id)
+        self.check(self.ledger.round < self.g("PER"))
+        local = self.local(self.sender)
+        if local[b"LNB"] != self.g("NB"):
+            self.check(self.ls(self.sender) == 0)
+            local[b"LNB"] = self.g("NB")
+        self.check(pay["TypeEnum"] == PAY and pay.get("Receiver") == address)
+        self.check(xfer["TypeEnum"] == AXFER and xfer.get("AssetReceiver") == address)
+        self.check(xfer["XferAsset"] == self.g("S_ASA_ID"))
+        amt, amt_xfer = pay.get("Amount", 0), xfer.get("AssetAmount", 0)
+        if self.ledger.round > self.g("PSR") and self.g("TS") > 0:
+            self.check(amt >= 2 * Autocompounder.CC_FEE_FOR_COMPOUND)
+            self.claim_stake_record(amt_xfer)
+            self.local_claim_box(self.sender, self.g("NB"))
+        else:
+            self.check(amt >= Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.STAKE_TO_SC_FEE)
+            self.stake_to_sc(amt_xfer)
+            self.set_g("TS", self.g("TS") + amt_xfer)
+        local[b"LS"] = big_bytes(self.ls(self.sender) + (amt_xfer << (8 * Autocompounder.LOCAL_STAKE_N)))
+
+    def compound_now(self):
+        pay = self.group[self.index - 1]
+        self.check(self.ledger.round < self.g("PER"))
+        self.check(self.ledger.round > self.g("PSR"))
+        self.check(pay["TypeEnum"] == PAY and pay.get("Receiver") == app_address(self.app_id))
+        self.check(pay.get("Amount", 0) >= Autocompounder.CC_FEE_FOR_COMPOUND)
+        self.claim_stake_record(0)
+
+    def withdraw(self, amt):
+        pay = self.group[self.index - 1]
+        local = self.local(self.sender)
+        self.check(local[b"LNB"] == self.g("NB"))
+        self.check(pay["TypeEnum"] == PAY and pay.get("Receiver") == app_address(self.app_id))
+        amt_fee = pay.get("Amount", 0)
+        local_stake_b = self.floor_local_stake(self.sender)
+        self.check(amt <= local_stake_b)
+        rnd = self.ledger.round
+        if rnd < self.g("PSR"):
+            self.unstake_from_sc(amt)
+            amt_b = amt
+            self.check(amt_fee >= Autocompounder.UNSTAKE_FROM_SC_FEE)
+        elif rnd <= self.g("PER"):
+            self.claim_stake_record(0)
+            self.local_claim_box(self.sender, self.g("NB"))
+            amt_b = self.floor_local_stake(self.sender) if amt == local_stake_b else amt
+            self.unstake_from_sc(amt_b)
+            self.check(amt_fee >= Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.UNSTAKE_FROM_SC_FEE)
+        elif self.g("LCD") == Autocompounder.LAST_COMPOUND_NOT_DONE:
+            self.claim_stake_record(0)
+            self.local_claim_box(self.sender, self.g("NB"))
+            amt_b = self.floor_local_stake(self.sender) if amt == local_stake_b else amt
+            self.unstake_from_sc(self.g("TS"))
+            self.check(amt_fee >= Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.UNSTAKE_FROM_SC_FEE)
+            self.set_g("LCD", Autocompounder.LAST_COMPOUND_DONE)
+        else:
+            amt_b = amt
+        move_asset(self.ledger, self.g("S_ASA_ID"), app_address(self.app_id), self.sender, amt_b)
+        self.check(self.g("TS") >= amt_b, "- would result negative")
+        self.set_g("TS", self.g("TS") - amt_b)
+        self.check(self.ls(self.sender) >= amt_b << (8 * Autocompounder.LOCAL_STAKE_N))
+        local[b"LS"] = big_bytes(self.ls(self.sender) - (amt_b << (8 * Autocompounder.LOCAL_STAKE_N)))
+        return [ABI_RETURN_PREFIX + amt_b.to_bytes(8, "big")]
+
+    def local_claim(self, up_to_box):
+        for i in range(self.local(self.sender)[b"LNB"] + 1, up_to_box + 1):
+            self.local_claim_box(self.sender, i)
+
+    def delete_boxes(self, down_to_box):
+        self.check(self.sender == self.app["creator"])
+        rnd = self.ledger.round
+        self.check((self.g("NS") == 0 and rnd > self.g("PER")) or rnd > self.g("PER") + self.g("CP"))
+        idx = self.g("NB")
+        while idx > down_to_box:
+            name = box_name(idx)
+            self.check((self.app_id, name) in self.gctx.boxes, "invalid Box reference")
+            self.check(self.app["boxes"].pop(name, None) is not None)
+            idx -= 1
+        self.set_g("NB", idx)
+
+
+# ----- -----    Transaction groups     ----- -----
+
+# Function counts inner transactions of an executed transaction (recursively) that were paid from the pooled fee
+def pooled_inner(result):
+    return sum((inner["fee"] == 0) + pooled_inner(inner) for inner in result.get("inner", []))
+
+
+class Pool:
+    # An autocompounder deployed on a ledger together with a mock SC, and builders of transaction groups for it.
+    # The approval program is either TEAL source or None to run the reference model.
+
+    def __init__(self, approval=None, clear="#pragma version 8\nint 1\nreturn", psr=100, per=10_000, cp=1_000,
+                 reward_rate=1e-4, asset_id=10458941):
+        self.ledger = Ledger(round=1)
+        self.creator = test_account("creator")
+        self.ledger.fund(self.creator, 10 ** 12)
+        self.asset_id = asset_id
+        self.sc = MockStakingContract(self.ledger, test_account("cometa"), asset_id, psr, per, reward_rate)
+        self.ac_id = self.ledger.create_app(test_account("cometa"), handler=lambda *args: [])
+        self.model = ReferenceModel(self.sc) if approval is None else None
+        program = self.model.handle if approval is None else Program(approval)
+        self.approval = program
+        self.clear = Program(clear)
+        self.app_id = None
+        self.cp = cp
+
+    @property
+    def address(self):
+        return app_address(self.app_id)
+
+    def nb(self):
+        return self.ledger.apps[self.app_id]["global"].get(b"NB", 0)
+
+    def lnb(self, user):
+        return self.ledger.account(user)["local"].get(self.app_id, {}).get(b"LNB", 0)
+
+    def new_user(self, name, algos=10 ** 10, tokens=10 ** 12):
+        user = test_account(name)
+        self.ledger.fund(user, algos)
+        self.ledger.account(user)["assets"][self.asset_id] = tokens
+        return user
+
+    def call(self, sender, method, args=(), fee=MIN_TX_FEE, boxes=(), **fields):
+        app_args = [SELECTORS[method]] + [a.to_bytes(8, "big") for a in args]
+        return make_txn(APPL, sender, Fee=fee, ApplicationID=self.app_id, ApplicationArgs=app_args,
+                        Boxes=[(0, box_name(b)) for b in boxes], **fields)
+
+    def pay(self, sender, amount, fee=MIN_TX_FEE):
+        return make_txn(PAY, sender, Fee=fee, Receiver=self.address, Amount=amount)
+
+    def sc_refs(self):
+        return {"Assets": [self.asset_id], "Applications": [self.sc.app_id, self.ac_id],
+                "Accounts": [self.sc.address]}
+
+    # ----- -----    Groups     ----- -----
+
+    def create_group(self):
+        txn = make_txn(APPL, self.creator, ApplicationID=0, ApprovalProgram=self.approval,
+                       ClearStateProgram=self.clear, GlobalSchema=GLOBAL_SCHEMA, LocalSchema=LOCAL_SCHEMA,
+                       ApplicationArgs=[SELECTORS["create"]] + [v.to_bytes(8, "big")
+                                                                for v in (self.sc.app_id, self.ac_id, self.cp)],
+                       Applications=[self.sc.app_id])
+        return [txn]
+
+    def setup_group(self):
+        return [
+            self.pay(self.creator, 100_000 + 100_000 + 50_000 * 3),
+            self.call(self.creator, "on_setup", Assets=[self.asset_id], Applications=[self.sc.app_id]),
+        ]
+
+    def optin_group(self, user):
+        return [make_txn(APPL, user, ApplicationID=self.app_id, OnCompletion=OPTIN)]
+
+    def optout_group(self, user):
+        return [make_txn(APPL, user, ApplicationID=self.app_id, OnCompletion=CLOSEOUT)]
+
+    def stake_group(self, user, amount, fee_amount=None):
+        g = self.ledger.apps[self.app_id]["global"]
+        if fee_amount is None:
+            live = self.ledger.round > g.get(b"PSR", 0) and g.get(b"TS", 0) > 0
+            fee_amount = 2 * Autocompounder.CC_FEE_FOR_COMPOUND if live else \
+                Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.STAKE_TO_SC_FEE
+        return [
+            self.pay(user, fee_amount),
+            make_txn(AXFER, user, XferAsset=self.asset_id, AssetReceiver=self.address, AssetAmount=amount),
+            self.call(user, "stake", boxes=[self.nb() + 1], **self.sc_refs()),
+        ]
+
+    def withdraw_group(self, user, amount):
+        fee_amount = Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.UNSTAKE_FROM_SC_FEE
+        return [
+            self.pay(user, fee_amount),
+            self.call(user, "withdraw", [amount], boxes=[self.nb() + 1], **self.sc_refs()),
+        ]
+
+    def trigger_group(self, user):
+        refs = self.sc_refs()
+        refs["Accounts"] = [self.address, self.sc.address]
+        return [self.call(user, "trigger_compound", boxes=[self.nb() + 1], **refs)]
+
+    def compound_now_group(self, user):
+        return [
+            self.pay(user, Autocompounder.CC_FEE_FOR_COMPOUND),
+            self.call(user, "compound_now", boxes=[self.nb() + 1], **self.sc_refs()),
+        ]
+
+    def schedule_group(self, user, triggers=1):
+        return [self.pay(user, triggers * Autocompounder.CC_FEE_FOR_COMPOUND)]
+
+    def local_claim_group(self, user, up_to):
+        return [self.call(user, "local_claim", [up_to], boxes=range(self.lnb(user) + 1, up_to + 1))]
+
+    def delete_boxes_group(self, down_to):
+        return [self.call(self.creator, "delete_boxes", [down_to], boxes=range(self.nb(), down_to, -1))]
+
+    # Function sets the fees of a group the same way as the preflight of the demo (preflight.py) - the group is first
+    #  executed on a copy of the state with its first transaction paying for the most inner transactions of each app
+    #  call, then the first transaction pays the minimal fee of the group and of the inner transactions with zero fee
+    def set_fees(self, group, enforce_budget=True):
+        calls = sum(1 for t in group if t["TypeEnum"] == APPL)
+        trial = [dict(t, Fee=0) for t in group]
+        trial[0]["Fee"] = MIN_TX_FEE * (len(group) + MAX_INNER_TXNS * calls)
+        ledger_snapshot = self.ledger.snapshot()
+        sc_snapshot = copy.deepcopy((self.sc.staked, self.sc.unclaimed, self.sc.last_round))
+        try:
+            results = execute_group(self.ledger, trial, enforce_budget)
+        except AVMError:
+            # Groups that would fail are left as they are, so they fail the same way when executed
+            return group
+        finally:
+            self.ledger.restore(ledger_snapshot)
+            self.sc.staked, self.sc.unclaimed, self.sc.last_round = sc_snapshot
+        fee = MIN_TX_FEE * (len(group) + sum(pooled_inner(r) for r in results))
+        return [dict(t, Fee=fee if i == 0 else 0) for i, t in enumerate(group)]
+
+    def execute(self, group, enforce_budget=True):
+        results = execute_group(self.ledger, self.set_fees(group, enforce_budget), enforce_budget)
+        if self.app_id is None:
+            self.app_id = results[0]["application-index"]
+            # Fund the app account with its minimum balance
+            self.ledger.fund(self.address, 0)
+        return results
+
+
+# ----- -----    Differential execution     ----- -----
+
+# Default scenario: list of (action, arguments)
+DEFAULT_SCENARIO = [
+    ("create",),
+    ("setup",),
+    ("optin", "a"),
+    ("stake", "a", 1_000_000),
+    ("optin", "b"),
+    ("advance", 200),
+    ("trigger", "b"),
+    ("stake", "b", 500_000),
+    ("advance", 1_000),
+    ("schedule", "a", 3),
+    ("trigger", "a"),
+    ("compound_now", "a"),
+    ("local_claim", "b"),
+    ("withdraw", "b", 100_000),
+    ("advance", 2_000),
+    ("trigger", "b"),
+    ("local_claim", "a"),
+    ("withdraw", "a", 1),
+    ("advance", 10_000),
+    ("withdraw_all", "a"),
+    ("local_claim", "b"),
+    ("withdraw_all", "b"),
+    ("optout", "a"),
+    ("optout", "b"),
+    ("advance", 10),
+    ("delete_boxes", 0),
+]
+
+
+# Function builds the group for an action of a scenario (or advances the round)
+def build_action(pool, users, action):
+    kind, args = action[0], action[1:]
+    if kind == "advance":
+        pool.ledger.round += args[0]
+        return None
+    user = None
+    if args and isinstance(args[0], str):
+        if args[0] not in users:
+            users[args[0]] = pool.new_user(args[0])
+        user = users[args[0]]
+        args = args[1:]
+    if kind == "create":
+        return pool.create_group()
+    if kind == "setup":
+        return pool.setup_group()
+    if kind == "optin":
+        return pool.optin_group(user)
+    if kind == "optout":
+        return pool.optout_group(user)
+    if kind == "stake":
+        return pool.stake_group(user, *args)
+    if kind == "withdraw":
+        return pool.withdraw_group(user, *args)
+    if kind == "withdraw_all":
+        ls = pool.ledger.account(user)["local"].get(pool.app_id, {}).get(b"LS", b"")
+        return pool.withdraw_group(user, int.from_bytes(ls, "big") >> (8 * Autocompounder.LOCAL_STAKE_N))
+    if kind == "trigger":
+        return pool.trigger_group(user)
+    if kind == "compound_now":
+        return pool.compound_now_group(user)
+    if kind == "schedule":
+        return pool.schedule_group(user, *args)
+    if kind == "local_claim":
+        return pool.local_claim_group(user, pool.nb())
+    if kind == "delete_boxes":
+        return pool.delete_boxes_group(*args)
+    raise ValueError("unknown action " + kind)
+
+
+# Function returns the part of the state of a pool which is compared between TEAL and the reference model
+def pool_state(pool, users):
+    if pool.app_id is None or pool.app_id not in pool.ledger.apps:
+        return None
+    app = pool.ledger.apps[pool.app_id]
+    state = {
+        "global": dict(app["global"]),
+        "boxes": dict(app["boxes"]),
+        "app_assets": dict(pool.ledger.account(pool.address)["assets"]),
+        "sc_staked": dict(pool.sc.staked),
+    }
+    for name, user in users.items():
+        acc = pool.ledger.account(user)
+        state["local_" + name] = dict(acc["local"].get(pool.app_id, {}))
+        state["assets_" + name] = dict(acc["assets"])
+    return state
+
+
+# Function runs a scenario against the compiled TEAL and the reference model, returning a list of mismatches
+# (action, description) together with the opcode costs of each action of the TEAL run
+def differential(approval_teal, scenario=DEFAULT_SCENARIO, clear_teal="#pragma version 8\nint 1\nreturn"):
+    teal_pool = Pool(approval_teal, clear_teal)
+    model_pool = Pool(None, clear_teal)
+    teal_users, model_users = {}, {}
+    mismatches = []
+    costs = []
+
+    for action in scenario:
+        outcomes = []
+        for pool, users in ((teal_pool, teal_users), (model_pool, model_users)):
+            group = build_action(pool, users, action)
+            if group is None:
+                outcomes.append(("advanced", None))
+                continue
+            try:
+                results = pool.execute(group)
+                outcomes.append(("ok", [r["logs"] for r in results]))
+                if pool is teal_pool:
+                    costs.append((action, sum(r["cost"] for r in results)))
+            except AVMError as e:
+                outcomes.append(("rejected", str(e)))
+
+        (teal_status, teal_detail), (model_status, model_detail) = outcomes
+        if teal_status != model_status:
+            mismatches.append((action, "TEAL {} ({}) vs model {} ({})".format(
+                teal_status, teal_detail, model_status, model_detail)))
+        elif teal_status == "ok" and teal_detail[-1:] != model_detail[-1:]:
+            mismatches.append((action, "logs differ: {} vs {}".format(teal_detail, model_detail)))
+
+        teal_state, model_state = pool_state(teal_pool, teal_users), pool_state(model_pool, model_users)
+        if teal_state != model_state:
+            keys = sorted(k for k in set(teal_state or {}) | set(model_state or {})
+                          if (teal_state or {}).get(k) != (model_state or {}).get(k))
+            mismatches.append((action, "state differs in: " + ", ".join(keys)))
+
+    return mismatches, costs
+
+
+# ----- -----    Cost curves     ----- -----
+
+# Function seeds a deployed pool with n boxes and a user who has not yet claimed any of them
+def seed_boxes(pool, user, n, increase=FIXED_ONE + FIXED_ONE // 1000):
+    app = pool.ledger.apps[pool.app_id]
+    for i in range(1, n + 1):
+        app["boxes"][box_name(i)] = big_bytes(increase)
+    app["global"][b"NB"] = n
+    pool.ledger.account(user)["local"][pool.app_id] = {b"LNB": 0, b"LS": big_bytes(1_000_000 * FIXED_ONE)}
+    pool.ledger.fund(pool.address, n * Autocompounder.BOX_FEE)
+
+
+# Function measures opcode costs of local_claim and delete_boxes by the number of boxes processed in a single call
+def cost_curves(approval_teal, box_counts, clear_teal="#pragma version 8\nint 1\nreturn"):
+    curves = {"local_claim": [], "delete_boxes": []}
+    for n in box_counts:
+        pool = Pool(approval_teal, clear_teal)
+        pool.execute(pool.create_group())
+        pool.execute(pool.setup_group())
+        user = pool.new_user("user")
+        seed_boxes(pool, user, n)
+
+        results = pool.execute(pool.local_claim_group(user, n), enforce_budget=False)
+        curves["local_claim"].append((n, results[0]["cost"]))
+
+        g = pool.ledger.apps[pool.app_id]["global"]
+        pool.ledger.round = g[b"PER"] + g[b"CP"] + 1
+        results = pool.execute(pool.delete_boxes_group(0), enforce_budget=False)
+        curves["delete_boxes"].append((n, results[0]["cost"]))
+    return curves
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Autocompounder offline on the local AVM stand-in.")
+    parser.add_argument("--teal", help="path to the approval program TEAL (default: generated from contract.py)")
+    parser.add_argument("--max-boxes", type=int, default=64, help="largest box count of the cost curves")
+    args = parser.parse_args()
+
+    if args.teal:
+        with open(args.teal, "r") as f:
+            approval = f.read()
+        clear = "#pragma version 8\nint 1\nreturn"
+    else:
+        from contract import generate_teal
+        programs = generate_teal()
+        approval, clear = programs["approval"], programs["clear"]
+
+    print("Differential run of TEAL vs reference model:")
+    found, action_costs = differential(approval, clear_teal=clear)
+    for act, cost in action_costs:
+        print("\t{:<40} cost {}".format(str(act), cost))
+    for act, msg in found:
+        print("\tMISMATCH at {}: {}".format(act, msg))
+    if not found:
+        print("\tNo mismatches.")
+
+    print("\nOpcode cost by number of boxes in a single call:")
+    counts = sorted({1, 2, 4, 7, 8, 16, 32, args.max_boxes} | set(range(0, args.max_boxes + 1, 64)) - {0})
+    curves = cost_curves(approval, counts, clear)
+    print("\t{:>6} {:>12} {:>13}".format("boxes", "local_claim", "delete_boxes"))
+    for (n, lc), (_, db) in zip(curves["local_claim"], curves["delete_boxes"]):
+        print("\t{:>6} {:>12} {:>13}".format(n, lc, db))
+
+    print("\nCost models fitted to the curves:")
+    for name, default in (("local_claim", LOCAL_CLAIM_COST), ("delete_boxes", DELETE_BOXES_COST)):
+        fitted = fit_cost_model(curves[name])
+        print("\t{:<13} {}, box_packer default {}{}".format(name, tuple(fitted), tuple(default),
+                                                           "" if fitted == default else " - recalibrate"))
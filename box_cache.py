@@ -0,0 +1,188 @@
+# -----------------           Description          -----------------
+# Persistent local cache of the increment boxes of compound contracts.
+# A box is written once by claim_stake_record and does not change until it is removed by delete_boxes, thus the boxes
+# can be cached indefinitely and only boxes created since the last visit need to be fetched from the node.
+# Boxes are stored in an SQLite database in the cache directory (see compile_cache.py), keyed by the network (genesis
+# hash), app ID, creation round of the app and box number. Entries of an app are invalidated when its NB drops (boxes
+# were deleted) or when the app is deleted, and the least recently used entries are evicted when the cache grows over
+# its size limit.
+
+# -----------------           Imports          -----------------
+import base64
+import os
+import sqlite3
+import threading
+from time import time
+
+from algosdk import error
+
+from box_fetcher import fetch_box_values
+from box_listing import list_boxes
+from compile_cache import CACHE_DIR
+
+# ---------------------------------------------------------------
+
+BOX_CACHE_PATH = os.path.join(CACHE_DIR, "boxes.sqlite")
+# Maximal number of cached boxes
+MAX_ENTRIES = 1_000_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS boxes (
+    network TEXT NOT NULL,
+    app_id INTEGER NOT NULL,
+    created INTEGER NOT NULL,
+    box INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (network, app_id, created, box)
+);
+CREATE INDEX IF NOT EXISTS boxes_used ON boxes (used);
+"""
+
+
+class BoxCache:
+
+    def __init__(self, path: str = BOX_CACHE_PATH, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        # Networks of the nodes which have already been queried (by node address)
+        self.networks = {}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    # ----- -----    Keys     ----- -----
+
+    # Function returns the network (genesis hash) of the node the client is connected to
+    def network(self, client):
+        address = getattr(client, "algod_address", "")
+        if address not in self.networks:
+            self.networks[address] = client.versions().get("genesis_hash_b64", "")
+        return self.networks[address]
+
+    # Function returns the key of an app: (network, app ID, creation round), after invalidating its cached boxes which
+    #  no longer exist.
+    #  The creation round is not reported by all nodes, in which case the pool start round of the app is used instead.
+    #  Raises AlgodHTTPError if the app does not exist, after dropping its cached boxes.
+    def open_app(self, client, app_id):
+        network = self.network(client)
+        try:
+            app = client.application_info(app_id)
+        except error.AlgodHTTPError as e:
+            if getattr(e, "code", None) == 404:
+                self.drop_app(network, app_id)
+            raise
+        return self.app_key(network, app_id, app)
+
+    # Function returns the key of an app from its info (as returned by the node), after invalidating its cached boxes
+    #  which no longer exist
+    def app_key(self, network, app_id, app):
+        state = {
+            base64.b64decode(kv["key"]): kv["value"].get("uint", 0) for kv in app["params"].get("global-state", [])
+        }
+        created = app.get("created-at-round", app["params"].get("created-at-round", state.get(b"PSR", 0)))
+        key = (network, app_id, created)
+        self.sync(key, state.get(b"NB", 0))
+        return key
+
+    # ----- -----    Storage     ----- -----
+
+    # Function returns the cached values of boxes (by box number)
+    def get(self, app, boxes):
+        boxes = list(boxes)
+        found = {}
+        with self.lock:
+            for i in range(0, len(boxes), 500):
+                chunk = boxes[i:i + 500]
+                rows = self.db.execute(
+                    "SELECT box, value FROM boxes WHERE network = ? AND app_id = ? AND created = ? AND box IN ({})"
+                    .format(",".join("?" * len(chunk))), (*app, *chunk)
+                ).fetchall()
+                found.update((box, bytes(value)) for box, value in rows)
+            if found:
+                self.db.executemany(
+                    "UPDATE boxes SET used = ? WHERE network = ? AND app_id = ? AND created = ? AND box = ?",
+                    [(time(), *app, box) for box in found]
+                )
+                self.db.commit()
+        return found
+
+    # Function stores values of boxes (by box number)
+    def put(self, app, values):
+        if not values:
+            return
+        now = time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO boxes (network, app_id, created, box, value, used) VALUES (?, ?, ?, ?, ?, ?)",
+                [(*app, box, value, now) for box, value in values.items()]
+            )
+            self.db.commit()
+        self.evict()
+
+    # ----- -----    Invalidation     ----- -----
+
+    # Function invalidates cached boxes that no longer exist: boxes above NB and boxes of older apps with the same ID
+    def sync(self, app, nb):
+        network, app_id, created = app
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM boxes WHERE network = ? AND app_id = ? AND (created != ? OR box > ?)",
+                (network, app_id, created, nb)
+            )
+            self.db.commit()
+
+    # Function drops all cached boxes of an app
+    def drop_app(self, network, app_id):
+        with self.lock:
+            self.db.execute("DELETE FROM boxes WHERE network = ? AND app_id = ?", (network, app_id))
+            self.db.commit()
+
+    # Function evicts the least recently used boxes over the size limit
+    def evict(self):
+        with self.lock:
+            count = self.db.execute("SELECT COUNT(*) FROM boxes").fetchone()[0]
+            if count > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM boxes WHERE rowid IN (SELECT rowid FROM boxes ORDER BY used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM boxes")
+            self.db.commit()
+
+
+# Function returns values of boxes first..last of a compound contract, fetching from the node only the boxes which
+#  are not cached yet. Boxes to fetch are planned from a single listing of the boxes of the app (unless the listed box
+#  numbers are given), and values of boxes which do not exist are None.
+def fetch_boxes(client, app_id, first, last, cache=None, listed=None):
+    cache = cache if cache is not None else default_box_cache()
+    app = cache.open_app(client, app_id)
+    boxes = range(first, last + 1)
+
+    values = cache.get(app, boxes)
+    missing = [box for box in boxes if box not in values]
+    if missing:
+        listed = set(listed if listed is not None else list_boxes(client, app_id))
+        missing = [box for box in missing if box in listed]
+    fetched = dict(zip(missing, fetch_box_values(client, app_id, missing)))
+    cache.put(app, fetched)
+    values.update(fetched)
+
+    return [values.get(box) for box in boxes]
+
+
+# Shared cache instance
+_default_box_cache = None
+
+
+def default_box_cache():
+    global _default_box_cache
+    if _default_box_cache is None:
+        _default_box_cache = BoxCache()
+    return _default_box_cache
@@ -0,0 +1,80 @@
+# -----------------           Description          -----------------
+# Concurrent fetching of boxes of an app from an algod node.
+# Boxes are fetched by a pool of threads, with the number of requests in flight to each node bounded by the node's
+# concurrency limit (shared by all fetches from the node, so that its rate limits are respected). Transient errors
+# (rate limiting, server and connection errors) are retried with exponential backoff. Results are returned in the
+# order of the requested boxes.
+
+# -----------------           Imports          -----------------
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from algosdk import error
+
+# ---------------------------------------------------------------
+
+# Default number of concurrent requests to a node
+DEFAULT_CONCURRENCY = 8
+# Number of retries of a request and initial backoff [s]
+RETRIES = 4
+BACKOFF = 0.2
+# HTTP status codes of errors which are retried
+TRANSIENT_CODES = {429, 500, 502, 503, 504}
+
+# Concurrency limits of nodes (by node address)
+NODE_CONCURRENCY = {}
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+# Function sets the maximal number of concurrent requests to a node
+def set_node_concurrency(address: str, concurrency: int):
+    with _semaphores_lock:
+        NODE_CONCURRENCY[address] = concurrency
+        _semaphores.pop(address, None)
+
+
+def node_concurrency(client):
+    return NODE_CONCURRENCY.get(getattr(client, "algod_address", ""), DEFAULT_CONCURRENCY)
+
+
+def node_semaphore(client):
+    address = getattr(client, "algod_address", "")
+    with _semaphores_lock:
+        if address not in _semaphores:
+            _semaphores[address] = threading.BoundedSemaphore(NODE_CONCURRENCY.get(address, DEFAULT_CONCURRENCY))
+        return _semaphores[address]
+
+
+# Function checks if an error of a request is transient, i.e. the request should be retried
+def is_transient(e):
+    if isinstance(e, error.AlgodHTTPError):
+        return getattr(e, "code", None) in TRANSIENT_CODES or getattr(e, "code", None) is None
+    return isinstance(e, OSError)
+
+
+# Function fetches the value of a single box, retrying transient errors
+def fetch_box(client, app_id, box: int, retries: int = RETRIES, backoff: float = BACKOFF):
+    semaphore = node_semaphore(client)
+    for attempt in range(retries + 1):
+        try:
+            with semaphore:
+                response = client.application_box_by_name(app_id, box.to_bytes(8, 'big'))
+            return base64.b64decode(response.get("value"))
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            sleep(backoff * 2 ** attempt)
+
+
+# Function fetches values of boxes concurrently, returning them in the order of the boxes
+def fetch_box_values(client, app_id, boxes, retries: int = RETRIES, backoff: float = BACKOFF):
+    boxes = list(boxes)
+    if len(boxes) <= 1:
+        return [fetch_box(client, app_id, box, retries, backoff) for box in boxes]
+
+    with ThreadPoolExecutor(max_workers=min(node_concurrency(client), len(boxes))) as pool:
+        return list(pool.map(lambda box: fetch_box(client, app_id, box, retries, backoff), boxes))
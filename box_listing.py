@@ -0,0 +1,79 @@
+# -----------------           Description          -----------------
+# Discovery of the boxes of an app through algod's application-boxes listing endpoint.
+# The listing is paginated (max boxes per page and the next-token cursor), thus all boxes of an app are listed in
+# NB / page size requests instead of one probe per box. The listed box numbers are used to plan fetches of increments
+# and deletions of boxes, and to detect gaps (boxes up to NB which do not exist).
+# Boxes are listed in lexicographic order of their names, which for the 8-byte big-endian box numbers is their numeric
+# order - thus the listing can also be consumed page by page (iter_box_pages), starting from a given box.
+
+# -----------------           Imports          -----------------
+import base64
+
+# ---------------------------------------------------------------
+
+# Number of boxes listed per request
+PAGE_SIZE = 1000
+
+
+# Function returns the parameters of a listing request - the next token of the previous page or, for the first page,
+#  the name of the box to start from (if any)
+def page_params(page_size: int, next_token: str = None, start: int = None):
+    params = {"max": page_size}
+    if next_token:
+        params["next"] = next_token
+    elif start is not None:
+        params["next"] = "b64:" + base64.b64encode(start.to_bytes(8, 'big')).decode()
+    return params
+
+
+# Function returns the box numbers of a listing page (ignoring boxes not named by a box number) and its next token
+def page_boxes(response):
+    names = (base64.b64decode(box["name"]) for box in response.get("boxes", []))
+    return [int.from_bytes(name, 'big') for name in names if len(name) == 8], response.get("next-token")
+
+
+# Function lists names of all boxes of an app
+def list_box_names(client, app_id, page_size: int = PAGE_SIZE):
+    names = []
+    next_token = None
+    while True:
+        params = page_params(page_size, next_token)
+        response = client.algod_request("GET", "/applications/{}/boxes".format(app_id), params=params)
+        names.extend(base64.b64decode(box["name"]) for box in response.get("boxes", []))
+        next_token = response.get("next-token")
+        if not next_token:
+            break
+    return names
+
+
+# Function lists numbers of all boxes of an app (in increasing order), ignoring boxes not named by a box number
+def list_boxes(client, app_id, page_size: int = PAGE_SIZE):
+    return sorted(int.from_bytes(name, 'big') for name in list_box_names(client, app_id, page_size) if len(name) == 8)
+
+
+# Function yields the box numbers of an app page by page (in increasing order), from box start on (default: all)
+def iter_box_pages(client, app_id, page_size: int = PAGE_SIZE, start: int = None):
+    next_token = None
+    while True:
+        params = page_params(page_size, next_token, start)
+        response = client.algod_request("GET", "/applications/{}/boxes".format(app_id), params=params)
+        boxes, next_token = page_boxes(response)
+        yield boxes
+        if not next_token:
+            break
+
+
+# Function returns the box numbers from first to last (including) which are not among the listed boxes
+def missing_boxes(listed, first: int, last: int):
+    listed = set(listed)
+    return [box for box in range(first, last + 1) if box not in listed]
+
+
+# Function returns the lowest box number of the run of consecutive existing boxes that ends with box `last`,
+#  i.e. the boxes which can be deleted one after another from the top (0 if the run is empty)
+def top_run_start(listed, last: int):
+    listed = set(listed)
+    box = last
+    while box in listed:
+        box -= 1
+    return box + 1 if box < last else 0
@@ -0,0 +1,137 @@
+# -----------------           Description          -----------------
+# Packing of box ranges into transactions and groups for local_claim and delete_boxes.
+# Both methods process a contiguous range of boxes in a loop, thus a call processing n boxes costs
+#   cost(n) = base + per_box * n
+# opcodes (see CostModel). Each processed box must be referenced in the box array of some transaction of the group.
+# The protocol limits the packing by:
+#   - MAX_TXN_REFERENCES references (accounts, assets, apps and boxes together) per transaction,
+#   - MAX_GROUP_SIZE transactions per group,
+#   - an opcode budget of APP_CALL_BUDGET per app call, which is pooled across the app calls of the group,
+#   - box references, which are pooled across the group as well.
+# Since both budget and references are pooled, a group of t calls can process
+#   min(MAX_TXN_REFERENCES * t, floor(t * (APP_CALL_BUDGET - base) / per_box))
+# boxes, regardless of how they are split among the calls. The packer fills whole groups and uses the fewest calls
+# for the remainder, which gives the fewest groups and then the fewest transactions for any number of boxes. Boxes
+# of a group are split evenly among its calls, which reference their own boxes if possible.
+#
+# The default cost models are fitted with fit_cost_model to the costs of the TEAL generated from contract.py measured by
+# avm_harness.cost_curves (which reports them next to the defaults). They can be recalibrated the same way or from the
+# budget consumed in a simulation (simulated_costs), and check_group verifies a packed group by simulating it on the
+# node.
+
+# -----------------           Imports          -----------------
+from collections import namedtuple
+
+from util import simulate_group
+
+# ---------------------------------------------------------------
+
+# Protocol limits
+MAX_GROUP_SIZE = 16
+MAX_TXN_REFERENCES = 8
+APP_CALL_BUDGET = 700
+
+# Opcode cost of a call processing n boxes: base + per_box * n
+CostModel = namedtuple("CostModel", ["base", "per_box"])
+LOCAL_CLAIM_COST = CostModel(base=58, per_box=84)
+DELETE_BOXES_COST = CostModel(base=84, per_box=13)
+
+# Call of a packed group: method argument (up_to or down_to box), processed boxes and boxes in its box array
+Call = namedtuple("Call", ["arg", "boxes", "refs"])
+
+
+# Function returns the number of boxes a group of txns calls can process
+def group_capacity(cost: CostModel, txns: int):
+    by_budget = txns * (APP_CALL_BUDGET - cost.base) // cost.per_box
+    return max(0, min(MAX_TXN_REFERENCES * txns, by_budget))
+
+
+# Function splits a number of boxes into groups, returning for each group the number of boxes processed by each call
+def pack(boxes: int, cost: CostModel):
+    if boxes > 0 and group_capacity(cost, 1) == 0:
+        raise Exception("A call cannot process a single box within the opcode budget.")
+
+    full = group_capacity(cost, MAX_GROUP_SIZE)
+    groups = []
+    while boxes > 0:
+        if boxes >= full:
+            txns, n = MAX_GROUP_SIZE, full
+        else:
+            txns = next(t for t in range(1, MAX_GROUP_SIZE + 1) if group_capacity(cost, t) >= boxes)
+            n = boxes
+        groups.append([n // txns + (1 if i < n % txns else 0) for i in range(txns)])
+        boxes -= n
+    return groups
+
+
+# Function assigns box numbers (in the order of processing) to the calls and box arrays of a group.
+#  Calls reference their own boxes when these fit into their box arrays, otherwise the references fill the box arrays
+#  of the calls in order (references are pooled across the group).
+def assign(sizes, order):
+    starts = [sum(sizes[:i]) for i in range(len(sizes))]
+    boxes = [order[start:start + size] for start, size in zip(starts, sizes)]
+    if all(size <= MAX_TXN_REFERENCES for size in sizes):
+        return [(b, b) for b in boxes]
+    refs = [order[i:i + MAX_TXN_REFERENCES] for i in range(0, len(order), MAX_TXN_REFERENCES)]
+    return [(b, refs[i] if i < len(refs) else []) for i, b in enumerate(boxes)]
+
+
+# Function packs local claims of boxes lnb+1 to nb into groups of calls (argument up_to)
+def pack_claims(lnb: int, nb: int, cost: CostModel = LOCAL_CLAIM_COST):
+    groups = []
+    last = lnb
+    for sizes in pack(nb - lnb, cost):
+        order = list(range(last + 1, last + sum(sizes) + 1))
+        group = []
+        for boxes, refs in assign(sizes, order):
+            last = boxes[-1]
+            group.append(Call(last, boxes, refs))
+        groups.append(group)
+    return groups
+
+
+# Function packs deletion of boxes nb down to stop+1 into groups of calls (argument down_to)
+def pack_deletions(nb: int, stop: int, cost: CostModel = DELETE_BOXES_COST):
+    groups = []
+    last = nb
+    for sizes in pack(nb - stop, cost):
+        order = list(range(last, last - sum(sizes), -1))
+        group = []
+        for boxes, refs in assign(sizes, order):
+            last = boxes[-1] - 1
+            group.append(Call(last, boxes, refs))
+        groups.append(group)
+    return groups
+
+
+# Function fits a cost model to measured (number of boxes, cost) points.
+#  The cost per box is the least squares slope (rounded up) and the base covers all measurements, so packed groups
+#  are not over budget.
+def fit_cost_model(points):
+    points = list(points)
+    if len(set(n for n, _ in points)) < 2:
+        raise ValueError("measurements of at least two different numbers of boxes are needed")
+    k = len(points)
+    sx = sum(n for n, _ in points)
+    sy = sum(c for _, c in points)
+    sxx = sum(n * n for n, _ in points)
+    sxy = sum(n * c for n, c in points)
+    per_box = max(1, -(-(k * sxy - sx * sy) // (k * sxx - sx * sx)))
+    base = max(c - per_box * n for n, c in points)
+    return CostModel(base, per_box)
+
+
+# Function returns (number of processed boxes, consumed budget) of each call of a simulated group
+def simulated_costs(result, group):
+    return [(len(call.boxes), txn_result.get("app-budget-consumed", 0))
+            for call, txn_result in zip(group, result.get("txn-results", []))]
+
+
+# Function simulates a packed group (AtomicTransactionComposer) and raises if it would fail.
+#  Returns the result of the simulation.
+def check_group(client, atc):
+    result = simulate_group(client, atc.gather_signatures())
+    if result.get("failure-message"):
+        raise Exception("Simulation of the group failed at transaction {}: {}".format(
+            result.get("failed-at"), result["failure-message"]))
+    return result
@@ -0,0 +1,95 @@
+# -----------------           Description          -----------------
+# Build step that generates autocompounder_abi.py - a lightweight module with the ABI (ARC-4) specification, method
+# selectors and constants of the Autocompounder contract.
+# The interaction layer imports the generated module instead of contract.py, thus it does not need to import PyTEAL and
+# Beaker at startup.
+#
+# Run after every change of the contract:   python build_abi.py
+# Check that the generated module is current: python build_abi.py --check
+
+# -----------------           Imports          -----------------
+import argparse
+import hashlib
+import json
+import sys
+
+# ---------------------------------------------------------------
+
+OUTPUT_PATH = "autocompounder_abi.py"
+
+HEADER = """\
+# -----------------           Description          -----------------
+# GENERATED by build_abi.py from contract.py - do not edit by hand.
+# ABI (ARC-4) specification, method selectors and constants of the Autocompounder contract. Importing this module
+# requires only algosdk.
+
+# -----------------           Imports          -----------------
+from algosdk.abi import Contract
+
+# ---------------------------------------------------------------
+
+"""
+
+
+# Function computes the ABI method selector of a method in ARC-4 JSON form
+def method_selector(method):
+    args = ",".join(arg["type"] for arg in method["args"])
+    signature = "{}({}){}".format(method["name"], args, method["returns"]["type"])
+    return hashlib.new("sha512_256", signature.encode()).digest()[:4]
+
+
+# Function collects the constants and the ABI contract from the Autocompounder class
+def collect():
+    from contract import Autocompounder
+
+    constants = {
+        name: value for name, value in vars(Autocompounder).items()
+        if name.isupper() and isinstance(value, int) and not isinstance(value, bool)
+    }
+    contract = Autocompounder(version=8).contract.dictify()
+    return constants, contract
+
+
+# Function renders the source of the generated module
+def render(constants, contract):
+    methods = sorted(contract["methods"], key=lambda m: m["name"])
+    contract = dict(contract, methods=methods)
+
+    lines = [HEADER]
+    lines.append("ARC4_CONTRACT = " + json.dumps(contract, indent=4) + "\n")
+    lines.append("CONTRACT = Contract.undictify(ARC4_CONTRACT)\n\n")
+
+    lines.append("# Method selectors by method name\n")
+    lines.append("SELECTORS = {\n")
+    for m in methods:
+        lines.append("    \"{}\": bytes.fromhex(\"{}\"),\n".format(m["name"], method_selector(m).hex()))
+    lines.append("}\n\n\n")
+
+    lines.append("# Constants of the contract and its ABI methods (as algosdk.abi.Method)\n")
+    lines.append("class Autocompounder:\n")
+    for name, value in constants.items():
+        lines.append("    {} = {!r}\n".format(name, value))
+    lines.append("\n")
+    for m in methods:
+        lines.append("    {0} = CONTRACT.get_method_by_name(\"{0}\")\n".format(m["name"]))
+    return "".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate " + OUTPUT_PATH + " from contract.py.")
+    parser.add_argument("--check", action="store_true", help="only check the generated module is up to date")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    source = render(*collect())
+
+    if args.check:
+        with open(args.output, "r") as f:
+            if f.read() != source:
+                print(args.output + " is out of date - run: python build_abi.py")
+                sys.exit(1)
+        print(args.output + " is up to date")
+    else:
+        with open(args.output, "w") as f:
+            f.write(source)
+        print("Generated " + args.output)
@@ -0,0 +1,123 @@
+# -----------------           Description          -----------------
+# Persistent content-addressed cache for generated and compiled TEAL programs.
+# Two kinds of entries are stored as JSON files in the cache directory:
+#   teal/<key>.json      - TEAL generated by PyTEAL/Beaker (approval and clear programs, state schemas and ABI contract),
+#                          keyed by a hash of the contract's source and versions of PyTEAL, Beaker and the TEAL version
+#   compiled/<key>.json  - result of algod's compile endpoint (compiled bytes, program hash and source map), keyed by a
+#                          hash of the TEAL source and the version of the algod compiler
+# Repeated deployments thus skip both the PyTEAL generation and the remote compile round-trip.
+
+# -----------------           Imports          -----------------
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from importlib import metadata
+
+# ---------------------------------------------------------------
+
+# Cache directory can be overridden with an environment variable
+CACHE_DIR = os.environ.get(
+    "AUTOCOMPOUNDER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "autocompounder")
+)
+
+
+# Helper function to hash the parts of a cache key
+def cache_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+# Helper function that returns installed version of a package (or an empty string if it is not installed)
+def package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return ""
+
+
+class CompileCache:
+
+    def __init__(self, path: str = CACHE_DIR):
+        self.path = path
+        # Compiler versions of the nodes which have already been queried (by node address)
+        self.compiler_versions = {}
+
+    # ----- -----    Storage     ----- -----
+
+    def read(self, kind, key):
+        try:
+            with open(os.path.join(self.path, kind, key + ".json"), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write(self, kind, key, entry):
+        # Entries are written atomically, so concurrent deployments never read a partially written entry
+        directory = os.path.join(self.path, kind)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, os.path.join(directory, key + ".json"))
+
+    # ----- -----    Compiled programs     ----- -----
+
+    # Function returns version of the compiler of the node the client is connected to
+    def compiler_version(self, client):
+        address = getattr(client, "algod_address", "")
+        if address not in self.compiler_versions:
+            build = client.versions().get("build", {})
+            self.compiler_versions[address] = "{}.{}.{}-{}".format(
+                build.get("major"), build.get("minor"), build.get("build_number"), build.get("commit_hash")
+            )
+        return self.compiler_versions[address]
+
+    # Function compiles TEAL source, returning the response of the compile endpoint (including the source map)
+    def compile(self, client, source_code: str):
+        key = cache_key(self.compiler_version(client), source_code)
+        entry = self.read("compiled", key)
+        if entry is None:
+            entry = client.compile(source_code, source_map=True)
+            self.write("compiled", key, entry)
+        return entry
+
+    # Function compiles TEAL source, returning the program bytes
+    def compile_bytes(self, client, source_code: str):
+        return base64.b64decode(self.compile(client, source_code)["result"])
+
+    # ----- -----    Generated TEAL     ----- -----
+
+    # Function returns the generated TEAL entry for a key, generating it with build() if it is not cached
+    def teal(self, key, build):
+        entry = self.read("teal", key)
+        if entry is None:
+            entry = build()
+            self.write("teal", key, entry)
+        return entry
+
+
+# Key for TEAL generated from a Python source file with PyTEAL/Beaker
+def source_key(source_path: str, version: int):
+    with open(source_path, "rb") as f:
+        source = f.read()
+    return cache_key(
+        source, str(version), package_version("pyteal"), package_version("beaker-pyteal")
+    )
+
+
+# Shared cache instance
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CompileCache()
+    return _default_cache
@@ -0,0 +1,187 @@
+# -----------------           Description          -----------------
+# Tracker of confirmations of submitted transaction groups.
+# atc.execute blocks the caller in its own polling loop until the group is confirmed. Instead, submitted groups are
+# registered with a tracker, which watches all of them from a single thread and resolves a Future (and an optional
+# callback) of each group with the same response atc.execute returns - confirmed round, txids and ABI results (which
+# include the logs and pending info of the app calls).
+# The tracker is driven by rounds: it checks the node's status every POLL_INTERVAL seconds (shorter than the block
+# time) and requests the pending info of the groups only when a new round has been observed or new groups have been
+# registered. Groups are confirmed atomically, thus only one transaction of each group is checked until the group is
+# confirmed. Groups which are rejected from the pool, or not confirmed within their wait rounds or validity, fail.
+#
+# Example:
+#   tracker = default_tracker(algod_client)
+#   futures = [tracker.submit(atc, wait_rounds=3) for atc in atcs]
+#   results = [f.result() for f in futures]
+
+# -----------------           Imports          -----------------
+import base64
+import threading
+import weakref
+from concurrent.futures import Future
+
+from algosdk import abi, error
+from algosdk.atomic_transaction_composer import ABIResult, AtomicTransactionResponse, ABI_RETURN_HASH
+
+from resubmission import submit_idempotent
+
+# ---------------------------------------------------------------
+
+# Seconds between checks of the node's status
+POLL_INTERVAL = 0.5
+
+
+class Watch:
+    # Group waiting for its confirmation
+
+    def __init__(self, atc, tx_ids, wait_rounds, callback):
+        self.atc = atc
+        self.tx_ids = tx_ids
+        self.wait_rounds = wait_rounds
+        # Round at which the tracking started (set at the first check)
+        self.start_round = None
+        self.last_valid = min(tws.txn.last_valid_round for tws in atc.txn_list)
+        self.future = Future()
+        if callback is not None:
+            self.future.add_done_callback(lambda f: callback(f.result()) if f.exception() is None else None)
+        # Whether the pending info has been checked at least once
+        self.checked = False
+
+
+class ConfirmationTracker:
+
+    def __init__(self, client, poll_interval: float = POLL_INTERVAL):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.watches = []
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.round = 0
+
+    # ----- -----    Registration     ----- -----
+
+    # Function registers a group which has already been submitted (atc.submit) and returns the Future of its response
+    def track(self, atc, wait_rounds: int, callback=None):
+        with self.lock:
+            watch = Watch(atc, list(atc.tx_ids), wait_rounds, callback)
+            self.watches.append(watch)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return watch.future
+
+    # Function submits a group (idempotently, retrying transient errors) and registers it, returning the Future of its
+    #  response
+    def submit(self, atc, wait_rounds: int, callback=None):
+        submit_idempotent(self.client, atc)
+        return self.track(atc, wait_rounds, callback)
+
+    # ----- -----    Tracking     ----- -----
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.watches:
+                    self.thread = None
+                    return
+            try:
+                rnd = self.client.status().get("last-round", 0)
+            except Exception:
+                rnd = self.round
+            with self.lock:
+                new_round = rnd > self.round
+                self.round = max(self.round, rnd)
+                watches = [w for w in self.watches if new_round or not w.checked]
+            for watch in watches:
+                self.check(watch, rnd)
+            with self.lock:
+                self.watches = [w for w in self.watches if not w.future.done()]
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    # Function checks a group at a round, resolving its Future if it is confirmed or can no longer be confirmed
+    def check(self, watch, rnd):
+        watch.checked = True
+        if watch.start_round is None:
+            watch.start_round = rnd
+        try:
+            info = self.client.pending_transaction_info(watch.tx_ids[0])
+        except error.AlgodHTTPError:
+            # Transient errors are retried in the next round, but the group can still expire or time out (a node
+            #  reports a transaction that expired before it was confirmed as not found)
+            info = {}
+        failure = group_failure(watch.tx_ids[0], info, rnd, watch.last_valid, watch.start_round + watch.wait_rounds)
+        if failure is not None:
+            watch.future.set_exception(failure)
+        elif info.get("confirmed-round", 0) > 0:
+            try:
+                watch.future.set_result(self.response(watch, info))
+            except Exception as e:
+                watch.future.set_exception(e)
+
+    # Function builds the response of a confirmed group
+    def response(self, watch, first_info):
+        infos = {i: first_info if i == 0 else self.client.pending_transaction_info(tx_id)
+                 for i, tx_id in enumerate(watch.tx_ids) if i in watch.atc.method_dict}
+        return AtomicTransactionResponse(first_info["confirmed-round"], watch.tx_ids,
+                                         abi_results(watch.atc, watch.tx_ids, infos))
+
+
+# Function returns the error with which a group failed at a round, given the pending info of its first transaction
+#  (empty if it could not be read), or None if the group is confirmed or can still be confirmed
+def group_failure(tx_id, info, rnd, last_valid, deadline):
+    if info.get("pool-error"):
+        return error.AtomicTransactionComposerError("Transaction rejected: {}".format(info["pool-error"]))
+    if info.get("confirmed-round", 0) > 0:
+        return None
+    if rnd > last_valid:
+        return error.AtomicTransactionComposerError("Transaction {} expired at round {}".format(tx_id, last_valid))
+    if rnd > deadline:
+        return error.ConfirmationTimeoutError("Wait for transaction id {} timed out".format(tx_id))
+    return None
+
+
+# Function parses the ABI results of the method calls of a confirmed group from their pending info (by index in the
+#  group), as atc.execute does
+def abi_results(atc, tx_ids, infos):
+    method_results = []
+    for i, tx_id in enumerate(tx_ids):
+        if i not in atc.method_dict:
+            continue
+        method = atc.method_dict[i]
+        tx_info = infos.get(i)
+        raw_value, return_value, decode_error = None, None, None
+        try:
+            if method.returns.type != abi.Returns.VOID:
+                logs = tx_info.get("logs", [])
+                if not logs:
+                    raise error.AtomicTransactionComposerError("app call transaction did not log a return value")
+                result = base64.b64decode(logs[-1])
+                if result[:len(ABI_RETURN_HASH)] != ABI_RETURN_HASH:
+                    raise error.AtomicTransactionComposerError("app call transaction did not log a return value")
+                raw_value = result[len(ABI_RETURN_HASH):]
+                return_value = method.returns.type.decode(raw_value)
+        except Exception as e:
+            decode_error = e
+        method_results.append(ABIResult(tx_id, raw_value, return_value, decode_error, tx_info, method))
+    return method_results
+
+
+# Trackers of clients
+_trackers = weakref.WeakKeyDictionary()
+_trackers_lock = threading.Lock()
+
+
+def default_tracker(client):
+    with _trackers_lock:
+        if client not in _trackers:
+            _trackers[client] = ConfirmationTracker(client)
+        return _trackers[client]
+
+
+# Function submits a group and waits for its response - a replacement of atc.execute, which shares the tracking of
+#  all groups in flight
+def execute_tracked(client, atc, wait_rounds: int):
+    return default_tracker(client).submit(atc, wait_rounds).result()
@@ -1,9 +1,15 @@
-from algosdk import account, mnemonic
-from algosdk.atomic_transaction_composer import AccountTransactionSigner
+import base64
+
+from algosdk import account, transaction
+from algosdk.abi import Contract
+from algosdk.atomic_transaction_composer import AccountTransactionSigner, AtomicTransactionComposer
+from algosdk.constants import APP_PAGE_MAX_SIZE
 from pyteal import *
 from beaker import *
 from typing import Final
 
+import compile_cache
+
 
 # Create a class, subclassing Application from beaker
 class Autocompounder(Application):
@@ -920,18 +926,74 @@ class Autocompounder(Application):
         )
 
 
+# build_programs(algod_client, cache) -> dict:
+#  Returns generated TEAL of the contract (approval and clear programs, state schemas and the ABI contract) together
+#  with the compiled programs. Both the PyTEAL generation and the compilation are cached on disk, thus they are done only
+#  when the contract source, the versions of PyTEAL/Beaker or the compiler change.
+#
+def build_programs(algod_client, cache=None, version=8):
+    cache = cache if cache is not None else compile_cache.default_cache()
+
+    programs = dict(generate_teal(cache, version))
+    programs["approval_compiled"] = cache.compile(algod_client, programs["approval"])
+    programs["clear_compiled"] = cache.compile(algod_client, programs["clear"])
+    return programs
+
+
+# generate_teal(cache) -> dict:
+#  Returns generated TEAL of the contract (approval and clear programs, state schemas and the ABI contract), which is
+#  cached on disk.
+#
+def generate_teal(cache=None, version=8):
+    cache = cache if cache is not None else compile_cache.default_cache()
+
+    def generate():
+        app = Autocompounder(version=version)
+        approval, clear = app.compile()
+        return {
+            "approval": approval,
+            "clear": clear,
+            "global_schema": app.app_state.schema().dictify(),
+            "local_schema": app.acct_state.schema().dictify(),
+            "contract": app.contract.dictify(),
+        }
+
+    return cache.teal(compile_cache.source_key(__file__, version), generate)
+
+
 def deploy(user_sk, sc_id, ac_id, cp):
 
-    # Create an Application client
-    app_client = client.ApplicationClient(
-        client=client.AlgoExplorer(client.Network.TestNet).algod(),
-        app=Autocompounder(version=8),
+    algod_client = client.AlgoExplorer(client.Network.TestNet).algod()
+    programs = build_programs(algod_client)
+
+    approval = base64.b64decode(programs["approval_compiled"]["result"])
+    clear = base64.b64decode(programs["clear_compiled"]["result"])
+    contract = Contract.undictify(programs["contract"])
+
+    # Programs longer than one page require extra pages
+    extra_pages = (len(approval) + len(clear) - 1) // APP_PAGE_MAX_SIZE
+
+    # Create the app with a call to the `create` method
+    atc = AtomicTransactionComposer()
+    atc.add_method_call(
+        app_id=0,
+        method=contract.get_method_by_name("create"),
+        sender=account.address_from_private_key(user_sk),
+        sp=algod_client.suggested_params(),
         signer=AccountTransactionSigner(user_sk),
+        method_args=[sc_id, ac_id, cp],
+        on_complete=transaction.OnComplete.NoOpOC,
+        approval_program=approval,
+        clear_program=clear,
+        global_schema=transaction.StateSchema.undictify(programs["global_schema"]),
+        local_schema=transaction.StateSchema.undictify(programs["local_schema"]),
+        extra_pages=extra_pages,
+        foreign_apps=[sc_id],
     )
 
     # Deploy the app on-chain
-    app_id, app_addr, txid = app_client.create(
-        SC_ID=sc_id, AC_ID=ac_id, claimPeriod=cp, foreign_apps=[sc_id]
-    )
+    result = atc.execute(algod_client, 3)
+    txid = result.tx_ids[0]
+    app_id = algod_client.pending_transaction_info(txid)["application-index"]
 
     return [app_id, txid]
@@ -0,0 +1,721 @@
+# -----------------           Description          -----------------
+# Asynchronous counterpart of interact_w_CompoundContract.py - the same interactions with compound contracts as
+# coroutines on an AsyncAlgodClient (see async_algod.py), so that one event loop can drive many contracts and users:
+#   async with AsyncAlgodClient(token, address, concurrency=32) as client:
+#       await run_limited([stakeCompoundContract(client, sk, cc_id, sc_id, ac_id, a_id, amt) for sk in keys], 100)
+# Interactions can be cancelled at any await. A group already sent may nevertheless be confirmed after its
+# interaction has been cancelled - the state is read again from the chain by the next interaction.
+
+# -----------------           Imports          -----------------
+import asyncio
+import base64
+import math
+
+from algosdk import account, error, transaction
+from algosdk.atomic_transaction_composer import AtomicTransactionComposer, AccountTransactionSigner, \
+    TransactionWithSigner
+from algosdk.logic import get_application_address
+
+from async_algod import AsyncAlgodClient, read_global_state, read_local_state, fetch_boxes, list_boxes, preflight, \
+    preflight_groups, execute, execute_pipelined, execute_with_replan, iter_increments
+from autocompounder_abi import Autocompounder
+from schedule_planner import plan_schedule
+from box_listing import top_run_start
+import fixed_point
+from box_packer import pack_claims, pack_deletions
+from fusion_planner import plan_intents, needs_increases, box_increases, fuse, compose_groups, remaining_intents, \
+    withdrawals, Intent, STAKE, WITHDRAW
+from race_retry import MAX_ATTEMPTS
+from signing_service import SigningService, PoolTransactionSigner, sign_groups
+
+# ---------------------------------------------------------------
+
+TX_APPROVAL_WAIT = 3
+
+async def createCompoundContract(
+    algod_client: AsyncAlgodClient,
+    creatorSK: str,
+    sc_id: int,
+    ac_id: int,
+    cp: int
+):
+    # Deployment needs PyTEAL and Beaker to build the contract, thus they are imported only when deploying
+    #  deploy() builds the programs and creates the app with an ATC on its own (blocking) algod client, thus the
+    #  deployment runs in a thread
+    from contract import deploy
+
+    [app_id, txid] = await asyncio.to_thread(deploy, creatorSK, sc_id, ac_id, cp)
+
+    print("\tTx ID: " + txid)
+
+    assert app_id is not None and app_id > 0
+
+    cc_state = await read_global_state(algod_client, app_id)
+    a_id = cc_state["S_ASA_ID"]
+
+    return [app_id, a_id]
+
+
+async def setupCompoundContract(
+    algod_client: AsyncAlgodClient,
+    creatorSK: str,
+    cc_id: int,
+    sc_id: int,
+    a_id: int
+):
+    creator_address = account.address_from_private_key(creatorSK)
+
+    # Get compound contract address
+    CC_address = get_application_address(cc_id)
+
+    sp = await algod_client.suggested_params()
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner(creatorSK)
+
+    # Fees of the group (fund the contract for opt-ins, call to CC, SC opt-in, and ASA opt-in) are set by the preflight
+    # Fund the compound contract with minimal balance to opt-in to the staking contract and ASA
+    amt = 100_000 + 100_000 + 50_000*3
+
+    fund_tx = transaction.PaymentTxn(
+        sender=creator_address,
+        sp=sp,
+        receiver=CC_address,
+        amt=amt,
+    )
+    atc.add_transaction(TransactionWithSigner(fund_tx, signer))
+
+    # Call to the `on_setup` method
+    atc.add_method_call(
+        app_id=cc_id,
+        method=Autocompounder.on_setup,
+        sender=creator_address,
+        sp=sp,
+        signer=signer,
+        method_args=[],
+        foreign_assets=[a_id],
+        foreign_apps=[sc_id]
+    )
+
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    await preflight(algod_client, atc)
+
+    result = await execute(algod_client, atc, TX_APPROVAL_WAIT)
+
+    for res in result.tx_ids:
+        print("\tTx ID: " + res)
+
+    return
+
+
+async def deleteCompoundContract(
+    algod_client: AsyncAlgodClient,
+    creatorSK: str,
+    cc_id: int,
+    sc_id: int,
+    ac_id: int,
+    a_id: int
+):
+    creator_address = account.address_from_private_key(creatorSK)
+
+    # Get staking contract address
+    SC_address = get_application_address(sc_id)
+
+    sp = await algod_client.suggested_params()
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner(creatorSK)
+
+    # Fees of the call to CC and its inner transactions are set by the preflight
+    tx = transaction.ApplicationDeleteTxn(
+        sender=creator_address,
+        sp=sp,
+        index=cc_id,
+        app_args=None,
+        accounts=[SC_address],
+        foreign_assets=[a_id],
+        foreign_apps=[sc_id, ac_id]
+    )
+    atc.add_transaction(TransactionWithSigner(tx, signer))
+
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    await preflight(algod_client, atc)
+
+    result = await execute(algod_client, atc, TX_APPROVAL_WAIT)
+
+    for res in result.tx_ids:
+        print("\tTx ID: " + res)
+
+    return
+
+
+async def deleteAllBoxes(
+    algod_client: AsyncAlgodClient,
+    creatorSK: str,
+    cc_id: int
+):
+    creator_address = account.address_from_private_key(creatorSK)
+
+    # Get current number of boxes in the contract
+    curr_boxes = (await read_global_state(algod_client, cc_id)).get("NB")
+
+    if curr_boxes < 1:
+        raise Exception("There are no boxes, thus none can be deleted.")
+
+    # Plan the deletion from a single listing of the boxes of the contract
+    #  Boxes are deleted from the top down and each must exist, thus deletion has to stop at a missing box
+    listed = await list_boxes(algod_client, cc_id)
+    lowest_box = top_run_start(listed, curr_boxes)
+    if lowest_box == 0:
+        raise Exception("Box {} does not exist, thus no box can be deleted.".format(curr_boxes))
+    stop_box = lowest_box - 1
+
+    # Process all of them in chained groups, sent without waiting for confirmations (as in the blocking version)
+    # The signing service (and its workers) lives for the deletion of all boxes
+    with SigningService(creatorSK) as service:
+        while curr_boxes > stop_box:
+
+            sp = await algod_client.suggested_params()
+            signer = PoolTransactionSigner(service)
+            atcs = []
+
+            for group in pack_deletions(curr_boxes, stop_box):
+                atc = AtomicTransactionComposer()
+
+                for call in group:
+                    # Call to the `delete_boxes` method
+                    atc.add_method_call(
+                        app_id=cc_id,
+                        method=Autocompounder.delete_boxes,
+                        sender=creator_address,
+                        sp=sp,
+                        signer=signer,
+                        method_args=[call.arg],
+                        boxes=[(0, x.to_bytes(8, 'big')) for x in call.refs]
+                    )
+
+                atcs.append(atc)
+
+            # Check the packing of every group before sending any and set their minimal fees - the groups are
+            #  simulated one after another, each on the state left by the previous ones
+            await preflight_groups(algod_client, atcs)
+            # Sign all groups at once in a thread
+            await asyncio.to_thread(sign_groups, atcs)
+
+            results, failure = await execute_pipelined(algod_client, atcs, TX_APPROVAL_WAIT)
+
+            for result in results:
+                for res in result.tx_ids:
+                    print("\tTx ID: " + res)
+
+            if failure is not None:
+                if not results:
+                    raise failure
+                print("\tGroup failed ({}), resubmitting from the number of boxes on chain ...".format(failure))
+                curr_boxes = (await read_global_state(algod_client, cc_id)).get("NB")
+            else:
+                curr_boxes = stop_box
+
+    if stop_box > 0:
+        raise Exception("Deleted boxes down to {}, but box {} does not exist, thus the rest cannot be deleted.".format(
+            lowest_box, stop_box))
+
+    return
+
+
+# Function executes a group of a single transaction of a user
+async def executeUserTransaction(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    build
+):
+    user_address = account.address_from_private_key(userSK)
+
+    sp = await algod_client.suggested_params()
+    atc = AtomicTransactionComposer()
+    atc.add_transaction(TransactionWithSigner(build(user_address, sp), AccountTransactionSigner(userSK)))
+
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    await preflight(algod_client, atc)
+
+    result = await execute(algod_client, atc, TX_APPROVAL_WAIT)
+
+    for res in result.tx_ids:
+        print("\tTx ID: " + res)
+
+    return
+
+
+async def optinCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int
+):
+    await executeUserTransaction(algod_client, userSK, lambda user_address, sp: transaction.ApplicationOptInTxn(
+        sender=user_address, sp=sp, index=cc_id))
+
+    return
+
+
+async def optoutCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int
+):
+    await executeUserTransaction(algod_client, userSK, lambda user_address, sp: transaction.ApplicationCloseOutTxn(
+        sender=user_address, sp=sp, index=cc_id))
+
+    return
+
+
+async def clearStateCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int
+):
+    await executeUserTransaction(algod_client, userSK, lambda user_address, sp: transaction.ApplicationClearStateTxn(
+        sender=user_address, sp=sp, index=cc_id))
+
+    return
+
+
+async def stakeCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int,
+    sc_id: int,
+    ac_id: int,
+    a_id: int,
+    stake_amt: int
+):
+    # Claims required before the stake, the deposit for the fees and the boxes possibly created are planned as in the
+    # blocking version
+    await executeUserIntents(algod_client, userSK, cc_id, sc_id, ac_id, a_id, [Intent(STAKE, stake_amt)])
+
+    return
+
+
+async def localClaimCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int
+):
+    user_address = account.address_from_private_key(userSK)
+
+    # The signing service (and its workers) lives for the claiming of all boxes
+    with SigningService(userSK) as service:
+        while True:
+
+            # Get current number of boxes in the contract and the local one
+            cc_state, local_state = await asyncio.gather(
+                read_global_state(algod_client, cc_id), read_local_state(algod_client, user_address, cc_id))
+            curr_boxes = cc_state["NB"]
+            local_boxes = local_state.get("LNB")
+
+            box_missing = curr_boxes - local_boxes
+            if box_missing == 0:
+                break
+            elif box_missing < 0:
+                raise Exception("Unfortunately you were too late to claim your stake...")
+            else:
+                # Boxes are claimed in chained groups, sent without waiting for confirmations (as in the blocking
+                #  version)
+                sp = await algod_client.suggested_params()
+                signer = PoolTransactionSigner(service)
+                atcs = []
+
+                for group in pack_claims(local_boxes, curr_boxes):
+                    atc = AtomicTransactionComposer()
+
+                    for call in group:
+                        # Call to the `local_claim` method
+                        atc.add_method_call(
+                            app_id=cc_id,
+                            method=Autocompounder.local_claim,
+                            sender=user_address,
+                            sp=sp,
+                            signer=signer,
+                            method_args=[call.arg],
+                            boxes=[(0, x.to_bytes(8, 'big')) for x in call.refs]
+                        )
+
+                    atcs.append(atc)
+
+                # Check the packing of every group before sending any and set their minimal fees - the groups are
+                #  simulated one after another, each on the state left by the previous ones
+                await preflight_groups(algod_client, atcs)
+                # Sign all groups at once in a thread
+                await asyncio.to_thread(sign_groups, atcs)
+
+                results, failure = await execute_pipelined(algod_client, atcs, TX_APPROVAL_WAIT)
+
+                for result in results:
+                    for res in result.tx_ids:
+                        print("\tTx ID: " + res)
+
+                if failure is not None:
+                    if not results:
+                        raise failure
+                    print("\tGroup failed ({}), resubmitting from the first failed group ...".format(failure))
+
+    return
+
+
+async def withdrawCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int,
+    sc_id: int,
+    ac_id: int,
+    a_id: int,
+    withdraw_amt: int
+):
+    # Claims required before the withdrawal, the deposit for the fees and the boxes possibly created are planned as in
+    # the blocking version
+    withdrawn = await executeUserIntents(algod_client, userSK, cc_id, sc_id, ac_id, a_id,
+                                         [Intent(WITHDRAW, withdraw_amt)])
+
+    for ret_val in withdrawn:
+        print("\tReturn value: " + str(ret_val))
+
+    return withdrawn[0]
+
+
+# Function expands intents of a user into steps from the current state of the contract (see fusion_planner.plan_steps)
+async def planUserSteps(
+    algod_client: AsyncAlgodClient,
+    user_address: str,
+    cc_id: int,
+    intents: list
+):
+    current_round, cc_state, user_info = await asyncio.gather(
+        algod_client.current_round(), read_global_state(algod_client, cc_id), algod_client.account_info(user_address))
+    opted_in = any(local["id"] == cc_id for local in user_info.get("apps-local-state", []))
+    local_state = await read_local_state(algod_client, user_address, cc_id) if opted_in else {}
+
+    increases = []
+    if needs_increases(cc_state, local_state, intents):
+        first = local_state.get("LNB", 0) + 1
+        increases = box_increases(await fetch_boxes(algod_client, cc_id, first, cc_state["NB"]), first)
+
+    return plan_intents(cc_state, local_state, opted_in, current_round, intents, increases)
+
+
+async def executeUserIntents(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int,
+    sc_id: int,
+    ac_id: int,
+    a_id: int,
+    intents: list,
+    max_attempts: int = MAX_ATTEMPTS
+):
+    user_address = account.address_from_private_key(userSK)
+
+    # Intents not yet done and the amounts withdrawn by the groups confirmed in failed attempts
+    remaining, withdrawn = list(intents), []
+
+    async def attempt():
+        # Merge the operations (incl. the local claims they require) into as few atomic groups as possible
+        steps = await planUserSteps(algod_client, user_address, cc_id, remaining)
+        groups = fuse(steps)
+        print("\tPlanned {} operation(s) in {} group(s).".format(len(steps), len(groups)))
+
+        atcs = compose_groups(await algod_client.suggested_params(), userSK, cc_id, sc_id, ac_id, a_id, groups)
+        if not atcs:
+            return withdrawn
+
+        # Check every group before sending any and set their minimal fees - the groups are simulated one after another,
+        # each on the state left by the previous ones
+        await preflight_groups(algod_client, atcs)
+
+        results, failure = await execute_pipelined(algod_client, atcs, TX_APPROVAL_WAIT)
+
+        for result in results:
+            for res in result.tx_ids:
+                print("\tTx ID: " + res)
+
+        if failure is not None:
+            print("\tExecuted {} of {} group(s).".format(len(results), len(atcs)))
+            # Operations of the confirmed groups are done - only the others are planned again
+            remaining[:] = remaining_intents(remaining, groups, len(results))
+            withdrawn.extend(withdrawals(results))
+            raise failure
+
+        # Return values of the withdrawals (withdrawn amounts)
+        return withdrawn + withdrawals(results)
+
+    # Operations are planned for the current number of boxes - if a compounding of somebody else is confirmed first,
+    # they are planned again
+    operation = "+".join(intent.kind for intent in intents)
+    return await execute_with_replan(algod_client, cc_id, operation, attempt, max_attempts)
+
+
+async def triggerCompoundingCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int,
+    sc_id: int,
+    ac_id: int,
+    a_id: int
+):
+    user_address = account.address_from_private_key(userSK)
+    # Get compound contract address
+    CC_address = get_application_address(cc_id)
+    # Get staking contract address
+    SC_address = get_application_address(sc_id)
+
+    next_trig_round = await getTriggerRound(algod_client, cc_id)
+    if next_trig_round > 0:
+        print("\tCompounding is not scheduled for the current round.")
+        print("\tNext scheduled trigger at round: " + str(next_trig_round))
+        print("\tTip: you can add funds to trigger the contract now.")
+        return 0
+    elif next_trig_round == -1:
+        print("\tCompounding can't be triggered because the pool has already ended.")
+        return 0
+    elif next_trig_round == -2:
+        print("\tCompounding can't be triggered because there is not stake in the pool.")
+        return 0
+    elif next_trig_round == -3:
+        # Next compounding would be after pool end, where it's not necessary anymore
+        print("\tThere are no more triggers scheduled before pool end.")
+        return 0
+
+    CC_state = await read_global_state(algod_client, cc_id)
+
+    sp = await algod_client.suggested_params()
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner(userSK)
+
+    # Compounding can potentially create a new box, thus supply it preemptively
+    num_boxes = CC_state.get("NB")
+    box_array = [(0, (num_boxes + 1).to_bytes(8, 'big'))]
+
+    # Make the app call
+    atc.add_method_call(
+        app_id=cc_id,
+        method=Autocompounder.trigger_compound,
+        sender=user_address,
+        sp=sp,
+        signer=signer,
+        method_args=None,
+        foreign_assets=[a_id],
+        foreign_apps=[sc_id, ac_id],
+        accounts=[CC_address, SC_address],
+        boxes=box_array
+    )
+
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    await preflight(algod_client, atc)
+
+    result = await execute(algod_client, atc, TX_APPROVAL_WAIT)
+
+    for res in result.tx_ids:
+        print("\tTx ID: " + res)
+
+    return 1
+
+
+async def compoundNowCompoundContract(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int,
+    sc_id: int,
+    ac_id: int,
+    a_id: int
+):
+    user_address = account.address_from_private_key(userSK)
+
+    # Get compound contract address
+    CC_address = get_application_address(cc_id)
+    # Get staking contract address
+    SC_address = get_application_address(sc_id)
+
+    sp, CC_state = await asyncio.gather(algod_client.suggested_params(), read_global_state(algod_client, cc_id))
+    atc = AtomicTransactionComposer()
+    signer = AccountTransactionSigner(userSK)
+
+    # Fund the compound contract with enough funds to cover the fees for the compounding.
+    fund_tx = transaction.PaymentTxn(
+        sender=user_address,
+        sp=sp,
+        receiver=CC_address,
+        amt=Autocompounder.CC_FEE_FOR_COMPOUND,
+    )
+    atc.add_transaction(TransactionWithSigner(fund_tx, signer))
+
+    # Compounding will create a new box, thus supply it preemptively
+    num_boxes = CC_state.get("NB")
+    box_array = [(0, (num_boxes + 1).to_bytes(8, 'big'))]
+
+    # Make the app call
+    atc.add_method_call(
+        app_id=cc_id,
+        method=Autocompounder.compound_now,
+        sender=user_address,
+        sp=sp,
+        signer=signer,
+        method_args=None,
+        foreign_assets=[a_id],
+        foreign_apps=[sc_id, ac_id],
+        accounts=[SC_address],
+        boxes=box_array
+    )
+
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    await preflight(algod_client, atc)
+
+    result = await execute(algod_client, atc, TX_APPROVAL_WAIT)
+
+    for res in result.tx_ids:
+        print("\tTx ID: " + res)
+
+    return
+
+
+async def sheduleAdditionalCompounding(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int,
+    num_triggers: int = 1
+):
+    # Scheduling additional optimal compounding is done automatically by simply depositing another fee for triggering
+    # Get compound contract address
+    CC_address = get_application_address(cc_id)
+
+    # Fund the compound contract with enough funds to cover the fees for the compoundings
+    await executeUserTransaction(algod_client, userSK, lambda user_address, sp: transaction.PaymentTxn(
+        sender=user_address, sp=sp, receiver=CC_address, amt=num_triggers * Autocompounder.CC_FEE_FOR_COMPOUND))
+
+    return
+
+
+async def planCompounding(
+    algod_client: AsyncAlgodClient,
+    cc_id: int,
+    reward_rate: float,
+    fee_price: float
+):
+    # Plan the number of triggers that maximizes the net yield of the pool
+    CC_address = get_application_address(cc_id)
+    CC_info, CC_state = await asyncio.gather(
+        algod_client.account_info(CC_address), read_global_state(algod_client, cc_id))
+
+    return plan_schedule(CC_state, CC_info.get("amount"), CC_info.get("min-balance"), reward_rate, fee_price)
+
+
+async def sheduleOptimalCompounding(
+    algod_client: AsyncAlgodClient,
+    userSK: str,
+    cc_id: int,
+    reward_rate: float,
+    fee_price: float
+):
+    # Fund exactly the number of triggers that are missing for the optimal schedule in one payment
+    plan = await planCompounding(algod_client, cc_id, reward_rate, fee_price)
+
+    if plan["additional"] > 0:
+        await sheduleAdditionalCompounding(algod_client, userSK, cc_id, plan["additional"])
+
+    return plan
+
+
+async def getUsersCompoundStake(
+    algod_client: AsyncAlgodClient,
+    user_address: str,
+    cc_id: int
+):
+
+    try:
+        # Get current number of boxes in the contract and the local one
+        cc_state, cc_local_state = await asyncio.gather(
+            read_global_state(algod_client, cc_id), read_local_state(algod_client, user_address, cc_id))
+        curr_boxes = cc_state["NB"]
+        local_boxes = cc_local_state.get("LNB")
+
+        # Get user's local stake
+        local_stake = fixed_point.from_bytes(cc_local_state.get("LS"))
+
+        # Compound the yet unclaimed boxes the same way as the contract does
+        #  Boxes never change once created, thus only the boxes not yet cached locally are fetched from the node
+        values = await fetch_boxes(algod_client, cc_id, local_boxes + 1, curr_boxes)
+        increases = box_increases(values, local_boxes + 1)
+
+        return fixed_point.floor(fixed_point.project(local_stake, increases))
+
+    except error.AlgodHTTPError as e:
+        print("\tError: " + str(e))
+        return None
+    except KeyError:
+        print("\nYou are not opted into the contract!")
+        return None
+
+
+async def readAllCompoundingContributions(
+    algod_client: AsyncAlgodClient,
+    cc_id: int
+):
+
+    try:
+        print("\nIncrements from compoundings:")
+        # Get current number of boxes in the contract
+        cc_state = await read_global_state(algod_client, cc_id)
+        curr_boxes = cc_state["NB"]
+
+        if curr_boxes == 0:
+            print('\t There has been no compounding done yet')
+            return
+
+        # Go through each box and print the increment
+        async for record in iter_increments(algod_client, cc_id, 1, curr_boxes):
+            if record.raw is None:
+                print("\tBox number {:04d}: does not exist".format(record.box))
+                continue
+            # Get the increase amount from the box
+            increment = fixed_point.format_fixed(record.increment, 30)
+
+            print("\tBox number {:04d}: b64='{}' = {}".format(
+                record.box, base64.b64encode(record.raw).decode(), increment))
+
+    except error.AlgodHTTPError as e:
+        print("\tError: " + str(e))
+    except KeyError:
+        print("\nYou are not opted into the contract!")
+
+async def getTriggerRound(
+    algod_client: AsyncAlgodClient,
+    cc_id: int
+):
+    try:
+        # Get compound contract address
+        CC_address = get_application_address(cc_id)
+
+        # Check if compounding can be triggered - the reads are made concurrently
+        CC_info, currentRound, CC_state = await asyncio.gather(
+            algod_client.account_info(CC_address), algod_client.current_round(),
+            read_global_state(algod_client, cc_id))
+        CC_balance = CC_info.get("amount")
+        CC_MRB = CC_info.get("min-balance")
+        num_triggers = math.floor((CC_balance - CC_MRB) / Autocompounder.CC_FEE_FOR_COMPOUND)
+
+        if num_triggers != 0:
+            next_compound_round = math.floor((CC_state["PER"] - CC_state["LCR"]) / num_triggers) + CC_state["LCR"]
+            if next_compound_round >= CC_state["PER"]:
+                return -3
+            else:
+                if CC_state["LCR"] > CC_state["PER"]:
+                    return -1
+                else:
+                    if next_compound_round <= currentRound:
+                        return 0
+                    else:
+                        return next_compound_round
+        else:
+            return -2
+
+    except error.AlgodHTTPError as e:
+        print("\tError: " + str(e))
+        return None
+    except KeyError:
+        print("\tAre you really accessing a compounding contract?")
+        return None
@@ -3,7 +3,6 @@ import base64
 import glob
 import math
 from math import ceil
-from decimal import *
 
 from algosdk.v2client import algod, indexer
 from algosdk import account, mnemonic, error, transaction
@@ -12,11 +11,23 @@ from algosdk import encoding
 from algosdk.atomic_transaction_composer import AtomicTransactionComposer, AccountTransactionSigner, \
     TransactionWithSigner
 from algosdk.logic import get_application_address
-from beaker import get_method_spec
 
 from util import *
 
-from contract import Autocompounder, deploy
+from autocompounder_abi import Autocompounder
+from schedule_planner import plan_schedule
+from box_cache import fetch_boxes
+from box_listing import list_boxes, top_run_start
+import fixed_point
+from increment_history import iter_increments
+import state_snapshot
+from group_pipeline import execute_pipelined
+from box_packer import pack_claims, pack_deletions
+from fusion_planner import plan_steps, fuse, build_groups, remaining_intents, withdrawals, Intent, STAKE, WITHDRAW
+from race_retry import execute_with_replan, MAX_ATTEMPTS
+from preflight import preflight, preflight_groups
+from confirmation_tracker import execute_tracked
+from signing_service import SigningService, PoolTransactionSigner, sign_groups
 
 # ---------------------------------------------------------------
 
@@ -29,6 +40,8 @@ def createCompoundContract(
     ac_id: int,
     cp: int
 ):
+    # Deployment needs PyTEAL and Beaker to build the contract, thus they are imported only when deploying
+    from contract import deploy
 
     [app_id, txid] = deploy(creatorSK, sc_id, ac_id, cp)
 
@@ -36,7 +49,7 @@ def createCompoundContract(
 
     assert app_id is not None and app_id > 0
 
-    cc_state = read_global_state(algod_client, app_id)
+    cc_state = state_snapshot.read_global_state(algod_client, app_id)
     a_id = cc_state["S_ASA_ID"]
 
     return [app_id, a_id]
@@ -54,14 +67,11 @@ def setupCompoundContract(
     # Get compound contract address
     CC_address = get_application_address(cc_id)
 
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(creatorSK)
 
-    sp.flat_fee = True
-    # There are 4 txs: fund the contract for opt-ins, call to CC, SC opt-in, and ASA opt-in
-    sp.fee = 4 * sp.min_fee
-
+    # Fees of the group (fund the contract for opt-ins, call to CC, SC opt-in, and ASA opt-in) are set by the preflight
     # Fund the compound contract with minimal balance to opt-in to the staking contract and ASA
     # Minimal balance: minimal balance for any account + minimal balance for 1 ASA + for opt-in to staking contract (not
     # exactly sure about the amount since it is in Reach - just one Byte slice? = 25_000 + 25_000; seems to be 3 slices)
@@ -76,13 +86,12 @@ def setupCompoundContract(
     tws = TransactionWithSigner(fund_tx, signer)
 
     atc.add_transaction(tws)
-    sp.fee = 0
 
     app_args = []
     # Call to the `on_setup` method
     atc.add_method_call(
         app_id=cc_id,
-        method=get_method_spec(Autocompounder.on_setup),
+        method=Autocompounder.on_setup,
         sender=creator_address,
         sp=sp,
         signer=signer,
@@ -91,8 +100,12 @@ def setupCompoundContract(
         foreign_apps=[sc_id]
     )
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -115,25 +128,13 @@ def deleteCompoundContract(algod_client: algod.AlgodClient,
     # Get staking contract address
     SC_address = get_application_address(sc_id)
 
-    cc_state = read_global_state(algod_client, cc_id)
-    lcd = cc_state["LCD"]
-
-    if lcd == Autocompounder.LAST_COMPOUND_NOT_DONE:
-        # There are 4 txs: call to CC, asset transfer to CC creator, clear state from SC, and account close out
-        # transaction to CC creator, and initial claiming and unstaking from SC
-        num_fees = 4 + 4 + 3
-    else:
-        # There are 4 txs: call to CC, asset transfer to CC creator, clear state from SC, and account close out
-        # transaction to CC creator
-        num_fees = 4
-
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(creatorSK)
 
-    sp.flat_fee = True
-
-    sp.fee = num_fees * sp.min_fee
+    # Fees of the call to CC and its inner transactions (asset transfer to CC creator, clear state from SC, and account
+    # close out transaction to CC creator, and initial claiming and unstaking from SC if the last compounding has not
+    # been done) are set by the preflight
 
     tx = transaction.ApplicationDeleteTxn(
         sender=creator_address,
@@ -147,8 +148,12 @@ def deleteCompoundContract(algod_client: algod.AlgodClient,
     tws = TransactionWithSigner(tx, signer)
     atc.add_transaction(tws)
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -163,56 +168,78 @@ def deleteAllBoxes(
 ):
     creator_address = account.address_from_private_key(creatorSK)
 
-    # Number of boxes in a batch to process
-    BB = 7
-
     # Get current number of boxes in the contract
-    curr_boxes = read_global_state(algod_client, cc_id).get("NB")
+    curr_boxes = state_snapshot.read_global_state(algod_client, cc_id).get("NB")
 
     if curr_boxes < 1:
         raise Exception("There are no boxes, thus none can be deleted.")
 
-    # Process all of them
-    while curr_boxes > 0:
-
-        sp = algod_client.suggested_params()
-        atc = AtomicTransactionComposer()
-        signer = AccountTransactionSigner(creatorSK)
-
-        g = 0
-
-        while g < 16 and curr_boxes > 0:
-            # Process them in batches - try to add as many in a single group (i.e. max 16)
-            down_to = curr_boxes - BB
-            if down_to < 0:
-                down_to = 0
+    # Plan the deletion from a single listing of the boxes of the contract
+    #  Boxes are deleted from the top down and each must exist, thus deletion has to stop at a missing box
+    listed = list_boxes(algod_client, cc_id)
+    lowest_box = top_run_start(listed, curr_boxes)
+    if lowest_box == 0:
+        raise Exception("Box {} does not exist, thus no box can be deleted.".format(curr_boxes))
+    stop_box = lowest_box - 1
 
-            app_args = [down_to]
-
-            # Generate box array
-            box_array = [(0, x.to_bytes(8, 'big')) for x in range(curr_boxes, down_to, -1)]
-
-            # Call to the `delete_boxes` method
-            atc.add_method_call(
-                app_id=cc_id,
-                method=get_method_spec(Autocompounder.delete_boxes),
-                sender=creator_address,
-                sp=sp,
-                signer=signer,
-                method_args=app_args,
-                foreign_assets=None,
-                foreign_apps=None,
-                boxes=box_array
-            )
-
-            g += 1
-            curr_boxes = down_to
-
-        log_gtx(atc.build_group())
-        result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    # Process all of them
+    #  Boxes are packed into as few groups and calls as the box references and opcode budget allow. Groups are chained
+    #  (each continues from the down_to of the previous one), thus they are sent without waiting for confirmations.
+    #  If a group fails, the deletion continues from the number of boxes on chain.
+    # The signing service (and its workers) lives for the deletion of all boxes
+    with SigningService(creatorSK) as service:
+        while curr_boxes > stop_box:
+
+            sp = state_snapshot.suggested_params(algod_client)
+            signer = PoolTransactionSigner(service)
+            atcs = []
+
+            for group in pack_deletions(curr_boxes, stop_box):
+                atc = AtomicTransactionComposer()
+
+                for call in group:
+                    # Generate box array
+                    box_array = [(0, x.to_bytes(8, 'big')) for x in call.refs]
+
+                    # Call to the `delete_boxes` method
+                    atc.add_method_call(
+                        app_id=cc_id,
+                        method=Autocompounder.delete_boxes,
+                        sender=creator_address,
+                        sp=sp,
+                        signer=signer,
+                        method_args=[call.arg],
+                        foreign_assets=None,
+                        foreign_apps=None,
+                        boxes=box_array
+                    )
+
+                atcs.append(atc)
+
+            # Check the packing of every group before sending any and set their minimal fees - the groups are
+            #  simulated one after another, each on the state left by the previous ones
+            preflight_groups(algod_client, atcs)
+            # Sign all groups at once, in one batch
+            sign_groups(atcs)
+
+            results, failure = execute_pipelined(algod_client, atcs, TX_APPROVAL_WAIT)
+            state_snapshot.invalidate(algod_client)
+
+            for result in results:
+                for res in result.tx_ids:
+                    print("\tTx ID: " + res)
+
+            if failure is not None:
+                if not results:
+                    raise failure
+                print("\tGroup failed ({}), resubmitting from the number of boxes on chain ...".format(failure))
+                curr_boxes = state_snapshot.read_global_state(algod_client, cc_id).get("NB")
+            else:
+                curr_boxes = stop_box
 
-        for res in result.tx_ids:
-            print("\tTx ID: " + res)
+    if stop_box > 0:
+        raise Exception("Deleted boxes down to {}, but box {} does not exist, thus the rest cannot be deleted.".format(
+            lowest_box, stop_box))
 
     return
 
@@ -224,7 +251,7 @@ def optinCompoundContract(
 ):
     user_address = account.address_from_private_key(userSK)
 
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(userSK)
 
@@ -236,8 +263,12 @@ def optinCompoundContract(
     tws = TransactionWithSigner(tx, signer)
     atc.add_transaction(tws)
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -252,7 +283,7 @@ def optoutCompoundContract(
 ):
     user_address = account.address_from_private_key(userSK)
 
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(userSK)
 
@@ -264,8 +295,12 @@ def optoutCompoundContract(
     tws = TransactionWithSigner(tx, signer)
     atc.add_transaction(tws)
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -280,7 +315,7 @@ def clearStateCompoundContract(
 ):
     user_address = account.address_from_private_key(userSK)
 
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(userSK)
 
@@ -292,8 +327,12 @@ def clearStateCompoundContract(
     tws = TransactionWithSigner(tx, signer)
     atc.add_transaction(tws)
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -310,92 +349,14 @@ def stakeCompoundContract(
     a_id: int,
     stake_amt: int
 ):
-    user_address = account.address_from_private_key(userSK)
-
     # To stake, it is first necessary to claim all compounded amounts by checking all the boxes; unless you have a zero
-    # stake
-    cc_local_state = read_local_state(algod_client, user_address, cc_id)
-    if int.from_bytes(cc_local_state["LS"], 'big') != 0:
-        print("\tClaiming rewards before additional stake can be deposited ...")
-        localClaimCompoundContract(algod_client, userSK, cc_id)
-        print("\tFinished claiming rewards.")
-        print("\tDepositing additional stake...")
-
-    # Get compound contract address
-    CC_address = get_application_address(cc_id)
-    # Get staking contract address
-    SC_address = get_application_address(sc_id)
-
-    sp = algod_client.suggested_params()
-    atc = AtomicTransactionComposer()
-    signer = AccountTransactionSigner(userSK)
-
-    sp.flat_fee = True
-    # There are 3 txs: fund the contract for covering of fees, transfer of assets, and call to CC (other fees are paid
-    # from the funding transaction)
-    sp.fee = 3 * sp.min_fee
-
+    # stake. The claims are made in the same group as the stake when they fit into it.
     # Fund the compound contract with enough funds to cover the fees for at least one compounding. Depending on the
     # state (e.g. if somebody has already deposit a stake for the first time or the pool is live), the fees might be
     # higher.
-    current_round = algod_client.status().get('last-round')
-    cc_state = read_global_state(algod_client, cc_id)
-    pool_start_round = cc_state["PSR"]
-    total_stake = cc_state["TS"]
-    if current_round > pool_start_round and total_stake > 0:
-        amt = Autocompounder.CC_FEE_FOR_COMPOUND * 2
-    else:
-        amt = Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.STAKE_TO_SC_FEE
-
-    fund_tx = transaction.PaymentTxn(
-        sender=user_address,
-        sp=sp,
-        receiver=CC_address,
-        amt=amt,
-    )
-    tws = TransactionWithSigner(fund_tx, signer)
-
-    atc.add_transaction(tws)
-    sp.fee = 0
-
-    # Transfer the amount wished to be staked
-    axfr_tx = transaction.AssetTransferTxn(
-        sender=user_address,
-        sp=sp,
-        receiver=CC_address,
-        amt=stake_amt,
-        index=a_id
-    )
-    tws = TransactionWithSigner(axfr_tx, signer)
-
-    atc.add_transaction(tws)
-
-    # Staking can potentially create a new box, thus supply it preemptively
-    #  Get current number of boxes in the contract
-    num_boxes = read_global_state(algod_client, cc_id).get("NB")
-    if not isinstance(num_boxes, int):
-        raise Exception("Box supplied not int! " + str(num_boxes))
-    box_array = [(0, (num_boxes + 1).to_bytes(8, 'big'))]
-
-    # Make the app call
-    atc.add_method_call(
-        app_id=cc_id,
-        method=get_method_spec(Autocompounder.stake),
-        sender=user_address,
-        sp=sp,
-        signer=signer,
-        method_args=None,
-        foreign_assets=[a_id],
-        foreign_apps=[sc_id, ac_id],
-        accounts=[SC_address],
-        boxes=box_array
-    )
-
-    log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
-
-    for res in result.tx_ids:
-        print("\tTx ID: " + res)
+    # Staking can potentially create a new box, thus it is supplied preemptively, together with the spare following
+    # ones. If a compounding of somebody else is confirmed first, staking is planned again for the new number of boxes.
+    executeUserIntents(algod_client, userSK, cc_id, sc_id, ac_id, a_id, [Intent(STAKE, stake_amt)])
 
     return
 
@@ -407,63 +368,69 @@ def localClaimCompoundContract(
 ):
     user_address = account.address_from_private_key(userSK)
 
-    # Number of boxes in a batch to process
-    BB = 7
-
-    while True:
-
-        # Get current number of boxes in the contract
-        cc_state = read_global_state(algod_client, cc_id)
-        curr_boxes = cc_state["NB"]
-        # Get local current number of boxes in the contract
-        local_boxes = read_local_state(algod_client, user_address, cc_id).get("LNB")
-
-        box_missing = curr_boxes - local_boxes
-        if box_missing == 0:
-            break
-        elif box_missing < 0:
-            raise Exception("Unfortunately you were too late to claim your stake...")
-        else:
-            sp = algod_client.suggested_params()
-            atc = AtomicTransactionComposer()
-            signer = AccountTransactionSigner(userSK)
-
-            g = 0
-
-            while g < 16 and box_missing > 0:
-                # Process them in batches - try to group as many (i.e. max 16)
-                if box_missing < BB:
-                    up_to = curr_boxes
-                else:
-                    up_to = local_boxes + BB
-
-                app_args = [up_to]
-
-                # Generate box array
-                box_array = [(0, x.to_bytes(8, 'big')) for x in range(local_boxes+1, up_to+1, +1)]
-
-                # Call to the `local_claim` method
-                atc.add_method_call(
-                    app_id=cc_id,
-                    method=get_method_spec(Autocompounder.local_claim),
-                    sender=user_address,
-                    sp=sp,
-                    signer=signer,
-                    method_args=app_args,
-                    foreign_assets=None,
-                    foreign_apps=None,
-                    boxes=box_array
-                )
-
-                g += 1
-                local_boxes = up_to
-                box_missing = curr_boxes - local_boxes
-
-            log_gtx(atc.build_group())
-            result = atc.execute(algod_client, TX_APPROVAL_WAIT)
-
-            for res in result.tx_ids:
-                print("\tTx ID: " + res)
+    # The signing service (and its workers) lives for the claiming of all boxes
+    with SigningService(userSK) as service:
+        while True:
+
+            # Get current number of boxes in the contract
+            cc_state = state_snapshot.read_global_state(algod_client, cc_id)
+            curr_boxes = cc_state["NB"]
+            # Get local current number of boxes in the contract
+            local_boxes = state_snapshot.read_local_state(algod_client, user_address, cc_id).get("LNB")
+
+            box_missing = curr_boxes - local_boxes
+            if box_missing == 0:
+                break
+            elif box_missing < 0:
+                raise Exception("Unfortunately you were too late to claim your stake...")
+            else:
+                # Boxes are packed into as few groups and calls as the box references and opcode budget allow. Groups
+                # are chained (each continues from the up_to of the previous one), thus they are sent without waiting
+                # for confirmations. If a group fails, the claiming continues from the local number of boxes on chain
+                # in the next iteration.
+                sp = state_snapshot.suggested_params(algod_client)
+                signer = PoolTransactionSigner(service)
+                atcs = []
+
+                for group in pack_claims(local_boxes, curr_boxes):
+                    atc = AtomicTransactionComposer()
+
+                    for call in group:
+                        # Generate box array
+                        box_array = [(0, x.to_bytes(8, 'big')) for x in call.refs]
+
+                        # Call to the `local_claim` method
+                        atc.add_method_call(
+                            app_id=cc_id,
+                            method=Autocompounder.local_claim,
+                            sender=user_address,
+                            sp=sp,
+                            signer=signer,
+                            method_args=[call.arg],
+                            foreign_assets=None,
+                            foreign_apps=None,
+                            boxes=box_array
+                        )
+
+                    atcs.append(atc)
+
+                # Check the packing of every group before sending any and set their minimal fees - the groups are
+                #  simulated one after another, each on the state left by the previous ones
+                preflight_groups(algod_client, atcs)
+                # Sign all groups at once, in one batch
+                sign_groups(atcs)
+
+                results, failure = execute_pipelined(algod_client, atcs, TX_APPROVAL_WAIT)
+                state_snapshot.invalidate(algod_client)
+
+                for result in results:
+                    for res in result.tx_ids:
+                        print("\tTx ID: " + res)
+
+                if failure is not None:
+                    if not results:
+                        raise failure
+                    print("\tGroup failed ({}), resubmitting from the first failed group ...".format(failure))
 
     return
 
@@ -477,97 +444,72 @@ def withdrawCompoundContract(
     a_id: int,
     withdraw_amt: int
 ):
-    user_address = account.address_from_private_key(userSK)
-
     # To withdraw, it is first necessary to claim all compounded amounts by checking all the boxes; unless you have
-    # already claimed all
-    cc_local_state = read_local_state(algod_client, user_address, cc_id)
-    cc_global_state = read_global_state(algod_client, cc_id)
-    if cc_local_state["LNB"] != cc_global_state["NB"]:
-        print("\tClaiming rewards before withdrawing can be done ...")
-        localClaimCompoundContract(algod_client, userSK, cc_id)
-        print("\tFinished claiming rewards.")
-        print("\tWithdrawing requested amount...")
-    # Only now it is really possible to withdraw - could still fail if another compounding happened while the user has
-    # been locally claiming! In this case, the processes of local claiming needs to be repeated. That can be stalled at
-    # most up to the end of the pool.
-
+    # already claimed all. The claims are made in the same group as the withdrawal when they fit into it.
+    # Fund the compound contract with enough funds to cover the withdrawal. Depending on the state (e.g. if pool has not
+    # yet started, is ongoing, has ended and somebody has already compounded the last amount or not), the fees can be
+    # different.
+    # Withdrawal can potentially create a new box, thus it is supplied preemptively, together with the spare following
+    # ones. If another compounding happens while the user has been locally claiming, the claiming and withdrawal are
+    # planned again for the new number of boxes (at most MAX_ATTEMPTS times).
+    withdrawn = executeUserIntents(algod_client, userSK, cc_id, sc_id, ac_id, a_id, [Intent(WITHDRAW, withdraw_amt)])
 
-    # Get compound contract address
-    CC_address = get_application_address(cc_id)
-    # Get staking contract address
-    SC_address = get_application_address(sc_id)
+    for ret_val in withdrawn:
+        print("\tReturn value: " + str(ret_val))
 
-    sp = algod_client.suggested_params()
-    atc = AtomicTransactionComposer()
-    signer = AccountTransactionSigner(userSK)
+    return withdrawn[0]
 
-    sp.flat_fee = True
-    # There are 3 txs: fund the contract for covering of fees, call to CC, and sending of ASA from CC.address to user
-    sp.fee = 3 * sp.min_fee
 
-    # Fund the compound contract with enough funds to cover the withdrawal. Depending on the state (e.g. if pool has not
-    # yet started, is ongoing, has ended and somebody has already compounded the last amount or not), the fees can be
-    # different.
-    current_round = algod_client.status().get('last-round')
-    cc_state = read_global_state(algod_client, cc_id)
-    pool_start_round = cc_state["PSR"]
-    pool_end_round = cc_state["PER"]
-    last_compound_done = cc_state["LCD"]
-    if current_round < pool_start_round:
-        amt = Autocompounder.UNSTAKE_FROM_SC_FEE
-    else:
-        if current_round <= pool_end_round:
-            amt = Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.UNSTAKE_FROM_SC_FEE
-        else:
-            if last_compound_done == Autocompounder.LAST_COMPOUND_NOT_DONE:
-                amt = Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.UNSTAKE_FROM_SC_FEE
-            else:
-                amt = 0
+def executeUserIntents(
+    algod_client: algod.AlgodClient,
+    userSK: str,
+    cc_id: int,
+    sc_id: int,
+    ac_id: int,
+    a_id: int,
+    intents: list,
+    max_attempts: int = MAX_ATTEMPTS
+):
+    user_address = account.address_from_private_key(userSK)
 
-    fund_tx = transaction.PaymentTxn(
-        sender=user_address,
-        sp=sp,
-        receiver=CC_address,
-        amt=amt,
-    )
-    tws = TransactionWithSigner(fund_tx, signer)
+    # Intents not yet done and the amounts withdrawn by the groups confirmed in failed attempts
+    remaining, withdrawn = list(intents), []
 
-    atc.add_transaction(tws)
-    sp.fee = 0
+    def attempt():
+        # Merge the operations (incl. the local claims they require) into as few atomic groups as possible
+        steps = plan_steps(algod_client, user_address, cc_id, remaining)
+        groups = fuse(steps)
+        print("\tPlanned {} operation(s) in {} group(s).".format(len(steps), len(groups)))
 
-    args = [withdraw_amt]
+        atcs = build_groups(algod_client, userSK, cc_id, sc_id, ac_id, a_id, groups)
+        if not atcs:
+            return withdrawn
 
-    # Withdrawal can potentially create a new box, thus supply it preemptively
-    #  Get current number of boxes in the contract
-    num_boxes = read_global_state(algod_client, cc_id).get("NB")
-    box_array = [(0, (num_boxes + 1).to_bytes(8, 'big'))]
+        # Check every group before sending any and set their minimal fees - the groups are simulated one after another,
+        # each on the state left by the previous ones
+        preflight_groups(algod_client, atcs)
 
-    # Make the app call
-    atc.add_method_call(
-        app_id=cc_id,
-        method=get_method_spec(Autocompounder.withdraw),
-        sender=user_address,
-        sp=sp,
-        signer=signer,
-        method_args=args,
-        foreign_assets=[a_id],
-        foreign_apps=[sc_id, ac_id],
-        accounts=[SC_address],
-        boxes=box_array
-    )
+        results, failure = execute_pipelined(algod_client, atcs, TX_APPROVAL_WAIT)
+        state_snapshot.invalidate(algod_client)
 
-    log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+        for result in results:
+            for res in result.tx_ids:
+                print("\tTx ID: " + res)
 
-    for res in result.tx_ids:
-        print("\tTx ID: " + res)
+        if failure is not None:
+            print("\tExecuted {} of {} group(s).".format(len(results), len(atcs)))
+            # Operations of the confirmed groups are done - only the others are planned again
+            remaining[:] = remaining_intents(remaining, groups, len(results))
+            withdrawn.extend(withdrawals(results))
+            raise failure
 
-    for res in result.abi_results:
-        ret_val = res.return_value
-        print("\tReturn value: " + str(ret_val))
+        # Return values of the withdrawals (withdrawn amounts)
+        return withdrawn + withdrawals(results)
 
-    return result.abi_results[0].return_value
+    # Operations are planned for the current number of boxes - if a compounding of somebody else is confirmed first,
+    # they are planned again
+    operation = "+".join(intent.kind for intent in intents)
+    return execute_with_replan(algod_client, cc_id, operation, attempt, max_attempts)
 
 
 def triggerCompoundingCompoundContract(
@@ -601,9 +543,9 @@ def triggerCompoundingCompoundContract(
         print("\tThere are no more triggers scheduled before pool end.")
         return 0
 
-    CC_state = read_global_state(algod_client, cc_id)
+    CC_state = state_snapshot.read_global_state(algod_client, cc_id)
 
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(userSK)
 
@@ -615,7 +557,7 @@ def triggerCompoundingCompoundContract(
     # Make the app call
     atc.add_method_call(
         app_id=cc_id,
-        method=get_method_spec(Autocompounder.trigger_compound),
+        method=Autocompounder.trigger_compound,
         sender=user_address,
         sp=sp,
         signer=signer,
@@ -626,8 +568,12 @@ def triggerCompoundingCompoundContract(
         boxes=box_array
     )
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -650,14 +596,12 @@ def compoundNowCompoundContract(
     # Get staking contract address
     SC_address = get_application_address(sc_id)
 
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(userSK)
 
-    sp.flat_fee = True
-    # There are 2 txs: fund the contract for covering of fees, and call to CC (other fees are paid from the funding
-    # transaction)
-    sp.fee = 2 * sp.min_fee
+    # Fees of the group (fund the contract for covering of fees, and call to CC - other fees are paid from the funding
+    # transaction) are set by the preflight
 
     # Fund the compound contract with enough funds to cover the fees for the compounding.
     amt = Autocompounder.CC_FEE_FOR_COMPOUND
@@ -671,17 +615,16 @@ def compoundNowCompoundContract(
     tws = TransactionWithSigner(fund_tx, signer)
 
     atc.add_transaction(tws)
-    sp.fee = 0
 
     # Compounding will create a new box, thus supply it preemptively
     #  Get current number of boxes in the contract
-    num_boxes = read_global_state(algod_client, cc_id).get("NB")
+    num_boxes = state_snapshot.read_global_state(algod_client, cc_id).get("NB")
     box_array = [(0, (num_boxes + 1).to_bytes(8, 'big'))]
 
     # Make the app call
     atc.add_method_call(
         app_id=cc_id,
-        method=get_method_spec(Autocompounder.compound_now),
+        method=Autocompounder.compound_now,
         sender=user_address,
         sp=sp,
         signer=signer,
@@ -692,8 +635,12 @@ def compoundNowCompoundContract(
         boxes=box_array
     )
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -704,7 +651,8 @@ def compoundNowCompoundContract(
 def sheduleAdditionalCompounding(
     algod_client: algod.AlgodClient,
     userSK: str,
-    cc_id: int
+    cc_id: int,
+    num_triggers: int = 1
 ):
     # Scheduling additional optimal compounding is done automatically by simply depositing another fee for triggering
     # The whole schedule is optimized
@@ -713,12 +661,12 @@ def sheduleAdditionalCompounding(
     # Get compound contract address
     CC_address = get_application_address(cc_id)
 
-    sp = algod_client.suggested_params()
+    sp = state_snapshot.suggested_params(algod_client)
     atc = AtomicTransactionComposer()
     signer = AccountTransactionSigner(userSK)
 
-    # Fund the compound contract with enough funds to cover the fees for a compounding
-    amt = Autocompounder.CC_FEE_FOR_COMPOUND
+    # Fund the compound contract with enough funds to cover the fees for the compoundings
+    amt = num_triggers * Autocompounder.CC_FEE_FOR_COMPOUND
 
     fund_tx = transaction.PaymentTxn(
         sender=user_address,
@@ -729,8 +677,12 @@ def sheduleAdditionalCompounding(
     tws = TransactionWithSigner(fund_tx, signer)
     atc.add_transaction(tws)
 
+    # Simulate the group and set its minimal fees - groups that would fail are not sent
+    preflight(algod_client, atc)
+
     log_gtx(atc.build_group())
-    result = atc.execute(algod_client, TX_APPROVAL_WAIT)
+    result = execute_tracked(algod_client, atc, TX_APPROVAL_WAIT)
+    state_snapshot.invalidate(algod_client)
 
     for res in result.tx_ids:
         print("\tTx ID: " + res)
@@ -738,6 +690,38 @@ def sheduleAdditionalCompounding(
     return
 
 
+def planCompounding(
+    algod_client: algod.AlgodClient,
+    cc_id: int,
+    reward_rate: float,
+    fee_price: float
+):
+    # Plan the number of triggers that maximizes the net yield of the pool
+    # reward_rate is the reward rate of the staking pool per round, fee_price the price of a base unit of the staked
+    # asset in microALGO
+    CC_address = get_application_address(cc_id)
+    CC_info = state_snapshot.account_info(algod_client, CC_address)
+    CC_state = state_snapshot.read_global_state(algod_client, cc_id)
+
+    return plan_schedule(CC_state, CC_info.get("amount"), CC_info.get("min-balance"), reward_rate, fee_price)
+
+
+def sheduleOptimalCompounding(
+    algod_client: algod.AlgodClient,
+    userSK: str,
+    cc_id: int,
+    reward_rate: float,
+    fee_price: float
+):
+    # Fund exactly the number of triggers that are missing for the optimal schedule in one payment
+    plan = planCompounding(algod_client, cc_id, reward_rate, fee_price)
+
+    if plan["additional"] > 0:
+        sheduleAdditionalCompounding(algod_client, userSK, cc_id, plan["additional"])
+
+    return plan
+
+
 def getUsersCompoundStake(
     algod_client: algod.AlgodClient,
     user_address: str,
@@ -746,26 +730,25 @@ def getUsersCompoundStake(
 
     try:
         # Get current number of boxes in the contract
-        cc_state = read_global_state(algod_client, cc_id)
+        cc_state = state_snapshot.read_global_state(algod_client, cc_id)
         curr_boxes = cc_state["NB"]
         # Get local current number of boxes in the contract
-        cc_local_state = read_local_state(algod_client, user_address, cc_id)
+        cc_local_state = state_snapshot.read_local_state(algod_client, user_address, cc_id)
         local_boxes = cc_local_state.get("LNB")
 
         # Get user's local stake
-        ls_bytes = cc_local_state.get("LS")
-        local_stake = Decimal(int.from_bytes(ls_bytes, 'big'))
-
-        # Go through each yet unclaimed box and compound the result
-        for box in range(local_boxes + 1, curr_boxes + 1, +1):
-            # Fetch the increase amount from the box
-            increment = algod_client.application_box_by_name(cc_id, box.to_bytes(8, 'big'))
-            increment = Decimal(int.from_bytes(base64.b64decode(increment.get("value")), 'big'))\
-                        / Decimal(2 ** (8 * Autocompounder.LOCAL_STAKE_N))
+        local_stake = fixed_point.from_bytes(cc_local_state.get("LS"))
 
-            local_stake = local_stake*increment
+        # Go through each yet unclaimed box and compound the result the same way as the contract does, i.e. the result
+        # matches the local stake after claiming the boxes
+        #  Boxes never change once created, thus only the boxes not yet cached locally are fetched from the node
+        increases = []
+        for box, value in enumerate(fetch_boxes(algod_client, cc_id, local_boxes + 1, curr_boxes), local_boxes + 1):
+            if value is None:
+                raise Exception("Box {} does not exist!".format(box))
+            increases.append(fixed_point.from_bytes(value))
 
-        return (Decimal(local_stake) / Decimal(2 ** (8 * Autocompounder.LOCAL_STAKE_N))).quantize(Decimal('1'), rounding=ROUND_DOWN)
+        return fixed_point.floor(fixed_point.project(local_stake, increases))
 
     except error.AlgodHTTPError as e:
         print("\tError: " + str(e))
@@ -783,7 +766,7 @@ def readAllCompoundingContributions(
     try:
         print("\nIncrements from compoundings:")
         # Get current number of boxes in the contract
-        cc_state = read_global_state(algod_client, cc_id)
+        cc_state = state_snapshot.read_global_state(algod_client, cc_id)
         curr_boxes = cc_state["NB"]
 
         if curr_boxes == 0:
@@ -791,13 +774,15 @@ def readAllCompoundingContributions(
             return
 
         # Go through each box and print the increment
-        for box in range(1, curr_boxes + 1, +1):
-            # Fetch the increase amount from the box
-            increment = algod_client.application_box_by_name(cc_id, box.to_bytes(8, 'big'))
-            increment_float = Decimal(int.from_bytes(base64.b64decode(increment.get("value")), 'big')) \
-                              / Decimal(2 ** (8 * Autocompounder.LOCAL_STAKE_N))
+        for record in iter_increments(algod_client, cc_id, 1, curr_boxes):
+            if record.raw is None:
+                print("\tBox number {:04d}: does not exist".format(record.box))
+                continue
+            # Get the increase amount from the box
+            increment = fixed_point.format_fixed(record.increment, 30)
 
-            print("\tBox number {:04d}: b64='{}' = {:.30f}".format(box, increment.get("value"), increment_float))
+            print("\tBox number {:04d}: b64='{}' = {}".format(
+                record.box, base64.b64encode(record.raw).decode(), increment))
 
     except error.AlgodHTTPError as e:
         print("\tError: " + str(e))
@@ -813,11 +798,11 @@ def getTriggerRound(
         CC_address = get_application_address(cc_id)
 
         # Check if compounding can be triggered
-        CC_info = algod_client.account_info(CC_address)
+        CC_info = state_snapshot.account_info(algod_client, CC_address)
         CC_balance = CC_info.get("amount")
         CC_MRB = CC_info.get("min-balance")
-        currentRound = algod_client.status().get('last-round')
-        CC_state = read_global_state(algod_client, cc_id)
+        currentRound = state_snapshot.current_round(algod_client)
+        CC_state = state_snapshot.read_global_state(algod_client, cc_id)
         num_triggers = math.floor((CC_balance - CC_MRB) / Autocompounder.CC_FEE_FOR_COMPOUND)
 
         if num_triggers != 0:
@@ -0,0 +1,323 @@
+# -----------------           Description          -----------------
+# Fusion of a user's successive operations with a compound contract into as few atomic groups as possible.
+# A user flow is given as a list of intents, e.g.:
+#   [Intent(OPTIN), Intent(STAKE, 1_000_000)]       - opt-in followed by the first stake
+#   [Intent(WITHDRAW), Intent(OPTOUT)]              - withdrawal of the whole stake followed by opt-out
+# The planner follows the state of the contract through the intents and expands them into steps - the transactions
+# of an operation which must stay together and in order (e.g. the payment, asset transfer and app call of a stake).
+# Local claims of the boxes missing before a stake or withdrawal are inserted automatically, as the contract requires
+# them. Consecutive steps are then merged into groups of at most MAX_GROUP_SIZE transactions, which gives the fewest
+# groups since the steps depend on each other and must keep their order.
+# Effects of earlier transactions of a group are visible to the later ones, thus a fused group behaves as the separate
+# groups would, but is confirmed at once and either all or none of the operations are done.
+# Fees of a group are pooled: the first transaction pays the minimal fee of all its transactions and the others none
+# (inner transactions of the contract are paid from the deposits of stake and withdraw, as before, except for the
+# sending of the withdrawn asset).
+
+# -----------------           Imports          -----------------
+import copy
+from collections import namedtuple
+
+from algosdk import account, transaction
+from algosdk.atomic_transaction_composer import AtomicTransactionComposer, AccountTransactionSigner, \
+    TransactionWithSigner
+from algosdk.logic import get_application_address
+
+from autocompounder_abi import Autocompounder
+from box_cache import fetch_boxes
+from box_packer import MAX_GROUP_SIZE, MAX_TXN_REFERENCES, LOCAL_CLAIM_COST, group_capacity
+import fixed_point
+import state_snapshot
+
+# ---------------------------------------------------------------
+
+# Kinds of intents
+OPTIN = "optin"
+CLAIM = "claim"
+STAKE = "stake"
+WITHDRAW = "withdraw"
+OPTOUT = "optout"
+
+# Intent of a user - amount is the amount to stake or withdraw (None for withdrawal of the whole stake)
+Intent = namedtuple("Intent", ["kind", "amount"], defaults=[None])
+
+# Step of a plan - number of its transactions, method argument (up_to box or amount), referenced boxes, the deposit
+# paid to the contract and the index of the intent it is planned for (local claims belong to the intent they precede)
+Step = namedtuple("Step", ["kind", "txns", "arg", "boxes", "deposit", "intent"], defaults=[None, (), 0, None])
+
+# Number of transactions of the steps and number of fees they pay (withdraw pays also for sending of the withdrawn
+# asset to the user)
+STEP_TXNS = {OPTIN: 1, CLAIM: 1, STAKE: 3, WITHDRAW: 2, OPTOUT: 1}
+STEP_FEES = {OPTIN: 1, CLAIM: 1, STAKE: 3, WITHDRAW: 3, OPTOUT: 1}
+# Foreign references (asset, SC, AC and SC address) of the app calls of stake and withdraw
+FOREIGN_REFS = 4
+# The app calls of stake and withdraw reference the box they create (NB+1) and, in the remaining reference slots, the
+# boxes after it - these are created instead if compoundings of others are confirmed first (e.g. for a zero stake,
+# which does not need to claim them)
+SPARE_BOXES = MAX_TXN_REFERENCES - FOREIGN_REFS - 1
+
+
+# Function returns the deposit to pay with a stake, to cover the fees of the compoundings
+def stake_deposit(cc_state, current_round: int):
+    if current_round > cc_state["PSR"] and cc_state["TS"] > 0:
+        return Autocompounder.CC_FEE_FOR_COMPOUND * 2
+    return Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.STAKE_TO_SC_FEE
+
+
+# Function returns the deposit to pay with a withdrawal, to cover the fees of the compounding and unstaking
+def withdraw_deposit(cc_state, current_round: int):
+    if current_round < cc_state["PSR"]:
+        return Autocompounder.UNSTAKE_FROM_SC_FEE
+    if current_round <= cc_state["PER"] or cc_state["LCD"] == Autocompounder.LAST_COMPOUND_NOT_DONE:
+        return Autocompounder.CC_FEE_FOR_COMPOUND + Autocompounder.UNSTAKE_FROM_SC_FEE
+    return 0
+
+
+# Function returns the increases of the stake stored in consecutive boxes, starting with box first
+def box_increases(values, first: int):
+    increases = []
+    for box, value in enumerate(values, first):
+        if value is None:
+            raise Exception("Box {} does not exist!".format(box))
+        increases.append(fixed_point.from_bytes(value))
+    return increases
+
+
+# Function tells if the increases of the unclaimed boxes of a user are needed to plan intents, i.e. if the boxes are
+#  claimed (a stake with a zero local stake does not claim them)
+def needs_increases(cc_state, local_state, intents):
+    if not local_state or local_state.get("LNB", 0) >= cc_state["NB"]:
+        return False
+    staked = "LS" in local_state and fixed_point.from_bytes(local_state["LS"]) != 0
+    return any(intent.kind in (CLAIM, WITHDRAW) or (intent.kind == STAKE and staked) for intent in intents)
+
+
+# Function expands intents into steps, following the (expected) state of the contract through them
+def plan_steps(client, user_address: str, cc_id: int, intents, claim_cost=LOCAL_CLAIM_COST):
+    current_round = state_snapshot.current_round(client)
+    cc_state = state_snapshot.read_global_state(client, cc_id)
+    opted_in = any(local["id"] == cc_id
+                   for local in state_snapshot.account_info(client, user_address).get("apps-local-state", []))
+    local_state = state_snapshot.read_local_state(client, user_address, cc_id) if opted_in else {}
+    increases = []
+    if needs_increases(cc_state, local_state, intents):
+        first = local_state.get("LNB", 0) + 1
+        increases = box_increases(fetch_boxes(client, cc_id, first, cc_state["NB"]), first)
+    return plan_intents(cc_state, local_state, opted_in, current_round, intents, increases, claim_cost)
+
+
+# Function expands intents into steps from the state read before - global state of the contract, local state of the
+#  user (empty if not opted in) and the increases of the stake of the boxes the user has not claimed yet
+def plan_intents(cc_state, local_state, opted_in: bool, current_round: int, intents, increases,
+                 claim_cost=LOCAL_CLAIM_COST):
+    cc_state = dict(cc_state)
+    lnb = local_state.get("LNB", 0)
+    ls = fixed_point.from_bytes(local_state["LS"]) if "LS" in local_state else 0
+    # Local stake is known exactly only up to the claimed boxes - boxes created by the planned operations are not
+    ls_known = True
+
+    # Boxes claimed by a single call on its own opcode budget, so that claims can be fused with any other call
+    per_call = group_capacity(claim_cost, 1)
+    if per_call == 0:
+        raise Exception("A call cannot claim a single box within the opcode budget.")
+
+    steps = []
+
+    def claim():
+        nonlocal lnb, ls
+        if lnb < cc_state["NB"]:
+            if ls_known:
+                ls = fixed_point.project(ls, increases)
+            for first in range(lnb + 1, cc_state["NB"] + 1, per_call):
+                boxes = tuple(range(first, min(first + per_call, cc_state["NB"] + 1)))
+                steps.append(Step(CLAIM, STEP_TXNS[CLAIM], boxes[-1], boxes, intent=index))
+            lnb = cc_state["NB"]
+
+    # Function records a box created by the compounding of a stake or withdrawal, which the call claims itself
+    def compound():
+        nonlocal lnb, ls_known
+        cc_state["NB"] += 1
+        lnb = cc_state["NB"]
+        ls_known = False
+
+    for index, intent in enumerate(intents):
+        if intent.kind == OPTIN:
+            if opted_in:
+                raise Exception("Account is already opted into the contract.")
+            opted_in = True
+            lnb, ls, ls_known = cc_state["NB"], 0, True
+            steps.append(Step(OPTIN, STEP_TXNS[OPTIN], intent=index))
+            continue
+
+        if not opted_in:
+            raise Exception("Account must be opted into the contract before: {}".format(intent.kind))
+
+        if intent.kind == CLAIM:
+            claim()
+
+        elif intent.kind == STAKE:
+            # Staking requires all boxes to be claimed, unless the stake is zero
+            if ls != 0 or not ls_known:
+                claim()
+            lnb = cc_state["NB"]
+            deposit = stake_deposit(cc_state, current_round)
+            boxes = tuple(range(cc_state["NB"] + 1, cc_state["NB"] + SPARE_BOXES + 2))
+            if current_round > cc_state["PSR"] and cc_state["TS"] > 0:
+                compound()
+            cc_state["TS"] += intent.amount
+            ls += intent.amount << fixed_point.FRACTION_BITS
+            steps.append(Step(STAKE, STEP_TXNS[STAKE], intent.amount, boxes, deposit, index))
+
+        elif intent.kind == WITHDRAW:
+            claim()
+            if intent.amount is None and not ls_known:
+                raise Exception("Whole stake can be withdrawn only as the first operation after claiming.")
+            # Withdrawal of the whole (integer part of the) stake also withdraws the result of its own compounding
+            amount = fixed_point.floor(ls) if intent.amount is None else intent.amount
+            deposit = withdraw_deposit(cc_state, current_round)
+            boxes = tuple(range(cc_state["NB"] + 1, cc_state["NB"] + SPARE_BOXES + 2))
+            if current_round >= cc_state["PSR"] and (
+                    current_round <= cc_state["PER"] or cc_state["LCD"] == Autocompounder.LAST_COMPOUND_NOT_DONE):
+                if current_round > cc_state["PER"]:
+                    cc_state["LCD"] = Autocompounder.LAST_COMPOUND_DONE
+                compound()
+            if intent.amount is None:
+                ls = ls % fixed_point.ONE
+            else:
+                ls -= amount << fixed_point.FRACTION_BITS
+            cc_state["TS"] -= amount
+            steps.append(Step(WITHDRAW, STEP_TXNS[WITHDRAW], amount, boxes, deposit, index))
+
+        elif intent.kind == OPTOUT:
+            opted_in = False
+            steps.append(Step(OPTOUT, STEP_TXNS[OPTOUT], intent=index))
+
+        else:
+            raise ValueError("unknown intent: {}".format(intent.kind))
+
+    return steps
+
+
+# Function merges consecutive steps into groups of at most max_group_size transactions
+def fuse(steps, max_group_size: int = MAX_GROUP_SIZE):
+    groups = []
+    size = max_group_size
+    for step in steps:
+        refs = len(step.boxes) + (FOREIGN_REFS if step.kind in (STAKE, WITHDRAW) else 0)
+        if step.txns > max_group_size or refs > MAX_TXN_REFERENCES:
+            raise Exception("Step {} does not fit into a group.".format(step.kind))
+        if size + step.txns > max_group_size:
+            groups.append([])
+            size = 0
+        groups[-1].append(step)
+        size += step.txns
+    return groups
+
+
+# Function returns the intents which are not yet done after the first confirmed groups of a plan, i.e. those with
+#  steps in the later groups. Intents done by the confirmed groups must not be planned again after a
+#  failure of a later group (e.g. a withdrawal before a failed opt-out would be paid and withdrawn twice).
+def remaining_intents(intents, groups, confirmed: int):
+    pending = {step.intent for group in groups[confirmed:] for step in group}
+    return [intent for index, intent in enumerate(intents) if index in pending]
+
+
+# Function returns the return values of the withdrawals (withdrawn amounts) of the responses of confirmed groups
+def withdrawals(results):
+    return [res.return_value for result in results for res in result.abi_results if res.method.name == "withdraw"]
+
+
+# Function builds the transactions of the planned groups (AtomicTransactionComposers)
+def build_groups(client, userSK: str, cc_id: int, sc_id: int, ac_id: int, a_id: int, groups):
+    return compose_groups(state_snapshot.suggested_params(client), userSK, cc_id, sc_id, ac_id, a_id, groups)
+
+
+# Function builds the transactions of the planned groups with given suggested params
+def compose_groups(params, userSK: str, cc_id: int, sc_id: int, ac_id: int, a_id: int, groups):
+    user_address = account.address_from_private_key(userSK)
+    signer = AccountTransactionSigner(userSK)
+    CC_address = get_application_address(cc_id)
+    SC_address = get_application_address(sc_id)
+
+    atcs = []
+    for group in groups:
+        atc = AtomicTransactionComposer()
+
+        # The first transaction pays the fees of the whole group
+        sp = copy.copy(params)
+        sp.flat_fee = True
+        sp.fee = sum(STEP_FEES[step.kind] for step in group) * sp.min_fee
+
+        for step in group:
+            box_array = [(0, x.to_bytes(8, 'big')) for x in step.boxes]
+
+            if step.kind == OPTIN:
+                atc.add_transaction(TransactionWithSigner(
+                    transaction.ApplicationOptInTxn(sender=user_address, sp=sp, index=cc_id), signer))
+            elif step.kind == OPTOUT:
+                atc.add_transaction(TransactionWithSigner(
+                    transaction.ApplicationCloseOutTxn(sender=user_address, sp=sp, index=cc_id), signer))
+            elif step.kind == CLAIM:
+                atc.add_method_call(app_id=cc_id, method=Autocompounder.local_claim, sender=user_address, sp=sp,
+                                    signer=signer, method_args=[step.arg], boxes=box_array)
+            else:
+                # Deposit for the fees of the contract
+                atc.add_transaction(TransactionWithSigner(
+                    transaction.PaymentTxn(sender=user_address, sp=sp, receiver=CC_address, amt=step.deposit), signer))
+                sp.fee = 0
+                if step.kind == STAKE:
+                    atc.add_transaction(TransactionWithSigner(
+                        transaction.AssetTransferTxn(sender=user_address, sp=sp, receiver=CC_address, amt=step.arg,
+                                                     index=a_id), signer))
+                    method, args = Autocompounder.stake, None
+                else:
+                    method, args = Autocompounder.withdraw, [step.arg]
+                atc.add_method_call(app_id=cc_id, method=method, sender=user_address, sp=sp, signer=signer,
+                                    method_args=args, foreign_assets=[a_id], foreign_apps=[sc_id, ac_id],
+                                    accounts=[SC_address], boxes=box_array)
+            sp.fee = 0
+
+        atcs.append(atc)
+    return atcs
+
+
+# Function checks offline that intents done by the groups confirmed before a failure are not planned again. A claim,
+#  withdrawal and opt-out are planned into two groups, the first of which is confirmed while the second fails (to be
+#  sent or to be confirmed) - the pipeline must report the first group, so that only the opt-out is planned again and
+#  the withdrawn amount is kept.
+def check_replan_after_partial_failure():
+    from types import SimpleNamespace
+    from group_pipeline import Pipeline
+
+    cc_state = {"NB": 2, "TS": 10, "PSR": 0, "PER": 10 ** 6, "LCD": Autocompounder.LAST_COMPOUND_NOT_DONE}
+    local_state = {"LNB": 0, "LS": fixed_point.to_bytes(5 * fixed_point.ONE)}
+    intents = [Intent(WITHDRAW), Intent(OPTOUT)]
+    steps = plan_intents(cc_state, local_state, True, 100, intents, [fixed_point.ONE] * 2)
+    groups = fuse(steps, STEP_TXNS[CLAIM] + STEP_TXNS[WITHDRAW])
+    if [[step.kind for step in group] for group in groups] != [[CLAIM, WITHDRAW], [OPTOUT]]:
+        raise Exception("Unexpected plan: {}".format(groups))
+    withdrawn = SimpleNamespace(abi_results=[SimpleNamespace(method=SimpleNamespace(name=WITHDRAW), return_value=5)])
+
+    for failed in ("send", "confirmation"):
+        # Drive the pipeline as execute_pipelined does - both groups are sent before the first one is confirmed
+        pipeline = Pipeline(groups)
+        pipeline.sent(pipeline.next_group())
+        pipeline.next_group()
+        if failed == "send":
+            pipeline.send_failed(Exception("send failed"))
+        else:
+            pipeline.sent(pipeline.next_group())
+        pipeline.oldest()
+        pipeline.confirmed(withdrawn)
+        if pipeline.oldest() is not None:
+            pipeline.confirmation_failed(Exception("confirmation failed"))
+
+        remaining = remaining_intents(intents, groups, len(pipeline.results))
+        if remaining != [Intent(OPTOUT)] or withdrawals(pipeline.results) != [5]:
+            raise Exception("After a failed {} of the second group: re-planned {}, withdrawn {}".format(
+                failed, remaining, withdrawals(pipeline.results)))
+
+
+if __name__ == "__main__":
+    check_replan_after_partial_failure()
+    print("Re-planning after a partial failure: OK")
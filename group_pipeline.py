@@ -0,0 +1,97 @@
+# -----------------           Description          -----------------
+# Pipelined submission of successive transaction groups.
+# Operations that need many groups (local claims and deletion of boxes) chain their groups - each group continues
+# from the box at which the previous one stopped. Instead of waiting for each group to be confirmed before sending the
+# next one, groups are signed and sent one after another (the node's transaction pool evaluates them in order against
+# the pending state), with up to MAX_IN_FLIGHT groups waiting for confirmation at a time. Confirmations of all groups
+# in flight are tracked by the shared confirmation tracker of the client. When a group fails, no further groups are
+# sent and the caller resubmits from the first failed group (re-reading the chain state, since the following groups
+# depend on it).
+
+# -----------------           Imports          -----------------
+from collections import deque
+
+from confirmation_tracker import default_tracker
+from util import log_gtx
+
+# ---------------------------------------------------------------
+
+# Maximal number of groups sent but not yet confirmed
+MAX_IN_FLIGHT = 8
+
+
+class Pipeline:
+    # Decisions of a pipelined submission - which group to send next, which results to keep and when to stop - shared
+    # by the synchronous (execute_pipelined) and asynchronous (async_algod.execute_pipelined) execution, which only
+    # send the groups and wait for them. Groups are confirmed in order of submission. Kept are the results of the
+    # groups confirmed before the first failed group: a group that cannot be sent stops the sending of further groups,
+    # but the groups sent before it are still waited for and their results kept, while a group that fails to be
+    # confirmed ends the kept results, since the groups after it depend on it.
+
+    def __init__(self, atcs, max_in_flight: int = MAX_IN_FLIGHT):
+        self.pending = deque(atcs)
+        self.in_flight = deque()
+        self.max_in_flight = max_in_flight
+        self.results = []
+        self.failure = None
+        # Set once a group in flight has failed - results of the groups after it are not kept
+        self.broken = False
+
+    # Function returns the next group to send (None if the pipeline is full or no further groups are to be sent)
+    def next_group(self):
+        if self.pending and len(self.in_flight) < self.max_in_flight and self.failure is None:
+            return self.pending.popleft()
+        return None
+
+    # Function records a group that was sent, with the handle (e.g. Future) of its confirmation
+    def sent(self, handle):
+        self.in_flight.append(handle)
+
+    def send_failed(self, e):
+        self.failure = e
+        self.pending.clear()
+
+    # Function returns the handle of the oldest group in flight, which is waited for next (None if none is in flight)
+    def oldest(self):
+        return self.in_flight.popleft() if self.in_flight else None
+
+    def confirmed(self, result):
+        if not self.broken:
+            self.results.append(result)
+
+    def confirmation_failed(self, e):
+        if not self.broken:
+            # The group was sent before any group that could not be sent, thus its failure is the first one
+            self.failure = e
+            self.broken = True
+        self.pending.clear()
+
+
+# Function submits groups (AtomicTransactionComposers) in order without waiting for the confirmation of the previous
+#  ones. Returns the results of the groups which were confirmed before the first failure and the error of the first
+#  failed group (None if all groups were confirmed).
+def execute_pipelined(client, atcs, wait_rounds: int, max_in_flight: int = MAX_IN_FLIGHT, tracker=None):
+    pipeline = Pipeline(atcs, max_in_flight)
+    tracker = tracker if tracker is not None else default_tracker(client)
+
+    while True:
+        # Send groups until the pipeline is full
+        atc = pipeline.next_group()
+        while atc is not None:
+            log_gtx(atc.build_group())
+            try:
+                pipeline.sent(tracker.submit(atc, wait_rounds))
+            except Exception as e:
+                pipeline.send_failed(e)
+            atc = pipeline.next_group()
+
+        # Wait for the oldest group - groups are confirmed in order of submission
+        future = pipeline.oldest()
+        if future is None:
+            break
+        try:
+            pipeline.confirmed(future.result())
+        except Exception as e:
+            pipeline.confirmation_failed(e)
+
+    return pipeline.results, pipeline.failure
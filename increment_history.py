@@ -0,0 +1,160 @@
+# -----------------           Description          -----------------
+# Streaming access to the increment history of a compound contract.
+# iter_increments lazily yields records (box number, raw box value, increment) for a range of boxes. Boxes are fetched
+# in batches (through the local box cache and the concurrent fetcher), planned by BatchPlanner from the pages of the
+# box listing as they are read, so only a single batch and listing page are held in memory, and iteration can be
+# resumed from a cursor - the number of the last box that has been consumed (the listing then starts at the box after
+# it).
+# export_history streams the records to a file as NDJSON or CSV, with the increment written exactly as a decimal number.
+#
+# Example: python increment_history.py --app 123 --format csv --output history.csv --cursor-file history.cursor
+
+# -----------------           Imports          -----------------
+import argparse
+import base64
+import csv
+import json
+import sys
+from collections import deque, namedtuple
+
+from algosdk.v2client import algod
+
+from box_cache import fetch_boxes
+from box_listing import iter_box_pages
+from util import read_global_state
+import fixed_point
+
+# ---------------------------------------------------------------
+
+# Number of boxes fetched at once
+BATCH_SIZE = 256
+# Decimal digits of exported increments
+DIGITS = 30
+
+# Record of a box - raw value and increment (fixed-point int) are None if the box does not exist
+IncrementRecord = namedtuple("IncrementRecord", ["box", "raw", "increment"])
+
+
+class BatchPlanner:
+    # Plans the batches of boxes from first to last, each with the listed (existing) boxes in it, from the pages of the
+    # box listing (in increasing order). Pages are added only while the listing has not passed the next batch, thus
+    # at most a page and a batch of box numbers are kept. The planner does no I/O - it is shared by the synchronous
+    # and asynchronous readers of the history.
+
+    def __init__(self, first: int, last: int, batch_size: int = BATCH_SIZE):
+        self.first = first
+        self.last = last
+        self.batch_size = batch_size
+        self.listed = deque()
+        self.exhausted = False
+
+    # Function tells if another page of the listing is needed to plan the next batch
+    def needs_page(self):
+        end = min(self.first + self.batch_size - 1, self.last)
+        return self.first <= self.last and not self.exhausted and (not self.listed or self.listed[-1] <= end)
+
+    # Function adds a page of the listing (None once the listing is exhausted)
+    def add_page(self, boxes):
+        if boxes is None:
+            self.exhausted = True
+            return
+        self.listed.extend(box for box in boxes if self.first <= box <= self.last)
+
+    # Function returns the next batch as (first box, last box, listed boxes in the batch), or None after the last one
+    def next_batch(self):
+        if self.first > self.last:
+            return None
+        first, last = self.first, min(self.first + self.batch_size - 1, self.last)
+        batch_listed = []
+        while self.listed and self.listed[0] <= last:
+            batch_listed.append(self.listed.popleft())
+        self.first = last + 1
+        return first, last, batch_listed
+
+
+# Function returns the increment record of a box from its value (None if the box does not exist)
+def increment_record(box: int, value):
+    return IncrementRecord(box, value, fixed_point.from_bytes(value) if value is not None else None)
+
+
+# Function yields increment records of boxes from start (or the box after cursor) to end (default: NB)
+def iter_increments(client, cc_id, start: int = 1, end: int = None, cursor: int = None, batch_size: int = BATCH_SIZE):
+    if cursor is not None:
+        start = max(start, cursor + 1)
+    if end is None:
+        end = read_global_state(client, cc_id)["NB"]
+
+    planner = BatchPlanner(start, end, batch_size)
+    pages = iter_box_pages(client, cc_id, start=start)
+    while True:
+        while planner.needs_page():
+            planner.add_page(next(pages, None))
+        batch = planner.next_batch()
+        if batch is None:
+            break
+        first, last, batch_listed = batch
+        values = fetch_boxes(client, cc_id, first, last, listed=batch_listed)
+        for box, value in zip(range(first, last + 1), values):
+            yield increment_record(box, value)
+
+
+# Function converts a record to a JSON/CSV friendly dictionary
+def record_dict(record: IncrementRecord, digits: int = DIGITS):
+    return {
+        "box": record.box,
+        "b64": base64.b64encode(record.raw).decode() if record.raw is not None else None,
+        "increment": fixed_point.format_fixed(record.increment, digits) if record.increment is not None else None,
+    }
+
+
+# Function streams records to a text file as NDJSON or CSV, returning the cursor (number of the last written box)
+def export_history(records, out, fmt: str = "ndjson", digits: int = DIGITS, header: bool = True):
+    cursor = None
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=["box", "b64", "increment"])
+        if header:
+            writer.writeheader()
+        for record in records:
+            writer.writerow(record_dict(record, digits))
+            cursor = record.box
+    elif fmt == "ndjson":
+        for record in records:
+            out.write(json.dumps(record_dict(record, digits)) + "\n")
+            cursor = record.box
+    else:
+        raise ValueError("unknown format: " + fmt)
+    return cursor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the increment history of a compound contract.")
+    parser.add_argument("--app", type=int, required=True, help="app ID of the compound contract")
+    parser.add_argument("--algod", default="http://localhost:4001")
+    parser.add_argument("--algod-token", default="a" * 64)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--end", type=int, default=None)
+    parser.add_argument("--output", help="output file (default: stdout); appended to when resuming from a cursor")
+    parser.add_argument("--cursor-file", help="file with the cursor to resume from, updated after the export")
+    args = parser.parse_args()
+
+    algod_client = algod.AlgodClient(args.algod_token, args.algod)
+
+    start_cursor = None
+    if args.cursor_file:
+        try:
+            with open(args.cursor_file, "r") as f:
+                start_cursor = int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            start_cursor = None
+
+    stream = iter_increments(algod_client, args.app, args.start, args.end, start_cursor)
+    if args.output:
+        with open(args.output, "a" if start_cursor is not None else "w", newline="") as f:
+            new_cursor = export_history(stream, f, args.format, header=start_cursor is None)
+    else:
+        new_cursor = export_history(stream, sys.stdout, args.format, header=start_cursor is None)
+
+    if args.cursor_file and new_cursor is not None:
+        with open(args.cursor_file, "w") as f:
+            f.write(str(new_cursor))
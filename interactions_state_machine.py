@@ -13,8 +13,8 @@ from algosdk.atomic_transaction_composer import AtomicTransactionComposer, Accou
 from algosdk.logic import get_application_address
 from demo.interact_w_CompoundContract import *
 from util import *
-
-from contract import deploy
+from schedule_planner import rate_from_apr
+import state_snapshot
 
 # -----------------       Global variables      -----------------
 # Nodes
@@ -239,7 +239,7 @@ def connect_to_CC():
         try:
             cc_id = int(cc_id)
 
-            cc_state = read_global_state(algod_client, cc_id)
+            cc_state = state_snapshot.read_global_state(algod_client, cc_id)
             sc_id = cc_state["SC_ID"]
             ac_id = cc_state["AC_ID"]
             s_asa_id = cc_state["S_ASA_ID"]
@@ -285,7 +285,7 @@ def creator_interact():
     print("\n----------------------------------------------------------------------------------------")
     print("You are managing contract with ID " + str(cc_id) + " and following parameters:")
     try:
-        cc_state = read_global_state(algod_client, cc_id)
+        cc_state = state_snapshot.read_global_state(algod_client, cc_id)
         print("\tConnected to staking contract ID: {}".format(cc_state["SC_ID"]))
         print("\tConnected to associated contract ID: {}".format(cc_state["AC_ID"]))
         print("\tStaking ASA ID: {}".format(cc_state["S_ASA_ID"]))
@@ -400,7 +400,7 @@ def user_interact():
     print("You are interacting with contract with ID " + str(cc_id) + " and following parameters:")
 
     try:
-        cc_state = read_global_state(algod_client, cc_id)
+        cc_state = state_snapshot.read_global_state(algod_client, cc_id)
         print("\tConnected to staking contract ID: {}".format(cc_state["SC_ID"]))
         print("\tConnected to associated contract ID: {}".format(cc_state["AC_ID"]))
         print("\tStaking ASA ID: {}".format(cc_state["S_ASA_ID"]))
@@ -441,7 +441,7 @@ def user_interact():
 
     opted_in_already = True
     try:
-        cc_local_state = read_local_state(algod_client, user_address, cc_id)
+        cc_local_state = state_snapshot.read_local_state(algod_client, user_address, cc_id)
     except KeyError:
         opted_in_already = False
         print("\tIf you are a new user, please opt in!")
@@ -690,9 +690,27 @@ def schedule_optimal_compound():
     global cs, ns, ps, cc_id, sc_id, ac_id, contract_type, amm_id, p_addr, s_asa_id, r_asa_id, user_sk, user_address, user_address_short, algod_client
 
     print("\n----------------------------------------------------------------------------------------")
+    while True:
+        apr = input("Please enter the reward rate (APR) of the staking pool [%]: ")
+        price = input("Please enter the price of the staked asset [ALGO per whole unit]: ")
+        try:
+            apr = float(apr)
+            price = float(price)
+            break
+        except ValueError:
+            print("You did not enter a valid number!")
+            continue
+
     try:
-        sheduleAdditionalCompounding(algod_client, user_sk, cc_id)
-        print("\nSuccessfully scheduled an optimal additional compounding!")
+        decimals = algod_client.asset_info(s_asa_id)["params"]["decimals"]
+        fee_price = price * 10 ** 6 / 10 ** decimals
+        plan = sheduleOptimalCompounding(algod_client, user_sk, cc_id, rate_from_apr(apr / 100), fee_price)
+        print("\nOptimal number of compoundings until pool end: {} (already funded: {})".format(
+            plan["optimal"], plan["funded"]))
+        if plan["additional"] > 0:
+            print("Successfully scheduled {} additional compounding(s)!".format(plan["additional"]))
+        else:
+            print("Additional compounding would not pay off - nothing was scheduled.")
     except error.AlgodHTTPError as e:
         print("\tError: " + str(e))
     except KeyError:
@@ -0,0 +1,644 @@
+# -----------------           Description          -----------------
+# In-process stand-in for an algod node, implementing the REST endpoints used by the interaction layer
+# (demo/interact_w_CompoundContract.py and interactions_state_machine.py):
+#   status, status_after_block, suggested_params, application_info, account_info, account_application_info,
+#   account_asset_info, application_box_by_name, application_boxes, send_transactions, simulate_transactions,
+#   pending_transaction_info and compile.
+# Blocks are produced with a configurable block time and every response can be delayed by an injected latency, so
+# that client throughput can be measured reproducibly without a connection to a real network.
+#
+# Example:
+#   with MockAlgod(block_time=0.5, latency=0.02) as node:
+#       algod_client = node.client()
+#       ...
+#
+# The node can also be run as a standalone process: python mock_algod.py --port 4001 --block-time 3.3
+
+# -----------------           Imports          -----------------
+import argparse
+import base64
+import copy
+import hashlib
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep, time
+from urllib.parse import urlparse, parse_qs
+
+# ---------------------------------------------------------------
+
+GENESIS_ID = "mocknet-v1"
+GENESIS_HASH = base64.b64encode(hashlib.sha256(GENESIS_ID.encode()).digest()).decode()
+CONSENSUS_VERSION = "future"
+MIN_TX_FEE = 1_000
+# Minimum balance requirements (same as on the real network)
+MIN_BALANCE = 100_000
+ASSET_MIN_BALANCE = 100_000
+APP_OPTIN_MIN_BALANCE = 100_000
+
+# Time algod waits in status_after_block before returning the current status
+WAIT_FOR_BLOCK_TIMEOUT = 60
+
+# Application call on completion types (as encoded in the "apan" field)
+NOOP_OC = 0
+OPTIN_OC = 1
+CLOSEOUT_OC = 2
+CLEARSTATE_OC = 3
+UPDATE_OC = 4
+DELETE_OC = 5
+
+
+# Helper function to encode bytes in a JSON friendly way (same as algod does)
+def b64(data):
+    return base64.b64encode(data).decode()
+
+
+# Helper function that converts a state dictionary {key (bytes): value (int or bytes)} to algod's TealKeyValue list
+def encode_state(state):
+    kvs = []
+    for key, value in state.items():
+        if isinstance(value, int):
+            kvs.append({"key": b64(key), "value": {"type": 2, "bytes": "", "uint": value}})
+        else:
+            kvs.append({"key": b64(key), "value": {"type": 1, "bytes": b64(value), "uint": 0}})
+    return kvs
+
+
+# Helper function that converts decoded msgpack objects to JSON (bytes are base64 encoded, as algod does)
+def to_json(obj):
+    if isinstance(obj, bytes):
+        return b64(obj)
+    if isinstance(obj, dict):
+        return {(k.decode() if isinstance(k, bytes) else k): to_json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_json(v) for v in obj]
+    return obj
+
+
+# Helper function to compute the transaction ID of a decoded (msgpack) transaction
+def txid_of(txn):
+    import msgpack
+    from algosdk import encoding
+
+    data = b"TX" + msgpack.packb(txn, use_bin_type=True)
+    return base64.b32encode(encoding.checksum(data)).decode().strip("=")
+
+
+# Error that results in a non-200 response with algod's {"message": ...} body
+class MockAlgodError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class MockLedger:
+    # Ledger of the mock node. It holds accounts, applications (incl. their global state and boxes), the transaction
+    # pool and the confirmed transactions.
+    # Effects of transactions are applied by an executor - a function executor(ledger, group) which is called for each
+    # group of decoded signed transactions when they are confirmed and returns a list of per-transaction results
+    # (e.g. {"logs": [...], "inner-txns": [...]}) or raises MockAlgodError to reject the group.
+    # The default executor applies payments, asset transfers and application opt-ins/close-outs/creations but does not
+    # execute any application logic.
+
+    def __init__(self, first_round=1, executor=None):
+        self.lock = threading.RLock()
+        self.new_block = threading.Condition(self.lock)
+        self.round = first_round
+        self.accounts = {}
+        self.apps = {}
+        self.next_app_id = 1_000
+        # Pool of transaction groups waiting to be confirmed
+        self.pool = []
+        # Pending transaction info by txid
+        self.txns = {}
+        # Programs compiled through the compile endpoint by their hash
+        self.programs = {}
+        self.executor = executor if executor is not None else apply_group
+
+    # ----- -----    State seeding     ----- -----
+
+    def add_account(self, address, amount=0, min_balance=MIN_BALANCE):
+        with self.lock:
+            acc = self.accounts.setdefault(address, {"amount": 0, "min-balance": min_balance, "assets": {},
+                                                      "local": {}})
+            acc["amount"] += amount
+            return acc
+
+    def set_asset(self, address, asset_id, amount=0):
+        with self.lock:
+            acc = self.add_account(address)
+            if asset_id not in acc["assets"]:
+                acc["min-balance"] += ASSET_MIN_BALANCE
+            acc["assets"][asset_id] = amount
+
+    def create_app(self, creator, global_state=None, app_id=None, approval=b"", clear=b""):
+        with self.lock:
+            if app_id is None:
+                app_id = self.next_app_id
+            self.next_app_id = max(self.next_app_id, app_id) + 1
+            self.apps[app_id] = {
+                "creator": creator,
+                "created-at-round": self.round,
+                "global": dict(global_state or {}),
+                "boxes": {},
+                "approval": approval,
+                "clear": clear,
+            }
+            return app_id
+
+    def set_global_state(self, app_id, state):
+        with self.lock:
+            self.app(app_id)["global"].update(state)
+
+    def set_local_state(self, address, app_id, state):
+        with self.lock:
+            acc = self.add_account(address)
+            if app_id not in acc["local"]:
+                acc["min-balance"] += APP_OPTIN_MIN_BALANCE
+                acc["local"][app_id] = {}
+            acc["local"][app_id].update(state)
+
+    def put_box(self, app_id, name, value):
+        with self.lock:
+            self.app(app_id)["boxes"][name] = value
+
+    def delete_box(self, app_id, name):
+        with self.lock:
+            self.app(app_id)["boxes"].pop(name, None)
+
+    # ----- -----    Queries     ----- -----
+
+    def app(self, app_id):
+        if app_id not in self.apps:
+            raise MockAlgodError("application does not exist", 404)
+        return self.apps[app_id]
+
+    def account(self, address):
+        if address not in self.accounts:
+            # Unknown accounts exist with a zero balance
+            return {"amount": 0, "min-balance": 0, "assets": {}, "local": {}}
+        return self.accounts[address]
+
+    # ----- -----    Transactions     ----- -----
+
+    def submit(self, group):
+        # Add a group of decoded signed transactions to the pool
+        with self.lock:
+            txids = []
+            for stxn in group:
+                txid = txid_of(stxn["txn"])
+                txn = stxn["txn"]
+                if not (txn.get("fv", 0) <= self.round + 1 <= txn.get("lv", 0)):
+                    raise MockAlgodError("TransactionPool.Remember: txn dead: round {} outside of {}--{}".format(
+                        self.round + 1, txn.get("fv", 0), txn.get("lv", 0)))
+                if txid in self.txns and self.txns[txid]["pool-error"] == "":
+                    # Transactions are in the ledger once confirmed, until then they wait in the pool
+                    if self.txns[txid].get("confirmed-round", 0) > 0:
+                        raise MockAlgodError("TransactionPool.Remember: transaction already in ledger: " + txid)
+                    raise MockAlgodError("TransactionPool.Remember: transaction already in pool: " + txid)
+                txids.append(txid)
+            for txid, stxn in zip(txids, group):
+                self.txns[txid] = {"txn": stxn, "pool-error": ""}
+            self.pool.append((txids, group))
+            return txids[0]
+
+    def produce_block(self):
+        # Confirm all groups from the pool in a new block
+        with self.lock:
+            self.round += 1
+            pool, self.pool = self.pool, []
+            for txids, group in pool:
+                # Groups are atomic - effects of a rejected group are rolled back
+                backup = copy.deepcopy((self.accounts, self.apps, self.next_app_id))
+                try:
+                    results = self.executor(self, group)
+                except MockAlgodError as e:
+                    self.accounts, self.apps, self.next_app_id = backup
+                    for txid in txids:
+                        self.txns[txid]["pool-error"] = str(e)
+                    continue
+                for txid, result in zip(txids, results):
+                    self.txns[txid].update(result or {})
+                    self.txns[txid]["confirmed-round"] = self.round
+            self.new_block.notify_all()
+
+    def simulate(self, groups):
+        # Evaluate groups one after another (each against the state left by the previous ones) without committing
+        #  their effects. Returns the per-transaction results and the error message (None if the group would succeed)
+        #  of each evaluated group - evaluation stops at the first failed group, as on a node.
+        with self.lock:
+            backup = copy.deepcopy((self.accounts, self.apps, self.next_app_id))
+            evaluated = []
+            try:
+                for group in groups:
+                    try:
+                        evaluated.append((self.executor(self, group), None))
+                    except MockAlgodError as e:
+                        evaluated.append(([], str(e)))
+                        break
+                return evaluated
+            finally:
+                self.accounts, self.apps, self.next_app_id = backup
+
+    def wait_for_block_after(self, round, timeout=WAIT_FOR_BLOCK_TIMEOUT):
+        with self.lock:
+            self.new_block.wait_for(lambda: self.round > round, timeout)
+            return self.round
+
+
+# Default executor: applies effects of payments, asset transfers and application calls without executing the
+# application logic
+def apply_group(ledger, group):
+    from algosdk import encoding
+
+    results = []
+    for stxn in group:
+        txn = stxn["txn"]
+        sender = encoding.encode_address(txn["snd"])
+        acc = ledger.account(sender)
+        if acc["amount"] < txn.get("fee", 0):
+            raise MockAlgodError("overspend (account {}, data {})".format(sender, acc))
+        ledger.add_account(sender, -txn.get("fee", 0))
+        result = {}
+
+        if txn["type"] == "pay":
+            receiver = encoding.encode_address(txn["rcv"]) if "rcv" in txn else None
+            amt = txn.get("amt", 0)
+            if ledger.account(sender)["amount"] < amt:
+                raise MockAlgodError("overspend (account {})".format(sender))
+            ledger.add_account(sender, -amt)
+            if receiver is not None:
+                ledger.add_account(receiver, amt)
+            if "close" in txn:
+                close_to = encoding.encode_address(txn["close"])
+                ledger.add_account(close_to, ledger.account(sender)["amount"])
+                ledger.accounts.pop(sender, None)
+
+        elif txn["type"] == "axfer":
+            asset_id = txn["xaid"]
+            receiver = encoding.encode_address(txn["arcv"]) if "arcv" in txn else sender
+            amt = txn.get("aamt", 0)
+            holdings = ledger.account(sender)["assets"]
+            if amt > 0 and holdings.get(asset_id, 0) < amt:
+                raise MockAlgodError("underflow on subtracting {} from sender amount".format(amt))
+            if sender == receiver and amt == 0:
+                # Asset opt-in
+                if asset_id not in holdings:
+                    ledger.set_asset(sender, asset_id, 0)
+            else:
+                if asset_id not in ledger.account(receiver)["assets"]:
+                    raise MockAlgodError("receiver error: must optin, assetid={}".format(asset_id))
+                holdings[asset_id] -= amt
+                ledger.account(receiver)["assets"][asset_id] += amt
+
+        elif txn["type"] == "appl":
+            app_id = txn.get("apid", 0)
+            oc = txn.get("apan", NOOP_OC)
+            if app_id == 0:
+                app_id = ledger.create_app(sender, approval=txn.get("apap", b""), clear=txn.get("apsu", b""))
+                result["application-index"] = app_id
+            else:
+                ledger.app(app_id)
+            if oc == OPTIN_OC:
+                ledger.set_local_state(sender, app_id, {})
+            elif oc in (CLOSEOUT_OC, CLEARSTATE_OC):
+                acc = ledger.account(sender)
+                if acc["local"].pop(app_id, None) is not None:
+                    acc["min-balance"] -= APP_OPTIN_MIN_BALANCE
+            elif oc == DELETE_OC:
+                ledger.apps.pop(app_id, None)
+
+        results.append(result)
+    return results
+
+
+class MockAlgodHandler(BaseHTTPRequestHandler):
+    # Routes algod's REST API (with or without the /v2 prefix) to the ledger of the server
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep the output of the node quiet
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method):
+        node = self.server.node
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path[3:] if url.path.startswith("/v2/") else url.path
+        parts = [p for p in path.split("/") if p]
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+
+        node.inject_latency()
+        try:
+            status, response = 200, node.route(method, parts, query, body)
+        except MockAlgodError as e:
+            status, response = e.status, {"message": str(e)}
+        except (KeyError, ValueError, IndexError) as e:
+            status, response = 400, {"message": "bad request: " + str(e)}
+
+        data = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockAlgod:
+    # Mock algod node serving the ledger over HTTP on localhost.
+    #  block_time - seconds between blocks; if 0, a block is produced immediately after each submission (dev mode)
+    #  latency - seconds by which every response is delayed
+    #  jitter - additional uniformly distributed random delay of up to jitter seconds (drawn from a seeded generator)
+
+    def __init__(self, block_time=0.0, latency=0.0, jitter=0.0, seed=0, port=0, ledger=None):
+        self.block_time = block_time
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.ledger = ledger if ledger is not None else MockLedger()
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), MockAlgodHandler)
+        self.server.daemon_threads = True
+        self.server.node = self
+        self.stopped = threading.Event()
+        self.threads = []
+
+    @property
+    def address(self):
+        return "http://{}:{}".format(*self.server.server_address)
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.server.serve_forever, daemon=True)]
+        if self.block_time > 0:
+            self.threads.append(threading.Thread(target=self.produce_blocks, daemon=True))
+        for t in self.threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Initialize an algodClient connected to the node
+    def client(self, token="a" * 64):
+        from algosdk.v2client import algod
+        return algod.AlgodClient(token, self.address)
+
+    def produce_blocks(self):
+        next_block = time() + self.block_time
+        while not self.stopped.wait(max(0.0, next_block - time())):
+            self.ledger.produce_block()
+            next_block += self.block_time
+
+    def inject_latency(self):
+        with self.ledger.lock:
+            self.requests += 1
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+        if delay > 0:
+            sleep(delay)
+
+    # ----- -----    Endpoints     ----- -----
+
+    def route(self, method, parts, query, body):
+        ledger = self.ledger
+        with ledger.lock:
+            if method == "GET" and parts == ["health"]:
+                return {}
+            if method == "GET" and parts == ["versions"]:
+                return {"genesis_id": GENESIS_ID, "genesis_hash_b64": GENESIS_HASH, "versions": ["v2"],
+                        "build": {"major": 0, "minor": 0, "build_number": 0, "commit_hash": "mock",
+                                  "branch": "mock", "channel": "mock"}}
+            if method == "GET" and parts == ["status"]:
+                return self.status()
+            if method == "GET" and parts == ["transactions", "params"]:
+                return {"consensus-version": CONSENSUS_VERSION, "fee": 0, "genesis-hash": GENESIS_HASH,
+                        "genesis-id": GENESIS_ID, "last-round": ledger.round, "min-fee": MIN_TX_FEE}
+            if method == "GET" and parts[:1] == ["applications"] and len(parts) == 2:
+                return self.application_info(int(parts[1]))
+            if method == "GET" and parts[:1] == ["applications"] and parts[2:] == ["box"]:
+                return self.application_box_by_name(int(parts[1]), query["name"][0])
+            if method == "GET" and parts[:1] == ["applications"] and parts[2:] == ["boxes"]:
+                return self.application_boxes(int(parts[1]), int(query.get("max", ["0"])[0]),
+                                              query.get("next", [None])[0])
+            if method == "GET" and parts[:1] == ["accounts"] and len(parts) == 2:
+                return self.account_info(parts[1])
+            if method == "GET" and parts[:1] == ["accounts"] and len(parts) == 4 and parts[2] == "applications":
+                return self.account_application_info(parts[1], int(parts[3]))
+            if method == "GET" and parts[:1] == ["accounts"] and len(parts) == 4 and parts[2] == "assets":
+                return self.account_asset_info(parts[1], int(parts[3]))
+            if method == "GET" and parts[:2] == ["transactions", "pending"] and len(parts) == 3:
+                return self.pending_transaction_info(parts[2])
+            if method == "POST" and parts == ["transactions"]:
+                return self.send_transactions(body)
+            if method == "POST" and parts == ["transactions", "simulate"]:
+                return self.simulate_transactions(body)
+            if method == "POST" and parts == ["teal", "compile"]:
+                return self.compile(body, query.get("sourcemap", ["false"])[0] == "true")
+        # Waiting for a block must not hold the lock of the ledger
+        if method == "GET" and parts[:2] == ["status", "wait-for-block-after"] and len(parts) == 3:
+            ledger.wait_for_block_after(int(parts[2]))
+            with ledger.lock:
+                return self.status()
+        raise MockAlgodError("not found", 404)
+
+    def status(self):
+        return {"last-round": self.ledger.round, "last-version": CONSENSUS_VERSION, "next-version": CONSENSUS_VERSION,
+                "next-version-round": self.ledger.round + 1, "next-version-supported": True,
+                "time-since-last-round": 0, "catchup-time": 0, "stopped-at-unsupported-round": False}
+
+    def application_info(self, app_id):
+        app = self.ledger.app(app_id)
+        return {"id": app_id, "params": {
+            "creator": app["creator"],
+            "created-at-round": app["created-at-round"],
+            "approval-program": b64(app["approval"]),
+            "clear-state-program": b64(app["clear"]),
+            "global-state": encode_state(app["global"]),
+        }}
+
+    def account_info(self, address):
+        acc = self.ledger.account(address)
+        return {
+            "address": address,
+            "amount": acc["amount"],
+            "amount-without-pending-rewards": acc["amount"],
+            "min-balance": acc["min-balance"],
+            "assets": [{"asset-id": a, "amount": amt, "is-frozen": False} for a, amt in acc["assets"].items()],
+            "apps-local-state": [{"id": a, "key-value": encode_state(s)} for a, s in acc["local"].items()],
+            "created-apps": [{"id": a} for a, app in self.ledger.apps.items() if app["creator"] == address],
+            "round": self.ledger.round,
+            "status": "Offline",
+        }
+
+    def account_application_info(self, address, app_id):
+        acc = self.ledger.account(address)
+        if app_id not in acc["local"]:
+            raise MockAlgodError("account application info not found", 404)
+        return {"app-local-state": {"id": app_id, "key-value": encode_state(acc["local"][app_id])},
+                "round": self.ledger.round}
+
+    def account_asset_info(self, address, asset_id):
+        acc = self.ledger.account(address)
+        if asset_id not in acc["assets"]:
+            raise MockAlgodError("account asset info not found", 404)
+        return {"asset-holding": {"asset-id": asset_id, "amount": acc["assets"][asset_id], "is-frozen": False},
+                "round": self.ledger.round}
+
+    @staticmethod
+    def decode_box_name(name):
+        # Box names are passed as "encoding:value"
+        enc, _, value = name.partition(":")
+        if enc == "b64":
+            return base64.b64decode(value)
+        if enc == "str":
+            return value.encode()
+        if enc == "int":
+            return int(value).to_bytes(8, "big")
+        raise MockAlgodError("unsupported box name encoding: " + enc)
+
+    def application_boxes(self, app_id, limit=0, next_name=None):
+        # Boxes are listed in lexicographic order of their names, starting with the (encoded) next name
+        names = sorted(self.ledger.app(app_id)["boxes"])
+        if next_name is not None:
+            start = self.decode_box_name(next_name)
+            names = [n for n in names if n >= start]
+        response = {"round": self.ledger.round}
+        if 0 < limit < len(names):
+            response["next-token"] = "b64:" + b64(names[limit])
+            names = names[:limit]
+        response["boxes"] = [{"name": b64(n)} for n in names]
+        return response
+
+    def application_box_by_name(self, app_id, name):
+        name = self.decode_box_name(name)
+        boxes = self.ledger.app(app_id)["boxes"]
+        if name not in boxes:
+            raise MockAlgodError("box not found", 404)
+        return {"name": b64(name), "round": self.ledger.round, "value": b64(boxes[name])}
+
+    def send_transactions(self, body):
+        import msgpack
+
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(body)
+        group = list(unpacker)
+        if len(group) == 0:
+            raise MockAlgodError("empty transaction group")
+        txid = self.ledger.submit(group)
+        if self.block_time <= 0:
+            self.ledger.produce_block()
+        return {"txId": txid}
+
+    def simulate_transactions(self, body):
+        import msgpack
+
+        request = msgpack.unpackb(body, raw=False, strict_map_key=False)
+        groups = []
+        evaluated = self.ledger.simulate([txn_group["txns"] for txn_group in request["txn-groups"]])
+        for txn_group, (results, error) in zip(request["txn-groups"], evaluated):
+            txn_results = [{"txn-result": to_json(dict(result or {}, txn=stxn)),
+                            "app-budget-consumed": (result or {}).get("cost", 0)}
+                           for stxn, result in zip(txn_group["txns"], results)]
+            group = {"txn-results": txn_results,
+                     "app-budget-consumed": sum(r["app-budget-consumed"] for r in txn_results)}
+            if error is not None:
+                group["failure-message"] = error
+                group["failed-at"] = [0]
+            groups.append(group)
+        return {"version": 1, "last-round": self.ledger.round, "txn-groups": groups}
+
+    def pending_transaction_info(self, txid):
+        if txid not in self.ledger.txns:
+            raise MockAlgodError("txn does not exist", 404)
+        return to_json(self.ledger.txns[txid])
+
+    def compile(self, source, sourcemap=False):
+        # The mock does not assemble TEAL - the program is represented by its source, which keeps results
+        # deterministic and lets the hash and result be used as on a real node
+        from algosdk import encoding
+
+        program = source
+        address = encoding.encode_address(encoding.checksum(b"Program" + program))
+        self.ledger.programs[address] = program
+        response = {"hash": address, "result": b64(program)}
+        if sourcemap:
+            response["sourcemap"] = {"version": 3, "sources": [], "names": [], "mappings": ""}
+        return response
+
+
+class MockIndexer(MockAlgod):
+    # Mock indexer serving the accounts of the same ledger (only the account search is implemented).
+    # Accounts are listed in the order of their public keys and paginated with the next token (last listed address),
+    # as by indexer.
+
+    # Initialize an IndexerClient connected to the mock
+    def client(self, token=""):
+        from algosdk.v2client import indexer
+        return indexer.IndexerClient(token, self.address)
+
+    def route(self, method, parts, query, body):
+        with self.ledger.lock:
+            if method == "GET" and parts == ["health"]:
+                return {"round": self.ledger.round, "db-available": True, "is-migrating": False, "message": "",
+                        "version": "mock"}
+            if method == "GET" and parts == ["accounts"]:
+                return self.search_accounts(
+                    int(query["application-id"][0]) if "application-id" in query else None,
+                    int(query.get("limit", ["1000"])[0]),
+                    query.get("next", [None])[0],
+                )
+        raise MockAlgodError("not found", 404)
+
+    def search_accounts(self, app_id=None, limit=1000, next_token=None):
+        from algosdk import encoding
+
+        addresses = [a for a, acc in self.ledger.accounts.items() if app_id is None or app_id in acc["local"]]
+        addresses.sort(key=encoding.decode_address)
+        if next_token is not None:
+            after = encoding.decode_address(next_token)
+            addresses = [a for a in addresses if encoding.decode_address(a) > after]
+
+        accounts = []
+        for address in addresses[:limit]:
+            info = self.account_info(address)
+            info.pop("created-apps")
+            info["apps-local-state"] = [dict(ls, deleted=False) for ls in info["apps-local-state"]]
+            accounts.append(info)
+        response = {"accounts": accounts, "current-round": self.ledger.round}
+        if len(addresses) > limit:
+            response["next-token"] = accounts[-1]["address"]
+        return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an in-process mock algod node.")
+    parser.add_argument("--port", type=int, default=4001)
+    parser.add_argument("--block-time", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    node = MockAlgod(block_time=args.block_time, latency=args.latency, jitter=args.jitter, seed=args.seed,
+                     port=args.port).start()
+    print("Mock algod listening at " + node.address)
+    try:
+        node.stopped.wait()
+    except KeyboardInterrupt:
+        node.stop()
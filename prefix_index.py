@@ -0,0 +1,151 @@
+# -----------------           Description          -----------------
+# Prefix-product index over the increment history of a compound contract.
+# The index holds the prefix products P[k] = increase[1] * ... * increase[k] (P[0] = 1), so the projected stake of any
+# account is:
+#   LS * P[NB] / P[LNB]
+# in constant time, regardless of how many boxes the account has not claimed yet.
+# Exact prefix products grow by 8 * LOCAL_STAKE_N bits per box, thus they are stored as fixed-width binary floating
+# point records (a MANTISSA_BITS mantissa and a signed exponent), truncated after each multiplication. The relative error
+# of P[k] is below k * 2^-(MANTISSA_BITS - 1), which is far below a unit of the stake for any realistic number of boxes.
+# The projection is therefore the exact rational projection (see fixed_point.project_exact); the on-chain local stake
+# after claiming is lower by the truncation of the contract's byte math at each box (see fixed_point.project for the
+# bit-exact result).
+# Records are kept in an array and can be persisted to a file, to which appending a box only writes the new record.
+
+# -----------------           Imports          -----------------
+import os
+
+from box_cache import fetch_boxes
+import fixed_point
+
+# ---------------------------------------------------------------
+
+MANTISSA_BITS = 128
+MANTISSA_SIZE = MANTISSA_BITS // 8
+EXPONENT_SIZE = 8
+RECORD_SIZE = MANTISSA_SIZE + EXPONENT_SIZE
+
+# P[0] = 1 = 2^(MANTISSA_BITS - 1) * 2^-(MANTISSA_BITS - 1)
+ONE_RECORD = ((1 << (MANTISSA_BITS - 1)), -(MANTISSA_BITS - 1))
+
+
+def pack_record(mantissa: int, exponent: int):
+    return mantissa.to_bytes(MANTISSA_SIZE, 'big') + exponent.to_bytes(EXPONENT_SIZE, 'big', signed=True)
+
+
+def unpack_record(record: bytes):
+    return (int.from_bytes(record[:MANTISSA_SIZE], 'big'),
+            int.from_bytes(record[MANTISSA_SIZE:RECORD_SIZE], 'big', signed=True))
+
+
+# Function multiplies a record with a fixed-point increase, truncating the result to MANTISSA_BITS
+def multiply_record(mantissa: int, exponent: int, increase: int):
+    product = mantissa * increase
+    shift = product.bit_length() - MANTISSA_BITS
+    return product >> shift, exponent + shift - fixed_point.FRACTION_BITS
+
+
+class PrefixIndex:
+
+    def __init__(self, path: str = None):
+        # Records of prefix products P[0..NB]
+        self.records = bytearray(pack_record(*ONE_RECORD))
+        self.path = path
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            # A partially written last record is dropped
+            self.records = bytearray(data[:len(data) - len(data) % RECORD_SIZE])
+            if len(self.records) == 0:
+                self.records = bytearray(pack_record(*ONE_RECORD))
+
+    # Number of boxes in the index
+    def __len__(self):
+        return len(self.records) // RECORD_SIZE - 1
+
+    def record(self, k: int):
+        if not 0 <= k <= len(self):
+            raise IndexError("box {} is not in the index".format(k))
+        return unpack_record(self.records[k * RECORD_SIZE:(k + 1) * RECORD_SIZE])
+
+    # ----- -----    Updates     ----- -----
+
+    # Function appends the increases of new boxes, updating only the tail of the index (and of its file)
+    def extend(self, increases):
+        mantissa, exponent = self.record(len(self))
+        start = len(self.records)
+        for increase in increases:
+            mantissa, exponent = multiply_record(mantissa, exponent, increase)
+            self.records += pack_record(mantissa, exponent)
+        if self.path is not None and len(self.records) > start:
+            self.write_tail(start)
+
+    def append(self, increase: int):
+        self.extend([increase])
+
+    # Function drops the boxes above nb (e.g. after they were deleted)
+    def truncate(self, nb: int):
+        if nb < len(self):
+            del self.records[(nb + 1) * RECORD_SIZE:]
+            if self.path is not None:
+                with open(self.path, "r+b") as f:
+                    f.truncate(len(self.records))
+
+    # ----- -----    Persistence     ----- -----
+
+    def write_tail(self, start: int):
+        mode = "r+b" if os.path.exists(self.path) else "wb"
+        with open(self.path, mode) as f:
+            if start > 0 and os.path.getsize(self.path) < start:
+                # File is behind the index (e.g. the index was created in memory first), thus rewrite it
+                start = 0
+            f.seek(start)
+            f.write(self.records[start:])
+            f.truncate(len(self.records))
+
+    def save(self, path: str):
+        self.path = path
+        self.write_tail(0)
+
+    # ----- -----    Projections     ----- -----
+
+    # Function returns P[nb] / P[lnb] as a fixed-point number
+    def ratio(self, lnb: int, nb: int = None):
+        nb = len(self) if nb is None else nb
+        m_nb, e_nb = self.record(nb)
+        m_lnb, e_lnb = self.record(lnb)
+        shift = e_nb - e_lnb + fixed_point.FRACTION_BITS
+        num = m_nb << shift if shift >= 0 else m_nb
+        den = m_lnb if shift >= 0 else m_lnb << -shift
+        return num // den
+
+    # Function returns the projected local stake (as a fixed-point number) of an account with local stake ls which has
+    #  claimed boxes up to lnb
+    def project(self, ls: int, lnb: int, nb: int = None):
+        nb = len(self) if nb is None else nb
+        m_nb, e_nb = self.record(nb)
+        m_lnb, e_lnb = self.record(lnb)
+        shift = e_nb - e_lnb
+        num = ls * m_nb
+        den = m_lnb
+        if shift >= 0:
+            num <<= shift
+        else:
+            den <<= -shift
+        return num // den
+
+    # Function returns projected stakes (in base units) of many accounts, given as pairs (ls, lnb)
+    def project_all(self, local_states, nb: int = None):
+        return [fixed_point.floor(self.project(ls, lnb, nb)) for ls, lnb in local_states]
+
+
+# Function updates an index with the boxes of a compound contract created since the last update
+#  (boxes are fetched through the local box cache)
+def sync_index(client, cc_id, nb: int, index: PrefixIndex):
+    index.truncate(nb)
+    if nb > len(index):
+        values = fetch_boxes(client, cc_id, len(index) + 1, nb)
+        if any(value is None for value in values):
+            raise Exception("Boxes between {} and {} do not exist!".format(len(index) + 1, nb))
+        index.extend(fixed_point.from_bytes(value) for value in values)
+    return index
@@ -0,0 +1,109 @@
+# -----------------           Description          -----------------
+# Simulation of groups before they are signed and sent.
+# preflight runs a group (AtomicTransactionComposer which has not been built yet) through the simulate endpoint of the
+# node and refuses it if it would fail. From the simulation it reads the opcode budget used, the boxes referenced
+# and the inner transactions, and sets the fees of the group to the minimum:
+#   fee = min_fee * (outer transactions + inner transactions with a zero fee)
+# paid by the first transaction (the other outer transactions pay none). Inner transactions with a zero fee are paid
+# from the pooled fee of the group, while the others are paid by the app from the deposit of the group.
+# Deposits to the app are not lowered - the contract asserts their minimal amounts (which include the fees of future
+# compoundings), thus they follow the contract's rules and the simulation confirms they suffice.
+# For the simulation, the first transaction pays for MAX_INNER_TXNS inner transactions of each app call, as the
+# number of inner transactions is not known before.
+
+# -----------------           Imports          -----------------
+import copy
+from collections import namedtuple
+
+from algosdk import transaction
+
+from util import simulate_group, simulate_groups
+import state_snapshot
+
+# ---------------------------------------------------------------
+
+# Maximal number of inner transactions of an app call
+MAX_INNER_TXNS = 16
+
+# Result of a preflight - opcode budget consumed by the app calls, boxes referenced, number of inner transactions
+# (all and those paid from the pooled fee) and the fee set for the group
+Preflight = namedtuple("Preflight", ["budget", "boxes", "inner", "pooled_inner", "fee"])
+
+
+# Function counts inner transactions of a (simulated) transaction result - all and those with a zero fee
+def count_inner(txn_result):
+    total, pooled = 0, 0
+    for inner in txn_result.get("inner-txns", []):
+        total += 1
+        if inner.get("txn", {}).get("txn", {}).get("fee", 0) == 0:
+            pooled += 1
+        t, p = count_inner(inner)
+        total += t
+        pooled += p
+    return total, pooled
+
+
+# Function returns unsigned copies of the transactions of a group (not yet built) for its simulation, the first of
+#  which pays the fees of any inner transactions
+def trial_transactions(atc, min_fee: int):
+    txns = [tws.txn for tws in atc.txn_list]
+    app_calls = sum(1 for txn in txns if txn.type == "appl")
+
+    trial = [copy.copy(txn) for txn in txns]
+    for txn in trial:
+        txn.group = None
+        txn.fee = 0
+    trial[0].fee = min_fee * (len(trial) + MAX_INNER_TXNS * app_calls)
+    if len(trial) > 1:
+        transaction.assign_group_id(trial)
+    return [transaction.SignedTransaction(txn, None) for txn in trial]
+
+
+# Function applies the result of the simulation of a group - raises if the group would fail, otherwise sets its fees
+#  to the minimum
+def apply_simulation(atc, result, min_fee: int):
+    if result.get("failure-message"):
+        raise Exception("Group would fail at transaction {}: {}".format(
+            result.get("failed-at"), result["failure-message"]))
+
+    inner, pooled_inner = 0, 0
+    for txn_result in result.get("txn-results", []):
+        t, p = count_inner(txn_result.get("txn-result", {}))
+        inner += t
+        pooled_inner += p
+
+    txns = [tws.txn for tws in atc.txn_list]
+    fee = min_fee * (len(txns) + pooled_inner)
+    txns[0].fee = fee
+    for txn in txns[1:]:
+        txn.fee = 0
+
+    boxes = sum(len(getattr(txn, "boxes", None) or []) for txn in txns)
+    return Preflight(result.get("app-budget-consumed", 0), boxes, inner, pooled_inner, fee)
+
+
+# Function simulates a group before it is built and sets its fees to the minimum. Raises if the group would fail.
+def preflight(client, atc):
+    min_fee = state_snapshot.suggested_params(client).min_fee
+    result = simulate_group(client, trial_transactions(atc, min_fee))
+    return apply_simulation(atc, result, min_fee)
+
+
+# Function simulates chained groups (e.g. of a pipeline) before any is built and sets their fees to the minimum. The
+#  groups are simulated in a single request one after another, thus each is checked on the state left by the previous
+#  ones. Raises if any group would fail.
+def preflight_groups(client, atcs):
+    min_fee = state_snapshot.suggested_params(client).min_fee
+    results = simulate_groups(client, *(trial_transactions(atc, min_fee) for atc in atcs))
+    return apply_simulations(atcs, results, min_fee)
+
+
+# Function applies the results of the simulation of chained groups, raising at the first group that would fail
+def apply_simulations(atcs, results, min_fee: int):
+    previews = []
+    for i, (atc, result) in enumerate(zip(atcs, results)):
+        try:
+            previews.append(apply_simulation(atc, result, min_fee))
+        except Exception as e:
+            raise Exception("Group {} of {}: {}".format(i + 1, len(atcs), e))
+    return previews
@@ -0,0 +1,114 @@
+# -----------------           Description          -----------------
+# Re-planning of user operations which race with compoundings.
+# Stake and withdraw (and the local claims before them) are planned for the number of boxes NB read from the
+# contract. If a compounding by somebody else (e.g. a keeper's trigger) is confirmed in between, NB increases and the
+# planned group fails: the user has not claimed the new box (LNB != NB) and the box created by the user's own call has
+# a different number. Such failures are expected on busy pools and are not a reason to give up - the operation is
+# planned again for the new NB and retried, within a bounded number of attempts. A failure without a change of NB is
+# raised immediately, since re-planning would not change its outcome.
+# Outcomes of the attempts are counted per operation in RetryStats.
+
+# -----------------           Imports          -----------------
+import copy
+import threading
+
+import state_snapshot
+
+# ---------------------------------------------------------------
+
+# Maximal number of attempts of an operation
+MAX_ATTEMPTS = 4
+
+# Counted outcomes
+ATTEMPTED = "attempted"
+SUCCEEDED = "succeeded"
+SUCCEEDED_AFTER_RETRY = "succeeded_after_retry"
+REPLANNED = "replanned"
+FAILED = "failed"
+
+
+class RetryStats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Counts of outcomes by operation
+        self.counts = {}
+
+    def record(self, operation: str, outcome: str):
+        with self.lock:
+            counts = self.counts.setdefault(operation, {ATTEMPTED: 0, SUCCEEDED: 0, SUCCEEDED_AFTER_RETRY: 0,
+                                                        REPLANNED: 0, FAILED: 0})
+            counts[outcome] += 1
+
+    # Function returns a copy of the counts by operation
+    def summary(self):
+        with self.lock:
+            return copy.deepcopy(self.counts)
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+
+
+_default_stats = None
+
+
+def default_retry_stats():
+    global _default_stats
+    if _default_stats is None:
+        _default_stats = RetryStats()
+    return _default_stats
+
+
+class Replanning:
+    # Decisions of the retries of an operation - when to re-plan, when to give up and which outcomes to count - shared
+    # by the synchronous (execute_with_replan) and asynchronous (async_algod.execute_with_replan) execution, which
+    # only read the number of boxes and run the attempts.
+
+    def __init__(self, operation: str, max_attempts: int = MAX_ATTEMPTS, stats=None):
+        self.operation = operation
+        self.max_attempts = max_attempts
+        self.stats = stats if stats is not None else default_retry_stats()
+
+    # Function yields the numbers of the attempts (from 1), counting each of them
+    def attempts(self):
+        for i in range(1, self.max_attempts + 1):
+            self.stats.record(self.operation, ATTEMPTED)
+            yield i
+
+    # Function returns whether the operation is to be re-planned after the failed attempt i, for which the number of
+    #  boxes was nb and is new_nb after the failure
+    def failed(self, i: int, nb: int, new_nb: int):
+        if new_nb == nb or i == self.max_attempts:
+            self.stats.record(self.operation, FAILED)
+            return False
+        self.stats.record(self.operation, REPLANNED)
+        print("\tNumber of boxes changed from {} to {} meanwhile, re-planning ({}/{}) ...".format(
+            nb, new_nb, i, self.max_attempts))
+        return True
+
+    def succeeded(self, i: int):
+        self.stats.record(self.operation, SUCCEEDED)
+        if i > 1:
+            self.stats.record(self.operation, SUCCEEDED_AFTER_RETRY)
+
+
+# Function runs attempt() - which plans, builds and executes an operation - until it succeeds.
+#  If an attempt fails and the number of boxes of the contract has changed meanwhile, the operation is re-planned,
+#  at most max_attempts times in total. Returns the result of the successful attempt.
+def execute_with_replan(client, cc_id: int, operation: str, attempt, max_attempts: int = MAX_ATTEMPTS, stats=None):
+    replanning = Replanning(operation, max_attempts, stats)
+
+    for i in replanning.attempts():
+        nb = state_snapshot.read_global_state(client, cc_id)["NB"]
+        try:
+            result = attempt()
+        except Exception:
+            state_snapshot.invalidate(client)
+            new_nb = state_snapshot.read_global_state(client, cc_id)["NB"]
+            if not replanning.failed(i, nb, new_nb):
+                raise
+            continue
+
+        replanning.succeeded(i)
+        return result
@@ -0,0 +1,118 @@
+# -----------------           Description          -----------------
+# Idempotent sending of transaction groups.
+# When sending a group fails on a transient network or node error, the group may nevertheless have reached the node
+# (e.g. the response was lost). Resending it blindly is harmless for the exact same signed transactions (the node
+# rejects duplicates of transactions it knows), but a group built again would be new transactions, paying the fees
+# twice. Thus the txids of a group are computed before it is sent, and before each retry the node is asked whether
+# the group is already pending or confirmed - in which case it is not sent again.
+# Retries back off exponentially and stop once the group can no longer be confirmed, i.e. after the last valid round of
+# its transactions. Errors which are not transient (e.g. a rejection by the contract) are raised immediately, unless
+# they report that the transactions are already known - a group already in the ledger is not probed any further, while
+# a group already in the pool is probed as after a transient error.
+# The decisions are pure functions, shared with the asynchronous sending of async_algod.
+
+# -----------------           Imports          -----------------
+from time import sleep
+
+from algosdk import error
+from algosdk.atomic_transaction_composer import AtomicTransactionComposerStatus
+
+from box_fetcher import is_transient
+
+# ---------------------------------------------------------------
+
+# Initial and maximal delay between attempts (seconds) and maximal number of attempts (in case the node cannot be
+# reached to check the validity window)
+BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+MAX_ATTEMPTS = 20
+
+# Messages of the node reporting a transaction it has already confirmed and one it already has in its pool
+ALREADY_IN_LEDGER = "already in ledger"
+ALREADY_IN_POOL = "transaction already in pool"
+
+
+# Function returns the status of a transaction from its pending info: "confirmed", "pending" or "rejected"
+def pending_status(info):
+    if info.get("confirmed-round", 0) > 0:
+        return "confirmed"
+    if info.get("pool-error"):
+        return "rejected"
+    return "pending"
+
+
+# Function returns the status of a transaction on the node: "confirmed", "pending", "rejected" or None (unknown)
+def transaction_status(client, txid: str):
+    try:
+        info = client.pending_transaction_info(txid)
+    except error.AlgodHTTPError as e:
+        if getattr(e, "code", None) == 404:
+            return None
+        raise
+    return pending_status(info)
+
+
+# Function classifies an error of sending a group: "landed" if the group is already in the ledger, "probe" if it may
+#  have reached the node (a transient error or already in the pool) and "raise" if sending it failed
+def send_error_action(e):
+    if ALREADY_IN_LEDGER in str(e):
+        return "landed"
+    if ALREADY_IN_POOL in str(e) or is_transient(e):
+        return "probe"
+    return "raise"
+
+
+# Function decides on the status of a group probed after a failed attempt to send it: returns True if the group has
+#  reached the node and False to send it again, and raises the error of the attempt if it can no longer be confirmed
+def probe_reached(status, current_round: int, last_valid: int, attempt: int, failure):
+    if status in ("confirmed", "pending"):
+        return True
+    if status == "rejected" or current_round > last_valid or attempt == MAX_ATTEMPTS:
+        raise failure
+    return False
+
+
+# Function sends signed transactions of a group unless they are already known to the node.
+#  Returns the txids of the group.
+def send_idempotent(client, signed_txns, backoff: float = BACKOFF, max_backoff: float = MAX_BACKOFF):
+    txids = [stxn.get_txid() for stxn in signed_txns]
+    last_valid = min(stxn.transaction.last_valid_round for stxn in signed_txns)
+    delay = backoff
+    current_round = 0
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            client.send_transactions(signed_txns)
+            return txids
+        except Exception as e:
+            action = send_error_action(e)
+            if action == "landed":
+                return txids
+            if action == "raise":
+                raise
+            failure = e
+
+        # The group may have reached the node despite the error - groups are atomic, thus checking one txid suffices
+        try:
+            status = transaction_status(client, txids[0])
+            current_round = client.status().get("last-round", current_round)
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            status = None
+        if probe_reached(status, current_round, last_valid, attempt, failure):
+            return txids
+
+        print("\tSending failed ({}), retrying in {:.1f} s ...".format(failure, delay))
+        sleep(delay)
+        delay = min(2 * delay, max_backoff)
+
+
+# Function signs and sends the group of a composer idempotently, leaving the composer submitted (as atc.submit does)
+def submit_idempotent(client, atc, backoff: float = BACKOFF, max_backoff: float = MAX_BACKOFF):
+    if atc.status > AtomicTransactionComposerStatus.SIGNED:
+        raise error.AtomicTransactionComposerError("Group has already been submitted.")
+    signed_txns = atc.gather_signatures()
+    atc.tx_ids = send_idempotent(client, signed_txns, backoff, max_backoff)
+    atc.status = AtomicTransactionComposerStatus.SUBMITTED
+    return atc.tx_ids
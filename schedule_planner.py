@@ -0,0 +1,135 @@
+# -----------------           Description          -----------------
+# Planner of the compounding schedule of a pool.
+# The contract spreads funded triggers evenly over the remaining rounds (PER - LCR) / n, thus the schedule is fully
+# determined by the number of funded triggers n. With n funded triggers the stake is compounded n times until the pool
+# end (the last compounding is done at the pool end by the first withdrawal, so the fee of the last trigger is not
+# spent). With the total stake S, reward rate r per round and T = PER - LCR rounds left, the net yield is:
+#   Y(n) = S((1 + x/n)^n - 1) - (n - 1) c/p,         x = rT
+# where c is CC_FEE_FOR_COMPOUND [microALGO] and p the price of a base unit of the staked asset [microALGO].
+# Using (1 + x/n)^n ~ e^x (1 - x^2/(2n)), dY/dn = 0 gives the optimum:
+#   n* ~ x sqrt(S p e^x / (2c))
+# The integer optimum is found by evaluating Y at the neighbours of n*. A vectorised grid of Y over n and over scaled
+# reward rates and stakes shows the sensitivity of the optimum to the (uncertain) inputs.
+#
+# Example: python schedule_planner.py --stake 1e12 --apr 10 --rounds 500000 --price 0.5
+
+# -----------------           Imports          -----------------
+import argparse
+import math
+
+from autocompounder_abi import Autocompounder
+
+# ---------------------------------------------------------------
+
+# Average round time [s] and number of rounds in a year
+ROUND_TIME = 3.3
+ROUNDS_PER_YEAR = 365 * 24 * 3600 / ROUND_TIME
+
+
+# Function converts a yearly reward rate (APR, as a fraction) to a reward rate per round
+def rate_from_apr(apr: float, round_time: float = ROUND_TIME):
+    return apr * round_time / (365 * 24 * 3600)
+
+
+# Function returns the net yield (in base units of the staked asset) of n funded triggers
+def net_yield(total_stake, reward_rate, rounds, fee_price, n, fee=Autocompounder.CC_FEE_FOR_COMPOUND):
+    x = reward_rate * rounds
+    if n <= 1:
+        return total_stake * x
+    return total_stake * math.expm1(n * math.log1p(x / n)) - (n - 1) * fee / fee_price
+
+
+# Function returns the (real-valued) closed-form optimum of the number of triggers
+def closed_form_triggers(total_stake, reward_rate, rounds, fee_price, fee=Autocompounder.CC_FEE_FOR_COMPOUND):
+    x = reward_rate * rounds
+    return x * math.sqrt(total_stake * fee_price * math.exp(x) / (2 * fee))
+
+
+# Function returns the number of triggers that maximizes the net yield.
+#  At most one compounding can be done per round. Returns 0 if additional compounding does not pay off.
+def optimal_triggers(total_stake, reward_rate, rounds, fee_price, fee=Autocompounder.CC_FEE_FOR_COMPOUND):
+    if total_stake <= 0 or reward_rate <= 0 or rounds <= 0:
+        return 0
+    n_star = closed_form_triggers(total_stake, reward_rate, rounds, fee_price, fee)
+    candidates = sorted({0, min(math.floor(n_star), rounds), min(math.ceil(n_star), rounds)})
+    best, best_yield = 0, net_yield(total_stake, reward_rate, rounds, fee_price, 0, fee)
+    for n in candidates:
+        y = net_yield(total_stake, reward_rate, rounds, fee_price, n, fee)
+        if y > best_yield:
+            best, best_yield = n, y
+    return best
+
+
+# Function evaluates net yields on a grid of numbers of triggers and scaled reward rates and stakes.
+#  Returns a dictionary with arrays of shape (len(rate_factors), len(stake_factors)):
+#   "optimal"     - number of triggers maximizing the yield on the grid
+#   "closed_form" - closed-form optimum
+#   "yield"       - maximal net yield
+#   "gain"        - gain of the optimum over no additional compounding
+def sensitivity(
+    total_stake, reward_rate, rounds, fee_price,
+    rate_factors=(0.5, 0.75, 1, 1.25, 1.5),
+    stake_factors=(0.5, 0.75, 1, 1.25, 1.5),
+    max_triggers=None,
+    fee=Autocompounder.CC_FEE_FOR_COMPOUND
+):
+    # NumPy is needed only for the grid, thus it is not loaded by the interaction layer, which plans in closed form
+    import numpy as np
+
+    x = reward_rate * rounds * np.asarray(rate_factors, dtype=float)[:, None, None]
+    s = total_stake * np.asarray(stake_factors, dtype=float)[None, :, None]
+    closed_form = x[..., 0] * np.sqrt(s[..., 0] * fee_price * np.exp(x[..., 0]) / (2 * fee))
+
+    if max_triggers is None:
+        max_triggers = int(math.ceil(2 * closed_form.max())) + 2
+    max_triggers = max(1, min(max_triggers, rounds))
+    n = np.arange(1, max_triggers + 1, dtype=float)[None, None, :]
+
+    y = s * np.expm1(n * np.log1p(x / n)) - (n - 1) * fee / fee_price
+    idx = y.argmax(axis=2)
+    best = np.take_along_axis(y, idx[..., None], axis=2)[..., 0]
+    base = s[..., 0] * x[..., 0]
+    # One funded trigger is the same as none, since its fee is not spent
+    optimal = np.where(idx == 0, 0, idx + 1)
+    return {"optimal": optimal, "closed_form": closed_form, "yield": best, "gain": best - base}
+
+
+# Function returns a plan for the schedule of a pool from the state of the contract
+#  (global state, balance and minimum balance of the contract's account)
+def plan_schedule(cc_state, cc_balance, cc_mbr, reward_rate, fee_price, fee=Autocompounder.CC_FEE_FOR_COMPOUND):
+    rounds = cc_state["PER"] - cc_state["LCR"]
+    funded = max(0, (cc_balance - cc_mbr) // fee)
+    optimal = optimal_triggers(cc_state["TS"], reward_rate, rounds, fee_price, fee)
+    return {
+        "rounds": rounds,
+        "funded": funded,
+        "optimal": optimal,
+        "additional": max(0, optimal - funded),
+        "gain": net_yield(cc_state["TS"], reward_rate, rounds, fee_price, max(optimal, funded), fee) -
+                net_yield(cc_state["TS"], reward_rate, rounds, fee_price, funded, fee),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan the optimal number of compounding triggers of a pool.")
+    parser.add_argument("--stake", type=float, required=True, help="total stake of the contract (TS) [base unit]")
+    parser.add_argument("--apr", type=float, required=True, help="reward rate of the staking pool [%% per year]")
+    parser.add_argument("--rounds", type=int, required=True, help="rounds until the pool end (PER - LCR)")
+    parser.add_argument("--price", type=float, required=True,
+                        help="price of a base unit of the staked asset [microALGO]")
+    args = parser.parse_args()
+
+    rate = rate_from_apr(args.apr / 100)
+    n_opt = optimal_triggers(args.stake, rate, args.rounds, args.price)
+    print("Closed-form optimum: {:.2f}".format(closed_form_triggers(args.stake, rate, args.rounds, args.price)))
+    print("Optimal number of triggers: {}".format(n_opt))
+    print("Net yield: {:.0f} (without additional compounding: {:.0f})".format(
+        net_yield(args.stake, rate, args.rounds, args.price, n_opt), net_yield(args.stake, rate, args.rounds, args.price, 0)
+    ))
+
+    factors = (0.5, 0.75, 1, 1.25, 1.5)
+    grid = sensitivity(args.stake, rate, args.rounds, args.price, factors, factors)
+    print("\nOptimal number of triggers (rows: reward rate factor, columns: stake factor):")
+    print("\t" + "".join("{:>8}".format(f) for f in factors))
+    for f, row in zip(factors, grid["optimal"]):
+        print("\t{}".format(f) + "".join("{:>8}".format(v) for v in row))
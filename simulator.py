@@ -0,0 +1,235 @@
+# -----------------           Description          -----------------
+# Workload simulator and capacity planner for an autocompounding contract.
+# It replays a workload of deposits (stake), withdrawals and additional trigger funding (scheduling of additional
+# compounding) against the fee and box accounting of the contract, and outputs time series of:
+#   - number of boxes (NB),
+#   - MBR locked in boxes (NB * BOX_FEE),
+#   - spendable fee balance of the app account (balance - MBR), i.e. funding for future triggers,
+#   - worst-case local_claim catch-up - number of boxes a staker who deposited at the start and never interacted again
+#     would need to claim, together with the number of transactions, groups and fees required for it.
+# Scheduled triggers follow the contract's next_compound_round formula:
+#   (PER - LCR) / floor((balance - MBR) / CC_FEE_FOR_COMPOUND) + LCR
+# and are assumed to be issued by a keeper as soon as they are due (at most one per round).
+#
+# All quantities are evaluated with NumPy over a batch of scenarios at once, which is used for Monte Carlo runs of
+# synthetic workloads as well as for parameter sweeps.
+
+# -----------------           Imports          -----------------
+import argparse
+import csv
+
+import numpy as np
+
+from autocompounder_abi import Autocompounder
+from box_packer import LOCAL_CLAIM_COST, MAX_GROUP_SIZE, group_capacity
+
+# ---------------------------------------------------------------
+
+# Number of boxes claimed by a group of 0 to MAX_GROUP_SIZE local_claim calls (as packed by box_packer.pack for
+# localClaimCompoundContract)
+CLAIM_GROUP_CAPACITY = np.array([group_capacity(LOCAL_CLAIM_COST, txns) for txns in range(MAX_GROUP_SIZE + 1)])
+
+# Workload event kinds
+EV_STAKE = "stake"
+EV_WITHDRAW = "withdraw"
+EV_FUND = "fund"
+
+
+# Function generates a synthetic workload with Poisson arrivals.
+#  Rates are given per round and can be scalars or arrays of shape (scenarios,). Returns arrays of event counts of
+#  shape (slots, scenarios), where each slot spans step rounds from psr to per.
+def synthetic_workload(
+        psr: int,
+        per: int,
+        deposit_rate,
+        withdrawal_rate,
+        funding_rate=0.0,
+        step: int = 100,
+        runs: int = 1,
+        seed: int = 0,
+        initial_stakers: int = 1,
+):
+    rng = np.random.default_rng(seed)
+    deposit_rate, withdrawal_rate, funding_rate = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(deposit_rate, dtype=float)),
+        np.atleast_1d(np.asarray(withdrawal_rate, dtype=float)),
+        np.atleast_1d(np.asarray(funding_rate, dtype=float)),
+    )
+    # Each parameter combination is repeated for the number of runs
+    shape = (len(range(psr, per, step)), deposit_rate.size * runs)
+    deposits = rng.poisson(np.tile(deposit_rate, runs) * step, size=shape)
+    withdrawals = rng.poisson(np.tile(withdrawal_rate, runs) * step, size=shape)
+    funding = rng.poisson(np.tile(funding_rate, runs) * step, size=shape)
+    # Initial stakers deposit before the pool starts
+    deposits[0] += initial_stakers
+    return {"psr": psr, "per": per, "step": step, "stake": deposits, "withdraw": withdrawals, "fund": funding}
+
+
+# Function builds a workload from recorded events - an iterable of (round, kind) with kind one of EV_STAKE,
+# EV_WITHDRAW and EV_FUND. Events before psr are accounted in the first slot.
+def recorded_workload(
+        events,
+        psr: int,
+        per: int,
+        step: int = 100,
+):
+    n_slots = len(range(psr, per, step))
+    counts = {k: np.zeros((n_slots, 1), dtype=np.int64) for k in (EV_STAKE, EV_WITHDRAW, EV_FUND)}
+    for rnd, kind in events:
+        if rnd >= per:
+            continue
+        slot = max(0, (int(rnd) - psr) // step)
+        counts[kind][slot, 0] += 1
+    return {"psr": psr, "per": per, "step": step, **counts}
+
+
+# Function reads recorded events from a CSV file with columns "round" and "kind"
+def load_events_csv(path: str):
+    with open(path, newline="") as f:
+        return [(int(row["round"]), row["kind"].strip()) for row in csv.DictReader(f)]
+
+
+# Function simulates the contract's accounting for a workload. Returns a dictionary of time series of shape
+# (slots, scenarios) together with the round at the end of each slot.
+def simulate(
+        workload,
+        initial_fee_balance: int = 0,
+):
+    psr, per, step = workload["psr"], workload["per"], workload["step"]
+    stake, withdraw, fund = workload["stake"], workload["withdraw"], workload["fund"]
+    n_slots, n = stake.shape
+
+    cc_fee = Autocompounder.CC_FEE_FOR_COMPOUND
+
+    # State of each scenario
+    balance = np.full(n, initial_fee_balance, dtype=np.int64)
+    nb = np.zeros(n, dtype=np.int64)
+    lcr = np.full(n, psr, dtype=np.int64)
+    stakers = np.zeros(n, dtype=np.int64)
+    # Number of boxes at the time the first staker has deposited - the staker is assumed to remain passive
+    first_lnb = np.full(n, -1, dtype=np.int64)
+
+    names = ("nb", "locked_mbr", "fee_balance", "stakers", "triggers", "worst_catchup")
+    out = {name: np.zeros((n_slots, n), dtype=np.int64) for name in names}
+    rounds = np.minimum(psr + step * np.arange(1, n_slots + 1), per)
+
+    for s in range(n_slots):
+        start = psr + s * step
+        end = int(rounds[s])
+        live = start > psr
+        triggers = np.zeros(n, dtype=np.int64)
+
+        # Deposits - if the pool is live and has stake, each deposit first compounds (creating a box) and leaves
+        # funds for one trigger, otherwise it only stakes and leaves funds for one trigger
+        d = stake[s]
+        compounding = d * (live & (stakers > 0))
+        balance += d * cc_fee
+        nb += compounding
+        lcr = np.where(compounding > 0, start, lcr)
+        first_lnb = np.where((first_lnb < 0) & (d > 0), nb, first_lnb)
+        stakers += d
+
+        # Withdrawals - each one exits a staker; when the pool is live, it compounds and creates a box. Fees for the
+        # compounding and unstaking are fully covered by the withdrawal deposit.
+        w = np.minimum(withdraw[s], stakers)
+        compounding = w * live
+        nb += compounding
+        lcr = np.where(compounding > 0, start, lcr)
+        stakers -= w
+
+        # Additional funding through scheduling of additional compounding
+        balance += fund[s] * cc_fee
+
+        # Scheduled triggers that are due within the slot
+        last = np.full(n, start - 1, dtype=np.int64)
+        while True:
+            num_triggers = balance // cc_fee
+            nxt = np.where(num_triggers > 0, (per - lcr) // np.maximum(num_triggers, 1) + lcr, per)
+            nxt = np.maximum(nxt, np.maximum(last + 1, psr + 1))
+            due = (num_triggers > 0) & (stakers > 0) & (nxt < per) & (nxt <= end)
+            if not due.any():
+                break
+            balance -= due * cc_fee
+            nb += due
+            triggers += due
+            lcr = np.where(due, nxt, lcr)
+            last = np.where(due, nxt, last)
+
+        out["nb"][s] = nb
+        out["locked_mbr"][s] = nb * Autocompounder.BOX_FEE
+        out["fee_balance"][s] = balance
+        out["stakers"][s] = stakers
+        out["triggers"][s] = triggers
+        out["worst_catchup"][s] = np.where(first_lnb >= 0, nb - first_lnb, 0)
+
+    # Cost of the worst-case catch-up - full groups and a last group of the fewest calls for the remaining boxes
+    full, rest = np.divmod(out["worst_catchup"], CLAIM_GROUP_CAPACITY[-1])
+    out["catchup_txns"] = full * MAX_GROUP_SIZE + np.searchsorted(CLAIM_GROUP_CAPACITY, rest)
+    out["catchup_groups"] = full + (rest > 0)
+    out["catchup_fee"] = out["catchup_txns"] * Autocompounder.MIN_TX_FEE
+    out["round"] = rounds
+    return out
+
+
+# Function computes percentiles over scenarios of each time series - results have shape (len(q), slots)
+def percentiles(
+        result,
+        q=(50, 90, 99),
+):
+    return {name: np.percentile(series, q, axis=1) for name, series in result.items() if name != "round"}
+
+
+# Function sweeps over a grid of deposit and withdrawal rates (and optional funding rates), running Monte Carlo
+# simulations of all combinations in a single vectorised simulation.
+# Returns the grid and the requested percentiles of the final values of each series, of shape (len(q), *grid shape).
+def sweep(
+        psr: int,
+        per: int,
+        deposit_rates,
+        withdrawal_rates,
+        funding_rates=(0.0,),
+        step: int = 100,
+        runs: int = 100,
+        seed: int = 0,
+        q=(50, 90, 99),
+):
+    grid = np.meshgrid(np.asarray(deposit_rates, dtype=float), np.asarray(withdrawal_rates, dtype=float),
+                       np.asarray(funding_rates, dtype=float), indexing="ij")
+    workload = synthetic_workload(psr, per, grid[0].ravel(), grid[1].ravel(), grid[2].ravel(), step=step, runs=runs,
+                                  seed=seed)
+    result = simulate(workload)
+
+    final = {}
+    for name, series in result.items():
+        if name == "round":
+            continue
+        # Scenarios are laid out as runs x combinations
+        last = series[-1].reshape(runs, -1)
+        final[name] = np.percentile(last, q, axis=0).reshape((len(q),) + grid[0].shape)
+    return {"deposit_rate": grid[0], "withdrawal_rate": grid[1], "funding_rate": grid[2], "final": final}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate box growth, MBR, fee balance and catch-up cost of a pool.")
+    parser.add_argument("--psr", type=int, required=True, help="pool start round")
+    parser.add_argument("--per", type=int, required=True, help="pool end round")
+    parser.add_argument("--deposit-rate", type=float, default=0.0, help="deposits per round")
+    parser.add_argument("--withdrawal-rate", type=float, default=0.0, help="withdrawals per round")
+    parser.add_argument("--funding-rate", type=float, default=0.0, help="additionally funded triggers per round")
+    parser.add_argument("--events", help="CSV file with recorded events (columns: round, kind)")
+    parser.add_argument("--step", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.events:
+        wl = recorded_workload(load_events_csv(args.events), args.psr, args.per, args.step)
+    else:
+        wl = synthetic_workload(args.psr, args.per, args.deposit_rate, args.withdrawal_rate, args.funding_rate,
+                                step=args.step, runs=args.runs, seed=args.seed)
+
+    res = simulate(wl)
+    pct = percentiles(res)
+    print("Final values at round {} (p50 / p90 / p99):".format(res["round"][-1]))
+    for key in ("nb", "locked_mbr", "fee_balance", "worst_catchup", "catchup_txns", "catchup_groups", "catchup_fee"):
+        print("\t{:<15} {}".format(key, " / ".join("{:.0f}".format(v) for v in pct[key][:, -1])))
@@ -0,0 +1,199 @@
+# -----------------           Description          -----------------
+# Solvency auditor of a compound contract.
+# It projects the local stake of every staker (from a snapshot of LNB/LS, see staker_snapshot.py) over the box history
+# up to NB exactly as local_claim_box would, and compares the total with CC_total_stake (TS) and with the assets the
+# app actually holds (in its own account and, if the key of the staked amount in the SC's local state is given, staked
+# in the Cometa SC). A solvent pool has:
+#   sum of projected stakes <= TS <= held assets
+# where the difference of the first two is the rounding dust of the truncations of the contract.
+#
+# The projection is vectorised with NumPy over all stakers: local stakes (< 2^128) are split into four 32-bit limbs
+# and all stakers which have not yet claimed a box are multiplied by its increase at once, with the truncation of the
+# contract's byte math. Stakers are ordered by LNB, thus the stakers taking part at each box are a prefix of the arrays.
+# Rounding drift of each staker is the difference between the exact rational projection (from the prefix-product
+# index) and the on-chain one, and the stakers with the largest drift are reported.
+#
+# Example: python solvency_auditor.py --app 123 --indexer http://localhost:8980
+
+# -----------------           Imports          -----------------
+import argparse
+
+import numpy as np
+from algosdk.logic import get_application_address
+from algosdk.v2client import algod, indexer
+
+from box_cache import fetch_boxes
+from prefix_index import PrefixIndex
+from staker_snapshot import load_snapshot, read_snapshot, local_stakes, addresses
+from util import read_global_state, read_local_state
+import fixed_point
+
+# ---------------------------------------------------------------
+
+LIMB_BITS = 32
+LIMB_MASK = np.uint64((1 << LIMB_BITS) - 1)
+# Limbs of the local stake (LOCAL_STAKE_SIZE bytes) and of an increase (at most 9 bytes)
+STAKE_LIMBS = 4
+INCREASE_LIMBS = 3
+# Number of limbs dropped by the division with 2^(8 * LOCAL_STAKE_N)
+FRACTION_LIMBS = fixed_point.FRACTION_BITS // LIMB_BITS
+
+
+# Function splits the local stakes of a snapshot into limbs (shape (STAKE_LIMBS, n), least significant first)
+def stake_limbs(ls_hi, ls_lo):
+    ls_hi = np.asarray(ls_hi, dtype=np.uint64)
+    ls_lo = np.asarray(ls_lo, dtype=np.uint64)
+    shift = np.uint64(LIMB_BITS)
+    return np.stack([ls_lo & LIMB_MASK, ls_lo >> shift, ls_hi & LIMB_MASK, ls_hi >> shift])
+
+
+# Function multiplies local stakes (in limbs) with an increase and truncates the result as local_claim_box.
+#  Returns the new limbs and a mask of overflown stakes (results of 2^128 or more).
+def claim_box_limbs(limbs, increase: int):
+    if increase >= 1 << (INCREASE_LIMBS * LIMB_BITS):
+        raise ValueError("increase does not fit {} limbs".format(INCREASE_LIMBS))
+    shift = np.uint64(LIMB_BITS)
+    n = limbs.shape[1]
+    acc = np.zeros((STAKE_LIMBS + INCREASE_LIMBS + 1, n), dtype=np.uint64)
+    for j in range(INCREASE_LIMBS):
+        b = np.uint64((increase >> (j * LIMB_BITS)) & ((1 << LIMB_BITS) - 1))
+        if b == 0:
+            continue
+        for i in range(STAKE_LIMBS):
+            t = limbs[i] * b
+            acc[i + j] += t & LIMB_MASK
+            acc[i + j + 1] += t >> shift
+    for k in range(acc.shape[0] - 1):
+        acc[k + 1] += acc[k] >> shift
+        acc[k] &= LIMB_MASK
+    result = acc[FRACTION_LIMBS:FRACTION_LIMBS + STAKE_LIMBS]
+    overflow = acc[FRACTION_LIMBS + STAKE_LIMBS:].any(axis=0)
+    return result, overflow
+
+
+# Function projects local stakes of all stakers to box nb, as local_claim would (bit for bit).
+#  Returns the projected local stakes in limbs and a mask of stakers whose stake overflowed.
+def project_limbs(limbs, lnb, increases):
+    nb = len(increases)
+    lnb = np.asarray(lnb, dtype=np.int64)
+    order = np.argsort(lnb, kind="stable")
+    sorted_lnb = lnb[order]
+    projected = limbs[:, order].copy()
+    overflow = np.zeros(len(lnb), dtype=bool)
+
+    for box in range(max(int(sorted_lnb.min(initial=nb)), 0) + 1, nb + 1):
+        # Stakers which have not claimed box yet, i.e. LNB < box
+        active = int(np.searchsorted(sorted_lnb, box, side="left"))
+        if active == 0:
+            continue
+        projected[:, :active], over = claim_box_limbs(projected[:, :active], increases[box - 1])
+        overflow[:active] |= over
+
+    result = np.empty_like(projected)
+    result[:, order] = projected
+    unordered_overflow = np.empty_like(overflow)
+    unordered_overflow[order] = overflow
+    return result, unordered_overflow
+
+
+# Function returns the integer parts (floor_local_stake) of local stakes in limbs as Python ints
+def floor_limbs(limbs):
+    lo = limbs[FRACTION_LIMBS].tolist()
+    hi = limbs[FRACTION_LIMBS + 1].tolist() if FRACTION_LIMBS + 1 < STAKE_LIMBS else [0] * len(lo)
+    return [(h << LIMB_BITS) | l for h, l in zip(hi, lo)]
+
+
+# Function reads the amount the app has staked in the Cometa SC from the app's local state in the SC
+#  (sc_key - key of the value holding the staked amount, sc_offset - offset of the amount if the value is bytes)
+def sc_staked_amount(client, cc_id, sc_id, sc_key: str, sc_offset: int = 0):
+    state = read_local_state(client, get_application_address(cc_id), sc_id)
+    value = state[sc_key]
+    if isinstance(value, int):
+        return value
+    return int.from_bytes(value[sc_offset:sc_offset + 8], 'big')
+
+
+# Function audits the solvency of a compound contract, given a snapshot of its stakers
+def audit(client, cc_id, snapshot, sc_key: str = None, sc_offset: int = 0, top: int = 10):
+    cc_state = read_global_state(client, cc_id)
+    nb = cc_state["NB"]
+    values = fetch_boxes(client, cc_id, 1, nb)
+    if any(value is None for value in values):
+        raise Exception("Box history of the contract is not complete - boxes have been deleted.")
+    increases = [fixed_point.from_bytes(value) for value in values]
+
+    lnb = np.minimum(np.asarray(snapshot["lnb"], dtype=np.int64), nb)
+    limbs = stake_limbs(snapshot["ls_hi"], snapshot["ls_lo"])
+    projected, overflow = project_limbs(limbs, lnb, increases)
+    stakes = floor_limbs(projected)
+    total = sum(stakes)
+
+    # Rounding drift of each staker - exact rational projection minus the on-chain one (in base units)
+    index = PrefixIndex()
+    index.extend(increases)
+    ls = local_stakes(snapshot)
+    exact = [index.project(s, int(k)) for s, k in zip(ls, lnb)]
+    onchain = [(h << (3 * LIMB_BITS)) | (m << (2 * LIMB_BITS)) | (l << LIMB_BITS) | ll
+               for ll, l, m, h in zip(*(projected[i].tolist() for i in range(STAKE_LIMBS)))]
+    drift = [(e - o) / fixed_point.ONE for e, o in zip(exact, onchain)]
+    worst = sorted(range(len(drift)), key=lambda i: -abs(drift[i]))[:top]
+    account_addresses = addresses(snapshot)
+
+    cc_address = get_application_address(cc_id)
+    held = 0
+    for asset in client.account_info(cc_address).get("assets", []):
+        if asset["asset-id"] == cc_state["S_ASA_ID"]:
+            held = asset["amount"]
+    staked = sc_staked_amount(client, cc_id, cc_state["SC_ID"], sc_key, sc_offset) if sc_key is not None else None
+    holdings = held + (staked or 0)
+
+    return {
+        "round": int(snapshot["round"]),
+        "stakers": len(stakes),
+        "NB": nb,
+        "projected_total": total,
+        "total_stake": cc_state["TS"],
+        "dust": cc_state["TS"] - total,
+        "held_in_app": held,
+        "staked_in_sc": staked,
+        "solvent": total <= cc_state["TS"] and (staked is None or cc_state["TS"] <= holdings),
+        "overflown": [account_addresses[i] for i in np.flatnonzero(overflow)],
+        "max_drift": max((abs(d) for d in drift), default=0.0),
+        "largest_drift": [(account_addresses[i], stakes[i], drift[i]) for i in worst],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit the solvency of a compound contract.")
+    parser.add_argument("--app", type=int, required=True, help="app ID of the compound contract")
+    parser.add_argument("--algod", default="http://localhost:4001")
+    parser.add_argument("--algod-token", default="a" * 64)
+    parser.add_argument("--indexer", default="http://localhost:8980")
+    parser.add_argument("--indexer-token", default="")
+    parser.add_argument("--snapshot", help="read stakers from a saved snapshot instead of the indexer")
+    parser.add_argument("--sc-key", help="key of the staked amount in the app's local state in the SC")
+    parser.add_argument("--sc-offset", type=int, default=0, help="offset of the staked amount in the value of the key")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    algod_client = algod.AlgodClient(args.algod_token, args.algod)
+    if args.snapshot:
+        snap = read_snapshot(args.snapshot)
+    else:
+        snap = load_snapshot(indexer.IndexerClient(args.indexer_token, args.indexer), args.app)
+
+    report = audit(algod_client, args.app, snap, args.sc_key, args.sc_offset, args.top)
+    print("Audit of app ID {} at round {} ({} stakers, {} boxes):".format(
+        args.app, report["round"], report["stakers"], report["NB"]))
+    print("\tSum of projected stakes: {}".format(report["projected_total"]))
+    print("\tTotal stake (TS):        {}".format(report["total_stake"]))
+    print("\tRounding dust:           {}".format(report["dust"]))
+    print("\tHeld in the app:         {}".format(report["held_in_app"]))
+    if report["staked_in_sc"] is not None:
+        print("\tStaked in the SC:        {}".format(report["staked_in_sc"]))
+    print("\tSolvent: {}".format(report["solvent"]))
+    if report["overflown"]:
+        print("\tStakes overflowing LOCAL_STAKE_SIZE: {}".format(", ".join(report["overflown"])))
+    print("\nLargest rounding drift (max {:.3e} base units):".format(report["max_drift"]))
+    for address, stake, d in report["largest_drift"]:
+        print("\t{} stake {} drift {:.3e}".format(address, stake, d))
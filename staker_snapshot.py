@@ -0,0 +1,132 @@
+# -----------------           Description          -----------------
+# Bulk snapshot of the local state of all accounts opted into a compound contract, loaded from an indexer.
+# Indexer lists accounts opted into an app in the order of their addresses, paginated with a next token (the last
+# listed address). The address space is split into shards, each of which is paged through from its own starting cursor,
+# so the shards are loaded concurrently. LNB and LS of the accounts are decoded into a columnar table:
+#   address - public keys of the accounts (uint8, shape (n, 32))
+#   lnb     - local number of boxes LNB (uint64)
+#   ls_hi   - upper 64 bits of the local stake LS (uint64)
+#   ls_lo   - lower 64 bits of the local stake LS (uint64)
+#   round   - (latest) round at which the accounts were listed
+# which is stored with NumPy (np.savez_compressed) for projections and audits.
+#
+# Example: python staker_snapshot.py --indexer http://localhost:8980 --app 123 --output stakers.npz
+
+# -----------------           Imports          -----------------
+import argparse
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from algosdk import encoding
+from algosdk.v2client import indexer
+
+import fixed_point
+
+# ---------------------------------------------------------------
+
+# Number of accounts per page and number of shards of the address space
+PAGE_LIMIT = 1000
+SHARDS = 16
+
+ADDRESS_SPACE = 1 << 256
+
+
+# Function returns the bounds of the shards of the address space as (start cursor, end public key) pairs.
+#  The start cursor is the address preceding the shard (None for the first shard) and the end key is excluded.
+def shard_bounds(shards: int = SHARDS):
+    bounds = []
+    for i in range(shards):
+        lower = i * ADDRESS_SPACE // shards
+        upper = (i + 1) * ADDRESS_SPACE // shards
+        cursor = encoding.encode_address((lower - 1).to_bytes(32, 'big')) if lower > 0 else None
+        bounds.append((cursor, upper.to_bytes(32, 'big') if upper < ADDRESS_SPACE else None))
+    return bounds
+
+
+# Function decodes LNB and LS of an account from its apps-local-state, returning None if it is not opted in
+def decode_local_state(account, cc_id):
+    for local in account.get("apps-local-state", []):
+        if local["id"] != cc_id or local.get("deleted", False):
+            continue
+        lnb, ls = 0, 0
+        for kv in local.get("key-value", []):
+            key = base64.b64decode(kv["key"])
+            if key == b"LNB":
+                lnb = kv["value"]["uint"]
+            elif key == b"LS":
+                ls = fixed_point.from_bytes(base64.b64decode(kv["value"]["bytes"]))
+        return lnb, ls
+    return None
+
+
+# Function pages through the accounts of a shard, returning rows (public key, LNB, LS) and the latest round
+def load_shard(indexer_client, cc_id, cursor, end, limit: int = PAGE_LIMIT):
+    rows = []
+    latest_round = 0
+    while True:
+        response = indexer_client.accounts(
+            application_id=cc_id, limit=limit, next_page=cursor, exclude=["assets", "created-assets", "created-apps"]
+        )
+        latest_round = max(latest_round, response.get("current-round", 0))
+        for account in response.get("accounts", []):
+            pk = encoding.decode_address(account["address"])
+            if end is not None and pk >= end:
+                return rows, latest_round
+            state = decode_local_state(account, cc_id)
+            if state is not None:
+                rows.append((pk, *state))
+        cursor = response.get("next-token")
+        if not cursor:
+            return rows, latest_round
+
+
+# Function loads the local state of all accounts opted into a compound contract
+def load_snapshot(indexer_client, cc_id, shards: int = SHARDS, limit: int = PAGE_LIMIT, concurrency: int = None):
+    bounds = shard_bounds(shards)
+    with ThreadPoolExecutor(max_workers=concurrency or shards) as pool:
+        results = list(pool.map(lambda b: load_shard(indexer_client, cc_id, b[0], b[1], limit), bounds))
+
+    rows = [row for shard_rows, _ in results for row in shard_rows]
+    n = len(rows)
+    return {
+        "address": np.frombuffer(b"".join(r[0] for r in rows), dtype=np.uint8).reshape(n, 32),
+        "lnb": np.array([r[1] for r in rows], dtype=np.uint64),
+        "ls_hi": np.array([r[2] >> 64 for r in rows], dtype=np.uint64),
+        "ls_lo": np.array([r[2] & ((1 << 64) - 1) for r in rows], dtype=np.uint64),
+        "round": np.uint64(max((r for _, r in results), default=0)),
+    }
+
+
+def save_snapshot(path: str, snapshot):
+    np.savez_compressed(path, **snapshot)
+
+
+def read_snapshot(path: str):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+# Function returns addresses of the accounts in a snapshot
+def addresses(snapshot):
+    return [encoding.encode_address(bytes(pk)) for pk in snapshot["address"]]
+
+
+# Function returns local stakes (LS) of the accounts in a snapshot as ints
+def local_stakes(snapshot):
+    return [(int(hi) << 64) | int(lo) for hi, lo in zip(snapshot["ls_hi"], snapshot["ls_lo"])]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot the local state of all stakers of a compound contract.")
+    parser.add_argument("--indexer", required=True, help="address of the indexer")
+    parser.add_argument("--token", default="", help="indexer API token")
+    parser.add_argument("--app", type=int, required=True, help="app ID of the compound contract")
+    parser.add_argument("--shards", type=int, default=SHARDS)
+    parser.add_argument("--limit", type=int, default=PAGE_LIMIT)
+    parser.add_argument("--output", default="stakers.npz")
+    args = parser.parse_args()
+
+    snap = load_snapshot(indexer.IndexerClient(args.token, args.indexer), args.app, args.shards, args.limit)
+    save_snapshot(args.output, snap)
+    print("Saved {} stakers at round {} to {}".format(len(snap["lnb"]), int(snap["round"]), args.output))
@@ -0,0 +1,184 @@
+# -----------------           Description          -----------------
+# Round-scoped snapshot cache of chain state.
+# A single interaction often reads the same state several times (e.g. the global state of the contract when checking
+# the trigger round and again when building the call). The snapshot caches global state, account info and local state
+# for the current round:
+#   - the current round is taken from the node's status, which is refreshed at most every ROUND_TTL seconds (shorter
+#     than the block time), and from the rounds reported in responses,
+#   - all cached state is dropped when a new round is observed, or explicitly after submitting own transactions,
+#   - concurrent callers of the same read share a single in-flight request.
+# Suggested params are cached the same way, but they are kept after own transactions and refreshed only after
+# PARAMS_TTL seconds or PARAMS_MAX_ROUNDS observed rounds (well within the validity window of transactions), so
+# transaction builders (and loops building many groups) do not request them for every group.
+# Cached values are shared, thus callers get copies of them, which they are free to modify (e.g. the fee).
+
+# -----------------           Imports          -----------------
+import copy
+import threading
+import weakref
+from concurrent.futures import Future
+from time import time
+
+import util
+
+# ---------------------------------------------------------------
+
+# Seconds for which the node's status (i.e. the current round) is reused
+ROUND_TTL = 1.0
+# Seconds and number of rounds for which suggested params are reused
+PARAMS_TTL = 10.0
+PARAMS_MAX_ROUNDS = 5
+
+
+class StateSnapshot:
+
+    def __init__(self, client, round_ttl: float = ROUND_TTL, params_ttl: float = PARAMS_TTL):
+        self.client = client
+        self.round_ttl = round_ttl
+        self.params_ttl = params_ttl
+        self.lock = threading.Lock()
+        self.round = 0
+        # Futures of the reads of the current round (by key)
+        self.entries = {}
+        # Future of the latest status and the time it was requested
+        self.status_entry = None
+        self.status_time = 0.0
+        # Future of the latest suggested params, the time they were requested and the round they were requested at
+        self.params_entry = None
+        self.params_time = 0.0
+        self.params_round = 0
+
+    # ----- -----    Rounds     ----- -----
+
+    # Function drops cached state if a new round has been observed
+    def observe_round(self, rnd):
+        with self.lock:
+            if rnd is not None and rnd > self.round:
+                self.round = rnd
+                self.entries = {}
+
+    # Function drops all cached state (e.g. after own transactions have been confirmed)
+    def invalidate(self):
+        with self.lock:
+            self.entries = {}
+            self.status_entry = None
+
+    def status(self):
+        with self.lock:
+            if self.status_entry is None or time() - self.status_time >= self.round_ttl:
+                self.status_entry = None
+            future, owner = self.status_entry, False
+            if future is None:
+                future, owner = Future(), True
+                self.status_entry, self.status_time = future, time()
+        if owner:
+            self.resolve(future, self.client.status, lambda: self.drop_status(future))
+        status = future.result()
+        self.observe_round(status.get("last-round"))
+        return copy.deepcopy(status)
+
+    def drop_status(self, future):
+        with self.lock:
+            if self.status_entry is future:
+                self.status_entry = None
+
+    def current_round(self):
+        return self.status().get("last-round")
+
+    # ----- -----    Reads     ----- -----
+
+    @staticmethod
+    def resolve(future, fetch, on_error):
+        try:
+            future.set_result(fetch())
+        except BaseException as e:
+            on_error()
+            future.set_exception(e)
+
+    # Function returns the result of fetch() for a key, fetching it at most once per round
+    def read(self, key, fetch):
+        # Make sure the cached state belongs to the current round
+        self.status()
+        with self.lock:
+            future = self.entries.get(key)
+            owner = future is None
+            if owner:
+                future = self.entries[key] = Future()
+        if owner:
+            # Failed reads are not cached
+            self.resolve(future, fetch, lambda: self.drop_entry(key, future))
+        return copy.deepcopy(future.result())
+
+    def drop_entry(self, key, future):
+        with self.lock:
+            if self.entries.get(key) is future:
+                del self.entries[key]
+
+    def global_state(self, app_id):
+        return self.read(("global", app_id), lambda: util.read_global_state(self.client, app_id))
+
+    def local_state(self, address, app_id):
+        return self.read(("local", address, app_id), lambda: util.read_local_state(self.client, address, app_id))
+
+    # Function returns a copy of suggested params, refreshed after params_ttl seconds or PARAMS_MAX_ROUNDS rounds
+    def suggested_params(self):
+        with self.lock:
+            if self.params_entry is not None and (
+                    time() - self.params_time >= self.params_ttl or
+                    self.round - self.params_round >= PARAMS_MAX_ROUNDS):
+                self.params_entry = None
+            future, owner = self.params_entry, False
+            if future is None:
+                future, owner = Future(), True
+                self.params_entry, self.params_time, self.params_round = future, time(), self.round
+        if owner:
+            self.resolve(future, self.client.suggested_params, lambda: self.drop_params(future))
+        return copy.copy(future.result())
+
+    def drop_params(self, future):
+        with self.lock:
+            if self.params_entry is future:
+                self.params_entry = None
+
+    def account_info(self, address):
+        info = self.read(("account", address), lambda: self.client.account_info(address))
+        self.observe_round(info.get("round"))
+        return info
+
+
+# Snapshots of clients
+_snapshots = weakref.WeakKeyDictionary()
+_snapshots_lock = threading.Lock()
+
+
+def snapshot(client):
+    with _snapshots_lock:
+        if client not in _snapshots:
+            _snapshots[client] = StateSnapshot(client)
+        return _snapshots[client]
+
+
+# ----- -----    Shortcuts     ----- -----
+
+def read_global_state(client, app_id):
+    return snapshot(client).global_state(app_id)
+
+
+def read_local_state(client, address, app_id):
+    return snapshot(client).local_state(address, app_id)
+
+
+def account_info(client, address):
+    return snapshot(client).account_info(address)
+
+
+def suggested_params(client):
+    return snapshot(client).suggested_params()
+
+
+def current_round(client):
+    return snapshot(client).current_round()
+
+
+def invalidate(client):
+    snapshot(client).invalidate()
@@ -2,16 +2,21 @@ import base64
 from algosdk.v2client import algod
 from time import sleep, time
 
+from compile_cache import default_cache
+
 
 # Helper function to compile program source to base64 encoding
-def compile_program(client, source_code):
-    compile_response = client.compile(source_code)
+#  Compiled programs are cached on disk, thus the program is sent to the node only once per compiler version
+def compile_program(client, source_code, cache=None):
+    cache = cache if cache is not None else default_cache()
+    compile_response = cache.compile(client, source_code)
     return base64.b64decode(compile_response["result"])
 
 
 # Helper function to compile program source
-def compile_program_b64(client, source_code):
-    compile_response = client.compile(source_code)
+def compile_program_b64(client, source_code, cache=None):
+    cache = cache if cache is not None else default_cache()
+    compile_response = cache.compile(client, source_code)
     return compile_response["result"]
 
 
@@ -67,3 +72,31 @@ def log_gtx(gtx):
     d = [txn.txn.dictify() for txn in gtx]
     f.write("\n" + str(int(time())) + ": " + str(d))
     f.close()
+
+
+# Function encodes the request to simulate groups of signed transactions
+def simulate_request(*groups):
+    import msgpack
+
+    request = {
+        "txn-groups": [{"txns": [stxn.dictify() for stxn in signed_txns]} for signed_txns in groups],
+        "allow-empty-signatures": True,
+    }
+    return msgpack.packb(request, use_bin_type=True)
+
+
+# Function simulates a group of signed transactions and returns the result of the group (incl. "failure-message" and
+#  "failed-at" if it would fail and the opcode budget consumed by each app call in "txn-results").
+#  The SDK does not expose the simulate endpoint, thus the request is made directly.
+def simulate_group(client, signed_txns):
+    return simulate_groups(client, signed_txns)[0]
+
+
+# Function simulates groups of signed transactions in a single request and returns the results of the groups. The node
+#  evaluates the groups one after another, each on the state left by the previous ones, and stops at a failed group.
+def simulate_groups(client, *groups):
+    response = client.algod_request(
+        "POST", "/transactions/simulate", data=simulate_request(*groups),
+        headers={"Content-Type": "application/msgpack"}
+    )
+    return response["txn-groups"]